@@ -0,0 +1,69 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+QA_MAX_INFLIGHT = int(os.getenv("QA_MAX_INFLIGHT", "4"))
+QA_MAX_QUEUED = int(os.getenv("QA_MAX_QUEUED", "16"))
+
+
+class Busy(Exception):
+    pass
+
+
+class AdmissionExecutor:
+    """Runs blocking work on a bounded thread pool with admission control.
+
+    At most `max_inflight` calls run at once and at most `max_queued` more
+    wait for a thread; anything beyond that is rejected immediately with
+    Busy rather than queueing without limit."""
+
+    def __init__(self, max_inflight: int = QA_MAX_INFLIGHT, max_queued: int = QA_MAX_QUEUED, name: str = "qa"):
+        self.max_inflight = max_inflight
+        self.max_queued = max_queued
+        self._executor = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._running = 0
+        self.rejected = 0
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def queued(self) -> int:
+        return self._admitted - self._running
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        with self._lock:
+            if self._admitted >= self.max_inflight + self.max_queued:
+                self.rejected += 1
+                raise Busy("Server is busy, please try again shortly.")
+            self._admitted += 1
+
+        def run():
+            with self._lock:
+                self._running += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._admitted -= 1
+
+        try:
+            return self._executor.submit(run)
+        except Exception:
+            with self._lock:
+                self._admitted -= 1
+            raise
+
+    async def run(self, fn, *args, **kwargs):
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+qa_executor = AdmissionExecutor()
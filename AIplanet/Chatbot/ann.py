@@ -0,0 +1,100 @@
+import math
+import os
+import re
+import faiss
+import numpy as np
+
+# A FAISS index_factory string ("Flat", "IVF1024,Flat", "HNSW32", "IVF256,PQ16")
+# or one of the aliases below, whose sizes are derived from the corpus.
+INDEX_FACTORY = os.getenv("INDEX_FACTORY", "flat")
+INDEX_NPROBE = int(os.getenv("INDEX_NPROBE", "16"))
+INDEX_EF_SEARCH = int(os.getenv("INDEX_EF_SEARCH", "64"))
+INDEX_HNSW_M = int(os.getenv("INDEX_HNSW_M", "32"))
+
+# FAISS warns below ~39 training points per centroid; PQ needs 256 per codebook.
+MIN_POINTS_PER_CENTROID = 39
+PQ_TRAINING_POINTS = 256
+
+_IVF_RE = re.compile(r"IVF(\d+)", re.IGNORECASE)
+# A PQ encoding ("PQ16", "PQ16x8") and the OPQ rotation, which trains one.
+_PQ_RE = re.compile(r"(?<![A-Za-z])PQ\d+(?:x\d+)?", re.IGNORECASE)
+_OPQ_RE = re.compile(r"OPQ\d+(?:_\d+)?,", re.IGNORECASE)
+
+
+def _nlist(num_vectors: int) -> int:
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // MIN_POINTS_PER_CENTROID))
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    # Largest divisor of the dimension giving sub-vectors of at least 8 dims.
+    for m in range(max(1, dimension // 8), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+def resolve_factory(factory: str, num_vectors: int, dimension: int) -> str:
+    """Expand aliases into a concrete factory string, sized down (or down to
+    an exact flat index) when there are too few vectors to train on."""
+    alias = factory.strip().lower()
+    nlist = _nlist(num_vectors)
+    if alias == "flat":
+        return "Flat"
+    if alias == "hnsw":
+        return f"HNSW{INDEX_HNSW_M}"
+    if alias in ("ivf", "ivfpq", "ivf-pq"):
+        if num_vectors < MIN_POINTS_PER_CENTROID * 2:
+            return "Flat"
+        if alias == "ivf":
+            return f"IVF{nlist},Flat"
+        if num_vectors < PQ_TRAINING_POINTS:
+            return f"IVF{nlist},Flat"
+        return f"IVF{nlist},PQ{_pq_subquantizers(dimension)}"
+    return _fit_to_corpus(factory, num_vectors)
+
+
+def _fit_to_corpus(factory: str, num_vectors: int) -> str:
+    """Shrink an explicit factory string until `num_vectors` can train it:
+    at most one IVF list per MIN_POINTS_PER_CENTROID vectors (none below
+    two lists' worth) and no PQ below PQ_TRAINING_POINTS."""
+    ivf = _IVF_RE.search(factory)
+    if ivf:
+        most = num_vectors // MIN_POINTS_PER_CENTROID
+        if most < 2:
+            return "Flat"
+        if int(ivf.group(1)) > most:
+            factory = f"{factory[:ivf.start(1)]}{most}{factory[ivf.end(1):]}"
+    if num_vectors < PQ_TRAINING_POINTS:
+        factory = _PQ_RE.sub("Flat", _OPQ_RE.sub("", factory))
+    return factory
+
+
+def apply_search_params(index, nprobe: int = INDEX_NPROBE, ef_search: int = INDEX_EF_SEARCH):
+    """Set nprobe / efSearch on whichever index types understand them."""
+    params = faiss.ParameterSpace()
+    for name, value in (("nprobe", nprobe), ("efSearch", ef_search)):
+        if value is None:
+            continue
+        try:
+            params.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass  # not applicable to this index type
+    return index
+
+
+def build_index(
+    vectors,
+    factory: str = INDEX_FACTORY,
+    nprobe: int = INDEX_NPROBE,
+    ef_search: int = INDEX_EF_SEARCH,
+    metric: int = faiss.METRIC_L2,
+):
+    """Build, train (when the index type needs it) and fill a FAISS index."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    num_vectors, dimension = vectors.shape
+    resolved = resolve_factory(factory, num_vectors, dimension)
+    index = faiss.index_factory(dimension, resolved, metric)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return apply_search_params(index, nprobe, ef_search)
@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+import numpy as np
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+
+@dataclass
+class CachedAnswer:
+    document_id: int
+    version: str
+    question: str
+    vector: np.ndarray
+    answer: str
+    sources: List = field(default_factory=list)
+    created_at: float = field(default_factory=time.monotonic)
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class _VersionEntries:
+    """The cached questions for one (document, version): their unit
+    vectors as rows of one matrix, kept up to date on insert and delete so
+    a lookup is a single matrix-vector product."""
+
+    def __init__(self, dimension: int):
+        self.keys = []
+        self.rows = {}
+        self.created = np.empty(16, dtype=np.float64)
+        self.matrix = np.empty((16, dimension), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, vector: np.ndarray, created_at: float):
+        count = len(self.keys)
+        if count == len(self.matrix):
+            self.matrix = np.concatenate([self.matrix, np.empty_like(self.matrix)])
+            self.created = np.concatenate([self.created, np.empty_like(self.created)])
+        self.matrix[count] = vector
+        self.created[count] = created_at
+        self.rows[key] = count
+        self.keys.append(key)
+
+    def remove(self, key):
+        # Move the last row into the freed one.
+        row, last = self.rows.pop(key), len(self.keys) - 1
+        moved = self.keys.pop()
+        if row != last:
+            self.keys[row] = moved
+            self.rows[moved] = row
+            self.matrix[row] = self.matrix[last]
+            self.created[row] = self.created[last]
+
+
+class SemanticAnswerCache:
+    """Answers keyed by (document, index version) and question embedding.
+
+    A lookup hits when a stored question for the same document version has
+    cosine similarity >= `threshold`. Entries expire after `ttl` seconds and
+    the least recently used go past `max_entries`. Entries for older
+    versions of a document are dropped once, when a new version is
+    published (drop_stale); until then lookups for the new version simply
+    don't see them."""
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl: float = ANSWER_CACHE_TTL, max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._by_version = {}
+        self._published = {}
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _delete(self, key):
+        entry = self._entries.pop(key)
+        group_key = (entry.document_id, entry.version)
+        group = self._by_version[group_key]
+        group.remove(key)
+        if not group:
+            del self._by_version[group_key]
+
+    def drop_stale(self, document_id, version):
+        """`version` is now the document's published index: forget answers
+        from any other version, and don't cache late answers from them."""
+        with self._lock:
+            self._published[document_id] = version
+            for doc, old in [key for key in self._by_version if key[0] == document_id and key[1] != version]:
+                for key in list(self._by_version[(doc, old)].keys):
+                    self._delete(key)
+
+    def lookup(self, document_id, version, vector) -> Optional[CachedAnswer]:
+        query = _normalize(vector)
+        now = time.monotonic()
+        with self._lock:
+            group = self._by_version.get((document_id, version))
+            if group is not None:
+                count = len(group)
+                expired = np.flatnonzero(now - group.created[:count] > self.ttl)
+                for key in [group.keys[row] for row in expired]:
+                    self._delete(key)
+                group = self._by_version.get((document_id, version))
+            if group is not None:
+                scores = group.matrix[:len(group)] @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key = group.keys[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key]
+            self.misses += 1
+            return None
+
+    def store(self, document_id, version, question: str, vector, answer: str, sources=None):
+        with self._lock:
+            if self._published.get(document_id, version) != version:
+                return  # answered from a version that has since been replaced
+            entry = CachedAnswer(
+                document_id=document_id,
+                version=version,
+                question=question,
+                vector=_normalize(vector),
+                answer=answer,
+                sources=sources or [],
+            )
+            key = self._next_key
+            self._next_key += 1
+            group = self._by_version.get((document_id, version))
+            if group is None:
+                group = self._by_version[(document_id, version)] = _VersionEntries(len(entry.vector))
+            group.add(key, entry.vector, entry.created_at)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._delete(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_version.clear()
+            self._published.clear()
+
+
+answer_cache = SemanticAnswerCache()
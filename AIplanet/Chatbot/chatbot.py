@@ -1,92 +1,136 @@
-from PyPDF2 import PdfReader
 from dotenv import load_dotenv
 import os
-import io
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-import google.generativeai as genai
-from langchain_community.vectorstores import FAISS
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.chains.question_answering import load_qa_chain
-from langchain.prompts import PromptTemplate 
-import shutil
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Union
+from langchain_core.documents import Document
+from Chatbot.admission import Busy
+from Chatbot.chunking import Chunk, chunk_page_stream, chunk_text
+from Chatbot.context import CONTEXT_CANDIDATES, CONTEXT_MAX_CHUNKS, assemble_context
+from Chatbot.extraction import ExtractedText, PageText, extract_pdf
+from Chatbot.answer_cache import answer_cache
+from Chatbot.index_registry import index_registry
+from Chatbot.llm import build_chat_model, llm_gate, request_key
+from Chatbot.metrics import CONTEXT_TOKENS, QUESTIONS, span, timed
+from Chatbot.retriever import get_embeddings
+from Chatbot.search import keyword_search, reciprocal_rank_fusion, resolve_mode
+from Chatbot.vector_store import IndexWriter
 
 load_dotenv()
 
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
+# Chunks embedded and written per batch while pages stream in. 0 matches
+# the embedding pipeline's window (batch size x concurrency), so each batch
+# fills every request slot; backends without a pipeline use 256.
+INDEX_BATCH_CHUNKS = int(os.getenv("INDEX_BATCH_CHUNKS", "0"))
+# Model calls in flight at once for one batch of questions.
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
 
-def get_pdf_text(pdf_content: bytes) -> str:
+def get_pdf_pages(pdf_source: Union[bytes, str]) -> ExtractedText:
     try:
-        # Create BytesIO object from bytes
-        pdf_stream = io.BytesIO(pdf_content)
-        
-        # Create PDF reader
-        pdf_reader = PdfReader(pdf_stream)
-        
-        # Extract text
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-            
-        return text
+        extracted = extract_pdf(pdf_source)
+        if extracted.failed_pages:
+            print(f"Skipped unreadable pages: {extracted.failed_pages}")
+        return extracted
     except Exception as e:
-        print(f"Error in get_pdf_text: {str(e)}")
+        print(f"Error in get_pdf_pages: {str(e)}")
         raise
 
-def get_text_chunks(text):
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=500)
-    return text_splitter.split_text(text)
+def get_pdf_text(pdf_source: Union[bytes, str]) -> str:
+    return get_pdf_pages(pdf_source).text
+
+def iter_text_chunks(source, document_id=None) -> Iterator[Chunk]:
+    """Chunks of extracted pages, a stream of PageText, or plain text with no
+    page information, each carrying page and offset metadata."""
+    if isinstance(source, ExtractedText):
+        return chunk_page_stream(source.pages, document_id)
+    if isinstance(source, str):
+        return iter(chunk_text(source, document_id))
+    return chunk_page_stream(source, document_id)
 
-def get_vector_store(text: str):
+def get_text_chunks(source, document_id=None) -> List[Chunk]:
+    return list(iter_text_chunks(source, document_id))
+
+def get_vector_store(source: Union[str, ExtractedText, Iterable[PageText]], document_id: int, on_stage=None) -> int:
+    """Chunk, embed and index a document's text; returns the chunk count.
+
+    Pages are chunked as they arrive and embedded a batch at a time (see
+    INDEX_BATCH_CHUNKS), the next batch being extracted and chunked while
+    one embeds. Chunk rows and vectors are written straight into the
+    staging directory, so memory doesn't grow with the document's text.
+    `on_stage(name)` is called as each of the "chunk", "embed" and "index"
+    stages starts."""
+    on_stage = on_stage or (lambda stage: None)
     try:
-        text_chunks = get_text_chunks(text)
-        embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-        
-        # Create faiss directory if it doesn't exist
-        os.makedirs("faiss", exist_ok=True)
-        
-        # Remove existing files with error handling
-        faiss_files = ["faiss/index.faiss", "faiss/index.faiss.pkl"]
-        for file_path in faiss_files:
-            if os.path.exists(file_path):
-                try:
-                    # Try to remove file
-                    os.remove(file_path)
-                except (PermissionError, OSError):
-                    try:
-                        # If remove fails, try to rename/move it
-                        backup_path = f"{file_path}.{int(time.time())}.bak"
-                        shutil.move(file_path, backup_path)
-                    except Exception as e:
-                        print(f"Failed to handle existing file {file_path}: {str(e)}")
-                        # If both attempts fail, try to clear the file contents
-                        with open(file_path, 'w') as f:
-                            f.truncate(0)
-
-        # Small delay to ensure file system operations are complete
-        time.sleep(0.1)
-        
-        # Create new vector store
-        vector_store = FAISS.from_texts(text_chunks, embeddings)
-        
-        # Save the new vector store
+        on_stage("chunk")
+        chunks = timed(iter_text_chunks(source, document_id), "chunk")
+        embeddings = get_embeddings()
+        batch_size = INDEX_BATCH_CHUNKS or getattr(embeddings, "window", None) or 256
+        indexed = 0
+
+        def embed(batch):
+            with span("embed"):
+                return batch, embeddings.embed_documents([chunk.text for chunk in batch])
+
+        def write(staging):
+            nonlocal indexed
+            writer = IndexWriter(staging)
+
+            def add(batch, vectors):
+                with span("index_save"):
+                    writer.add([Document(page_content=chunk.text, metadata=chunk.metadata()) for chunk in batch], vectors)
+
+            # One batch at a time embeds in the background, so embedding
+            # calls never overlap (each already uses the pipeline's full
+            # concurrency) but do overlap extraction and chunking.
+            embedder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-embed")
+            pending = None
+            try:
+                for batch in _batched(chunks, batch_size):
+                    if pending is None:
+                        on_stage("embed")
+                    following = embedder.submit(embed, batch)
+                    if pending is not None:
+                        add(*pending.result())
+                    pending = following
+                if pending is not None:
+                    add(*pending.result())
+                on_stage("index")
+                with span("index_save"):
+                    indexed = writer.finish()
+            except BaseException:
+                writer.abort()
+                raise
+            finally:
+                embedder.shutdown(wait=True, cancel_futures=True)
+
+        # Written to a staging directory and swapped in atomically; readers
+        # keep the version they loaded until their question finishes.
         try:
-            vector_store.save_local("faiss/index.faiss")
-            print("Vector store updated successfully")
+            version = index_registry.publish_with(document_id, write, embeddings)
+            answer_cache.drop_stale(document_id, version)
+            index_registry.activate(document_id)
+            print(f"Vector store for document {document_id} updated successfully (version {version})")
         except Exception as save_error:
             print(f"Error saving vector store: {str(save_error)}")
             raise
-            
-        return text_chunks
-        
+
+        return indexed
+
     except Exception as e:
         print(f"Error in get_vector_store: {str(e)}")
         raise
 
-def get_conversational_chain():
-    prompt_template = """
+def _batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+PROMPT_TEMPLATE = """
     You are a QA bot that answers questions based solely on the provided document. If you are confident in your answer based on the 
     context retrieved from the document, provide a detailed response. If the context does not provide enough information or you are 
     unsure, respond with, 'The information is not available in the document.'
@@ -95,50 +139,239 @@ def get_conversational_chain():
     
     Answer :
     """
-    model = ChatGoogleGenerativeAI(model='gemini-pro', temperature=0.4)
-    prompt = PromptTemplate(template=prompt_template, input_variables=["context", "question"])
-    return load_qa_chain(model, chain_type="stuff", prompt=prompt)
 
-def user_input(user_question):
+# The Gemini client and LangChain chains take seconds to import, so they are
+# imported on first use (or by warm_up) rather than with this module. Both
+# are then kept for the life of the process; calls go through llm_gate.
+_chat_model = None
+_chain = None
+_clients_lock = threading.Lock()
+
+def get_chat_model():
+    global _chat_model
+    if _chat_model is None:
+        with _clients_lock:
+            if _chat_model is None:
+                _chat_model = build_chat_model()
+    return _chat_model
+
+def get_prompt():
+    from langchain.prompts import PromptTemplate
+    return PromptTemplate(template=PROMPT_TEMPLATE, input_variables=["context", "question"])
+
+def get_conversational_chain():
+    global _chain
+    if _chain is None:
+        from langchain.chains.question_answering import load_qa_chain
+        chat_model = get_chat_model()
+        with _clients_lock:
+            if _chain is None:
+                _chain = load_qa_chain(chat_model, chain_type="stuff", prompt=get_prompt())
+    return _chain
+
+def run_chain(chain, docs, question):
+    """Answer through llm_gate, sharing the call with any identical question
+    already in flight."""
+    return llm_gate.call(
+        request_key(question, docs),
+        lambda: chain({"input_documents": docs, "question": question}, return_only_outputs=True)
+    )
+
+def format_sources(docs):
+    return [{"content": doc.page_content, "metadata": doc.metadata} for doc in docs]
+
+def embed_questions(questions: List[str]) -> List[List[float]]:
+    """Query vectors for many questions, in as few embedding requests as the
+    client allows."""
+    embeddings = get_embeddings()
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(questions)
+    return [embeddings.embed_query(question) for question in questions]
+
+def retrieve_contexts(vector_store, document_id, version, questions, mode=None, k=CONTEXT_MAX_CHUNKS):
+    """retrieve_context for many questions about one document: the
+    questions that need vectors are embedded together and searched with one
+    FAISS query over the whole batch. Returns one tuple per question, in
+    order."""
+    mode = resolve_mode(mode)
+    with span("keyword_search"):
+        keyword_hits = [keyword_search(vector_store, question, CONTEXT_CANDIDATES, mode) for question in questions]
+    results = [None] * len(questions)
+    candidates = {}
+    needs_vector = []
+    for i, keyword_docs in enumerate(keyword_hits):
+        if keyword_docs and mode in ("keyword", "auto"):
+            candidates[i] = (keyword_docs, None)
+        else:
+            needs_vector.append(i)
+
+    if needs_vector:
+        with span("query_embed"):
+            query_vectors = embed_questions([questions[i] for i in needs_vector])
+        to_search = []
+        for i, query_vector in zip(needs_vector, query_vectors):
+            cached = answer_cache.lookup(document_id, version, query_vector)
+            if cached:
+                results[i] = ([], query_vector, cached, None)
+            else:
+                to_search.append((i, query_vector))
+        if to_search:
+            with span("search"):
+                hits = vector_store.similarity_search_with_score_by_vectors([vector for _, vector in to_search], CONTEXT_CANDIDATES)
+                for (i, query_vector), scored in zip(to_search, hits):
+                    docs = [doc for doc, _ in scored]
+                    if keyword_hits[i]:
+                        docs = reciprocal_rank_fusion([docs, keyword_hits[i]], CONTEXT_CANDIDATES)
+                    candidates[i] = (docs, query_vector)
+
+    for i, (docs, query_vector) in sorted(candidates.items()):
+        with span("prompt_assembly"):
+            vectors = vector_store.vectors_for(docs) if query_vector is not None else None
+            passages, stats = assemble_context(docs, query_vector, vectors, max_chunks=k)
+        CONTEXT_TOKENS.labels("sent").observe(stats.context_tokens)
+        CONTEXT_TOKENS.labels("saved").observe(stats.tokens_saved)
+        results[i] = (passages, query_vector, None, stats)
+    return results
+
+def retrieve_context(vector_store, document_id, version, question, mode=None, k=CONTEXT_MAX_CHUNKS):
+    """Return (passages, query vector, cached answer, ContextStats).
+
+    Keyword hits alone answer "keyword"/"auto" questions without an
+    embedding call. Otherwise the question is embedded, the answer cache is
+    checked, and vector hits are fused with any keyword hits. Up to
+    CONTEXT_CANDIDATES hits are then cut down to at most `k` chunks within
+    the prompt token budget (see Chatbot.context)."""
+    return retrieve_contexts(vector_store, document_id, version, [question], mode, k)[0]
+
+def answer_questions(questions: List[str], document_id=None, mode=None, max_concurrency=BATCH_LLM_CONCURRENCY):
+    """Answer a batch of questions about one document, in order.
+
+    Retrieval runs once for the whole batch (see retrieve_contexts) and the
+    model is called for up to `max_concurrency` questions at a time.
+    Repeated questions are answered once. Each result is {"question",
+    "response", "sources"} plus "cached" or "context", or {"question",
+    "error"} if that question failed ("busy": True as well if no model
+    slot came free). Raises LookupError if the document
+    has no index."""
+    with index_registry.lease(document_id) as (document_id, vector_store, version):
+        if vector_store is None:
+            QUESTIONS.labels("no_index").inc(len(questions))
+            raise LookupError("Please upload a PDF document first.")
+
+        unique = list(dict.fromkeys(questions))
+        contexts = retrieve_contexts(vector_store, document_id, version, unique, mode)
+        chain = get_conversational_chain()
+
+        def answer(question, context):
+            docs, query_vector, cached, stats = context
+            if cached:
+                QUESTIONS.labels("cached").inc()
+                return {"question": question, "response": cached.answer, "sources": cached.sources, "cached": True}
+            if not docs:
+                QUESTIONS.labels("no_context").inc()
+                return {"question": question, "response": "No relevant information found in the document.", "sources": []}
+            try:
+                with span("llm"):
+                    response = run_chain(chain, docs, question)
+            except Busy as busy:
+                QUESTIONS.labels("busy").inc()
+                return {"question": question, "busy": True, "error": str(busy)}
+            except Exception as e:
+                QUESTIONS.labels("error").inc()
+                print(f"\n✗ Error answering batch question: {str(e)}")
+                return {"question": question, "error": f"Error: {str(e)}"}
+            sources = format_sources(docs)
+            if query_vector is not None:
+                answer_cache.store(document_id, version, question, query_vector, response['output_text'], sources)
+            QUESTIONS.labels("answered").inc()
+            return {"question": question, "response": response['output_text'], "sources": sources, "context": stats.to_dict()}
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(unique))), thread_name_prefix="batch-llm") as executor:
+            answers = dict(zip(unique, executor.map(answer, unique, contexts)))
+    return [answers[question] for question in questions]
+
+def user_input_stream(user_question, document_id=None, mode=None):
+    """Answer a question incrementally. Yields {"type": "token", "text": ...}
+    events as the model generates, then one {"type": "final", "response": ...,
+    "sources": [...]} event (or a single {"type": "error"} event)."""
     try:
-        print("\n=== Processing User Input ===")
-        print(f"Question received: {user_question}")
-        
-        embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-        print("✓ Created embeddings")
-        
-        if not os.path.exists("faiss/index.faiss"):
-            print("✗ FAISS index not found!")
-            return "Error: Please upload a PDF document first.", []
-            
-        print("Loading vector store...")
-        vector_store = FAISS.load_local("faiss/index.faiss", embeddings, allow_dangerous_deserialization=True)
-        print("✓ Vector store loaded successfully")
-        
-        print("\nSearching for relevant documents...")
-        docs = vector_store.similarity_search(user_question, k=7)
-        print(f"✓ Found {len(docs)} relevant documents")
-        
-        if not docs:
-            print("✗ No relevant documents found!")
-            return "No relevant information found in the document.", []
+        with index_registry.lease(document_id) as (document_id, vector_store, version):
+            if vector_store is None:
+                QUESTIONS.labels("no_index").inc()
+                yield {"type": "error", "error": "Please upload a PDF document first."}
+                return
+
+            docs, query_vector, cached, stats = retrieve_context(vector_store, document_id, version, user_question, mode)
+            if cached:
+                QUESTIONS.labels("cached").inc()
+                yield {"type": "final", "response": cached.answer, "sources": cached.sources, "cached": True}
+                return
+
+            if not docs:
+                QUESTIONS.labels("no_context").inc()
+                yield {"type": "final", "response": "No relevant information found in the document.", "sources": []}
+                return
+
+            # Same prompt the "stuff" chain builds: documents joined by blank lines.
+            context = "\n\n".join(doc.page_content for doc in docs)
+            prompt_text = get_prompt().format(context=context, question=user_question)
+
+            parts = []
+            chat_model = get_chat_model()
+            for chunk in timed(llm_gate.stream(lambda: chat_model.stream(prompt_text)), "llm"):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield {"type": "token", "text": chunk.content}
+
+            answer = "".join(parts)
+            sources = format_sources(docs)
+            if query_vector is not None:
+                answer_cache.store(document_id, version, user_question, query_vector, answer, sources)
+            QUESTIONS.labels("answered").inc()
+            yield {"type": "final", "response": answer, "sources": sources, "context": stats.to_dict()}
+
+    except Busy:
+        # Model slots are full: the caller replies busy, asking to retry.
+        QUESTIONS.labels("busy").inc()
+        raise
+    except Exception as e:
+        QUESTIONS.labels("error").inc()
+        print(f"\n✗ Error in user_input_stream: {str(e)}")
+        yield {"type": "error", "error": f"Error: {str(e)}"}
+
+def user_input(user_question, document_id=None, mode=None):
+    try:
+        with index_registry.lease(document_id) as (document_id, vector_store, version):
+            if vector_store is None:
+                QUESTIONS.labels("no_index").inc()
+                return "Error: Please upload a PDF document first.", []
+
+            docs, query_vector, cached, stats = retrieve_context(vector_store, document_id, version, user_question, mode)
+            if cached:
+                QUESTIONS.labels("cached").inc()
+                return cached.answer, [source["content"] for source in cached.sources]
+
+            if not docs:
+                QUESTIONS.labels("no_context").inc()
+                return "No relevant information found in the document.", []
             
-        matched_docs = [doc.page_content for doc in docs]
-        print("\nGenerating response...")
-        chain = get_conversational_chain()
+            matched_docs = [doc.page_content for doc in docs]
+            chain = get_conversational_chain()
         
-        print("Processing through LLM...")
-        response = chain(
-            {"input_documents": docs, "question": user_question}, 
-            return_only_outputs=True
-        )
+            with span("llm"):
+                response = run_chain(chain, docs, user_question)
         
-        print("\n=== Response Generated ===")
-        print(f"Response: {response['output_text']}")
-        print("=" * 50)
-        
-        return response['output_text'], matched_docs
+            if query_vector is not None:
+                answer_cache.store(document_id, version, user_question, query_vector, response['output_text'], format_sources(docs))
+            QUESTIONS.labels("answered").inc()
         
+            return response['output_text'], matched_docs
+
+    except Busy:
+        # Model slots are full: the caller replies busy, asking to retry.
+        QUESTIONS.labels("busy").inc()
+        raise
     except Exception as e:
+        QUESTIONS.labels("error").inc()
         print(f"\n✗ Error in user_input: {str(e)}")
         return f"Error: {str(e)}", []
@@ -0,0 +1,123 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional
+from Chatbot.extraction import ExtractedText, PageText
+
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
+# Words and individual punctuation marks: a close, dependency-free
+# approximation of subword token counts for English prose.
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_PARAGRAPH_RE = re.compile(r"\S(?:.*?\S)?(?=[ \t]*\n\s*\n|\s*\Z)", re.S)
+_SENTENCE_RE = re.compile(r"\S.*?(?:[.!?](?=\s)|\Z)", re.S)
+
+
+def count_tokens(text: str) -> int:
+    return len(_TOKEN_RE.findall(text))
+
+
+@dataclass
+class Chunk:
+    text: str
+    page: Optional[int]
+    start: int
+    end: int
+    document_id: Optional[int] = None
+
+    def metadata(self) -> dict:
+        return {"page": self.page, "start": self.start, "end": self.end, "document_id": self.document_id}
+
+
+def _spans(pattern, text: str, offset: int):
+    return [(offset + match.start(), offset + match.end()) for match in pattern.finditer(text)]
+
+
+def _token_windows(text: str, start: int, end: int, max_tokens: int, overlap_tokens: int):
+    """Cut an over-long span at token boundaries."""
+    tokens = [(start + m.start(), start + m.end()) for m in _TOKEN_RE.finditer(text[start:end])]
+    step = max(1, max_tokens - overlap_tokens)
+    windows = []
+    for first in range(0, len(tokens), step):
+        window = tokens[first:first + max_tokens]
+        windows.append((window[0][0], window[-1][1], len(window)))
+        if first + max_tokens >= len(tokens):
+            break
+    return windows
+
+
+def _units(text: str, page: PageText, max_tokens: int, overlap_tokens: int):
+    """Paragraphs of a page as (start, end, tokens), falling back to sentences
+    and then token windows for anything longer than `max_tokens`."""
+    units = []
+    for para_start, para_end in _spans(_PARAGRAPH_RE, page.text, page.start):
+        tokens = count_tokens(text[para_start:para_end])
+        if tokens <= max_tokens:
+            units.append((para_start, para_end, tokens))
+            continue
+        for sent_start, sent_end in _spans(_SENTENCE_RE, text[para_start:para_end], para_start):
+            tokens = count_tokens(text[sent_start:sent_end])
+            if tokens <= max_tokens:
+                units.append((sent_start, sent_end, tokens))
+            else:
+                units.extend(_token_windows(text, sent_start, sent_end, max_tokens, overlap_tokens))
+    return units
+
+
+def chunk_page_stream(
+    pages: Iterable[PageText],
+    document_id: Optional[int] = None,
+    max_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> Iterator[Chunk]:
+    """Chunk pages one at a time as they arrive (see `chunk_pages`); only the
+    current page's text is held."""
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    for page in pages:
+        text = page.text
+        local = PageText(page_number=page.page_number, text=text, start=0, end=len(text))
+        current = []
+        current_tokens = 0
+        for unit in _units(text, local, max_tokens, overlap_tokens):
+            if current and current_tokens + unit[2] > max_tokens:
+                yield _make_chunk(text, current, page, document_id)
+                # Carry trailing units forward as overlap.
+                carried, carried_tokens = [], 0
+                for previous in reversed(current):
+                    if carried_tokens + previous[2] > overlap_tokens or carried_tokens + previous[2] + unit[2] > max_tokens:
+                        break
+                    carried.insert(0, previous)
+                    carried_tokens += previous[2]
+                current, current_tokens = carried, carried_tokens
+            current.append(unit)
+            current_tokens += unit[2]
+        if current:
+            yield _make_chunk(text, current, page, document_id)
+
+
+def chunk_pages(
+    extracted: ExtractedText,
+    document_id: Optional[int] = None,
+    max_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> List[Chunk]:
+    """Pack each page's paragraphs into chunks of at most `max_tokens`.
+
+    Chunks never cross a page boundary. Consecutive chunks on a page share
+    up to `overlap_tokens` tokens of whole paragraphs/sentences. Each chunk
+    is a contiguous slice of `extracted.text` so its offsets are exact."""
+    return list(chunk_page_stream(extracted.pages, document_id, max_tokens, overlap_tokens))
+
+
+def _make_chunk(text: str, units, page: PageText, document_id) -> Chunk:
+    # `units` hold offsets into the page's own text.
+    start, end = units[0][0], units[-1][1]
+    return Chunk(text=text[start:end], page=page.page_number, start=page.start + start, end=page.start + end, document_id=document_id)
+
+
+def chunk_text(text: str, document_id: Optional[int] = None, **kwargs) -> List[Chunk]:
+    """Chunk text with no page information (e.g. text stored before pages were tracked)."""
+    page = PageText(page_number=None, text=text, start=0, end=len(text))
+    return chunk_pages(ExtractedText(text=text, pages=[page]), document_id, **kwargs)
+
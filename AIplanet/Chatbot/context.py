@@ -0,0 +1,154 @@
+import os
+from dataclasses import asdict, dataclass
+from typing import List, Sequence
+import numpy as np
+from langchain_core.documents import Document
+from Chatbot.chunking import count_tokens
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1536"))
+# Candidates retrieved before selection; at most CONTEXT_MAX_CHUNKS are kept.
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "20"))
+CONTEXT_MAX_CHUNKS = int(os.getenv("CONTEXT_MAX_CHUNKS", "7"))
+# 1.0 ranks purely by relevance; lower values favour chunks unlike those
+# already selected.
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+# Chunks on the same page this close (in characters) are merged into one
+# passage; chunk boundaries fall on whitespace between paragraphs.
+ADJACENT_CHARS = 4
+
+
+@dataclass
+class ContextStats:
+    candidates: int
+    selected: int
+    passages: int
+    baseline_tokens: int
+    context_tokens: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.baseline_tokens - self.context_tokens
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "tokens_saved": self.tokens_saved}
+
+
+def mmr_order(query_vector, vectors, lambda_mult: float = MMR_LAMBDA) -> List[int]:
+    """Order candidates by maximal marginal relevance: each pick maximises
+    lambda * sim(query) - (1 - lambda) * max sim(already picked)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_vector, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = lambda_mult * (vectors @ query)
+    similarity = vectors @ vectors.T
+    scores = relevance.copy()
+    redundancy = None
+    order = []
+    for _ in range(len(vectors)):
+        best = int(np.argmax(scores))
+        order.append(best)
+        redundancy = similarity[best] if redundancy is None else np.maximum(redundancy, similarity[best])
+        scores = relevance - (1 - lambda_mult) * redundancy
+        scores[order] = -np.inf
+    return order
+
+
+def _span(doc: Document):
+    metadata = doc.metadata
+    if metadata.get("start") is None or metadata.get("end") is None:
+        return None
+    return (metadata.get("document_id"), metadata.get("page")), metadata["start"], metadata["end"]
+
+
+def merge_passages(docs: Sequence[Document]) -> List[Document]:
+    """Merge chunks from the same page whose offsets overlap or touch into
+    single passages, dropping the repeated text. Passages keep the order of
+    their first chunk; chunks without offsets are left as they are."""
+    groups = {}
+    passages = []
+    for doc in docs:
+        span = _span(doc)
+        if span is None:
+            passages.append([doc])
+        else:
+            groups.setdefault(span[0], [])
+            if not groups[span[0]]:
+                passages.append(groups[span[0]])
+            groups[span[0]].append(doc)
+
+    merged = []
+    for group in passages:
+        if len(group) == 1:
+            merged.append(group[0])
+            continue
+        group = sorted(group, key=lambda doc: doc.metadata["start"])
+        run = [group[0]]
+        for doc in group[1:]:
+            if doc.metadata["start"] <= run[-1].metadata["end"] + ADJACENT_CHARS:
+                run.append(doc)
+            else:
+                merged.append(_join(run))
+                run = [doc]
+        merged.append(_join(run))
+    return merged
+
+
+def _join(run: Sequence[Document]) -> Document:
+    if len(run) == 1:
+        return run[0]
+    text = run[0].page_content
+    end = run[0].metadata["end"]
+    for doc in run[1:]:
+        start = doc.metadata["start"]
+        if start < end:
+            text += doc.page_content[min(end - start, len(doc.page_content)):]
+        else:
+            text += "\n\n" + doc.page_content
+        end = max(end, doc.metadata["end"])
+    metadata = {**run[0].metadata, "end": end, "chunks": [doc.id for doc in run]}
+    return Document(id=run[0].id, page_content=text, metadata=metadata)
+
+
+def _tokens(docs: Sequence[Document]) -> int:
+    return sum(count_tokens(doc.page_content) for doc in docs)
+
+
+def assemble_context(
+    docs: Sequence[Document],
+    query_vector=None,
+    vectors=None,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    max_chunks: int = CONTEXT_MAX_CHUNKS,
+    lambda_mult: float = MMR_LAMBDA,
+):
+    """Pick, merge and budget retrieved chunks for the prompt.
+
+    Candidates are taken in MMR order (retrieval order when there are no
+    vectors) and kept while the merged passages fit in `token_budget`, up
+    to `max_chunks` chunks. Returns (passages, ContextStats); the baseline is
+    what stuffing the first `max_chunks` candidates would have cost."""
+    docs = list(docs)
+    if query_vector is not None and vectors is not None and len(docs) > 1:
+        order = mmr_order(query_vector, vectors, lambda_mult)
+    else:
+        order = range(len(docs))
+
+    selected, passages = [], []
+    for index in order:
+        if len(selected) >= max_chunks:
+            break
+        trial = merge_passages(selected + [docs[index]])
+        if _tokens(trial) <= token_budget or not selected:
+            selected.append(docs[index])
+            passages = trial
+
+    stats = ContextStats(
+        candidates=len(docs),
+        selected=len(selected),
+        passages=len(passages),
+        baseline_tokens=_tokens(docs[:max_chunks]),
+        context_tokens=_tokens(passages),
+    )
+    return passages, stats
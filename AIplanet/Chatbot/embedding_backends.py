@@ -0,0 +1,201 @@
+import functools
+import json
+import os
+import re
+import zlib
+from dataclasses import asdict, dataclass
+from typing import List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from Chatbot.embedding_cache import CachedEmbeddings, EmbeddingCache
+from Chatbot.embedding_pipeline import EmbeddingPipeline
+
+# "gemini" calls the Gemini embedding API; "local" embeds in-process on the
+# CPU (HashedNgramEmbeddings) and needs no network or API key.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "gemini").lower()
+GEMINI_EMBEDDING_MODEL = os.getenv("GEMINI_EMBEDDING_MODEL", "models/embedding-001")
+LOCAL_EMBEDDING_DIM = int(os.getenv("LOCAL_EMBEDDING_DIM", "768"))
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "256"))
+LOCAL_EMBEDDING_WORD_CACHE = int(os.getenv("LOCAL_EMBEDDING_WORD_CACHE", "200000"))
+
+# Written next to each index version: the backend, model and dimension
+# that built it.
+SPEC_FILE = "embedding.json"
+
+_WORD_RE = re.compile(r"\w+")
+
+
+@dataclass(frozen=True)
+class EmbeddingSpec:
+    backend: str
+    model: str
+    dimension: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def serves(self, built: "EmbeddingSpec") -> bool:
+        """Whether queries embedded under this spec can search an index
+        built under `built`."""
+        if (self.backend, self.model) != (built.backend, built.model):
+            return False
+        return self.dimension is None or built.dimension is None or self.dimension == built.dimension
+
+
+class HashedNgramEmbeddings(Embeddings):
+    """In-process embeddings: word unigrams and bigrams plus character
+    n-grams of each word, feature-hashed with random signs into `dimension`
+    buckets, weighted by sublinear term frequency and L2-normalised.
+
+    There is no fitted vocabulary or IDF table, so a text's vector depends
+    on nothing but the text and the parameters below; documents can be
+    indexed one at a time and queries embedded without any shared state.
+    (Hybrid retrieval's BM25 side supplies corpus term weighting.)"""
+
+    backend = "local"
+
+    def __init__(
+        self,
+        dimension: int = LOCAL_EMBEDDING_DIM,
+        word_ngrams=(1, 2),
+        char_ngrams=(3, 5),
+        char_weight: float = 0.5,
+        batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE,
+    ):
+        self.dimension = dimension
+        self.word_ngrams = tuple(word_ngrams)
+        self.char_ngrams = tuple(char_ngrams)
+        # Character n-grams let inflections and typos overlap; they are
+        # weighted down so whole-word matches still count for more.
+        self.char_weight = char_weight
+        self.batch_size = max(1, batch_size)
+
+    @property
+    def model(self) -> str:
+        words, chars = self.word_ngrams, self.char_ngrams
+        return f"hashed-ngram-v1:w{words[0]}-{words[1]}:c{chars[0]}-{chars[1]}:{self.char_weight:g}"
+
+    def _text_hashes(self, text: str):
+        """Hashes of the text's word n-grams and of its words' character
+        n-grams, as two uint32 arrays."""
+        words = _WORD_RE.findall(text.lower())
+        word_hashes, char_hashes = [], []
+        low, high = self.word_ngrams
+        for word in words:
+            word_hash, chars = _word_hashes(word, *self.char_ngrams)
+            if low <= 1 <= high:
+                word_hashes.append(word_hash)
+            char_hashes.append(chars)
+        for n in range(max(low, 2), high + 1):
+            word_hashes.extend(_hash("w:" + " ".join(words[i:i + n])) for i in range(len(words) - n + 1))
+        chars = np.concatenate(char_hashes) if char_hashes else np.empty(0, dtype=np.uint32)
+        return np.asarray(word_hashes, dtype=np.uint32), chars
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        rows, hashes, weights = [], [], []
+        for row, text in enumerate(texts):
+            for features, weight in zip(self._text_hashes(text), (1.0, self.char_weight)):
+                rows.append(np.full(len(features), row, dtype=np.uint64))
+                hashes.append(features)
+                weights.append(np.full(len(features), weight, dtype=np.float32))
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.uint64)
+        if not len(rows):
+            return matrix
+
+        # Sublinear tf per (text, feature): 1 + log(count).
+        keys = (rows << np.uint64(32)) | np.concatenate(hashes).astype(np.uint64)
+        keys, first, counts = np.unique(keys, return_index=True, return_counts=True)
+        feature_rows = (keys >> np.uint64(32)).astype(np.int64)
+        feature_hashes = keys & np.uint64(0xFFFFFFFF)
+        columns = (feature_hashes % np.uint64(self.dimension)).astype(np.int64)
+        # The top hash bit picks the sign, so collisions tend to cancel
+        # rather than pile up.
+        signs = np.where(feature_hashes >> np.uint64(31), 1.0, -1.0)
+        values = signs * np.concatenate(weights)[first] * (1.0 + np.log(counts))
+        np.add.at(matrix, (feature_rows, columns), values.astype(np.float32))
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed_batch(texts[start:start + self.batch_size]).tolist())
+        return vectors
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+
+def _hash(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8"))
+
+
+@functools.lru_cache(maxsize=LOCAL_EMBEDDING_WORD_CACHE)
+def _word_hashes(word: str, low: int, high: int):
+    """(hash of the word, hashes of its character n-grams). Cached: text
+    repeats a small vocabulary, and hashing is most of the embedding cost."""
+    padded = f"<{word}>"
+    chars = [_hash("c:" + padded[i:i + n]) for n in range(low, min(high, len(padded)) + 1) for i in range(len(padded) - n + 1)]
+    return _hash("w:" + word), np.asarray(chars, dtype=np.uint32)
+
+
+def _gemini_embeddings() -> Embeddings:
+    # Document embeddings go through the persistent chunk cache, and cache
+    # misses through the batched embedding pipeline.
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    pipeline = EmbeddingPipeline(GoogleGenerativeAIEmbeddings(model=GEMINI_EMBEDDING_MODEL), model=GEMINI_EMBEDDING_MODEL)
+    return CachedEmbeddings(pipeline, EmbeddingCache(), GEMINI_EMBEDDING_MODEL)
+
+
+def _local_embeddings() -> Embeddings:
+    # Cheaper to recompute than to look up, so no cache or pipeline.
+    return HashedNgramEmbeddings()
+
+
+BACKENDS = {
+    "gemini": _gemini_embeddings,
+    "local": _local_embeddings,
+}
+
+
+def _backend(backend: str = None) -> str:
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    return backend
+
+
+def create_embeddings(backend: str = None) -> Embeddings:
+    """Build the embeddings client for `backend` (EMBEDDING_BACKEND by default)."""
+    return BACKENDS[_backend(backend)]()
+
+
+def configured_spec(backend: str = None) -> EmbeddingSpec:
+    """The spec new indexes are built and queries embedded under, known
+    without creating the client. Gemini's dimension isn't configured here,
+    so it is only recorded from the index."""
+    backend = _backend(backend)
+    if backend == "local":
+        return EmbeddingSpec("local", HashedNgramEmbeddings().model, LOCAL_EMBEDDING_DIM)
+    return EmbeddingSpec("gemini", GEMINI_EMBEDDING_MODEL)
+
+
+def write_spec(path: str, spec: EmbeddingSpec):
+    with open(os.path.join(path, SPEC_FILE), "w") as f:
+        json.dump(spec.to_dict(), f)
+
+
+def read_spec(path: str) -> EmbeddingSpec:
+    """The spec recorded in an index directory. Indexes from before specs
+    were recorded were all built with the Gemini model."""
+    try:
+        with open(os.path.join(path, SPEC_FILE)) as f:
+            return EmbeddingSpec(**json.load(f))
+    except FileNotFoundError:
+        return EmbeddingSpec("gemini", "models/embedding-001")
@@ -0,0 +1,177 @@
+import hashlib
+import inspect
+import os
+import random
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+EMBED_BACKOFF_BASE = float(os.getenv("EMBED_BACKOFF_BASE", "1.0"))
+EMBED_BACKOFF_MAX = float(os.getenv("EMBED_BACKOFF_MAX", "30"))
+EMBED_CHECKPOINT_DIR = os.getenv("EMBED_CHECKPOINT_DIR", "cache/embedding_checkpoints")
+
+_RATE_LIMIT_MARKERS = ("429", "rate limit", "ratelimit", "resource exhausted", "resourceexhausted", "quota", "too many requests")
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status == 429:
+        return True
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in _RATE_LIMIT_MARKERS)
+
+
+class BatchCheckpoint:
+    """Completed batches of one embedding run, saved so a failed run can resume."""
+
+    def __init__(self, root: str, key: str):
+        self.path = os.path.join(root, key)
+
+    def _batch_file(self, index: int) -> str:
+        return os.path.join(self.path, f"batch-{index:06d}.npy")
+
+    def load(self, index: int):
+        try:
+            return np.load(self._batch_file(index)).tolist()
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save(self, index: int, vectors: List[List[float]]):
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = f"{self._batch_file(index)}.{threading.get_ident()}.tmp.npy"
+        np.save(tmp_path, np.asarray(vectors, dtype=np.float32))
+        os.replace(tmp_path, self._batch_file(index))
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class EmbeddingPipeline(Embeddings):
+    """Embeds documents in fixed-size batches with bounded concurrency.
+
+    Rate-limit errors pause every worker with exponential backoff; other
+    errors are retried the same way. Each finished batch is checkpointed,
+    so re-running the same texts after a failure only sends the batches
+    that never completed."""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = EMBED_BATCH_SIZE,
+        max_concurrency: int = EMBED_MAX_CONCURRENCY,
+        max_retries: int = EMBED_MAX_RETRIES,
+        backoff_base: float = EMBED_BACKOFF_BASE,
+        backoff_max: float = EMBED_BACKOFF_MAX,
+        checkpoint_dir: str = EMBED_CHECKPOINT_DIR,
+        model: str = "",
+    ):
+        self.embeddings = embeddings
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.checkpoint_dir = checkpoint_dir
+        self.model = model
+        self._cooldown_until = 0.0
+        self._cooldown_lock = threading.Lock()
+
+    @property
+    def window(self) -> int:
+        """Texts one embed_documents call can have in flight at once."""
+        return self.batch_size * self.max_concurrency
+
+    def _checkpoint_for(self, texts: List[str]):
+        if not self.checkpoint_dir:
+            return None
+        digest = hashlib.sha256(self.model.encode("utf-8"))
+        digest.update(str(self.batch_size).encode())
+        for text in texts:
+            digest.update(hashlib.sha256(text.encode("utf-8")).digest())
+        return BatchCheckpoint(self.checkpoint_dir, digest.hexdigest())
+
+    def _wait_for_cooldown(self):
+        delay = self._cooldown_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _backoff(self, attempt: int, rate_limited: bool) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        delay *= 0.5 + random.random() / 2
+        if rate_limited:
+            # Everyone backs off, not just the worker that was throttled.
+            with self._cooldown_lock:
+                self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+        return delay
+
+    def _embed_batch(self, batch: List[str], **kwargs) -> List[List[float]]:
+        attempt = 0
+        while True:
+            self._wait_for_cooldown()
+            try:
+                return self.embeddings.embed_documents(batch, **kwargs)
+            except Exception as e:
+                rate_limited = is_rate_limit_error(e)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, rate_limited)
+                print(f"Embedding batch failed ({'rate limited' if rate_limited else str(e)}), retrying in {delay:.2f}s")
+                if not rate_limited:
+                    time.sleep(delay)
+                attempt += 1
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        checkpoint = self._checkpoint_for(texts)
+        results = [checkpoint.load(index) if checkpoint else None for index in range(len(batches))]
+        pending = [index for index, vectors in enumerate(results) if vectors is None]
+        if len(pending) < len(batches):
+            print(f"Resuming embedding run: {len(batches) - len(pending)}/{len(batches)} batches already done")
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(pending))) as executor:
+                futures = {executor.submit(self._embed_batch, batches[index]): index for index in pending}
+                error = None
+                for future in as_completed(futures):
+                    if future.cancelled():
+                        continue
+                    index = futures[future]
+                    try:
+                        results[index] = future.result()
+                    except Exception as e:
+                        # Stop queued batches but keep whatever is already in flight.
+                        error = error or e
+                        for other in futures:
+                            other.cancel()
+                        continue
+                    if checkpoint:
+                        checkpoint.save(index, results[index])
+                if error is not None:
+                    raise error
+
+        if checkpoint:
+            checkpoint.clear()
+        return [vector for batch in results for vector in batch]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed many questions with one batch request per `batch_size`
+        texts, as queries where the client takes a task type (Gemini
+        embeds documents and queries differently)."""
+        if "task_type" not in inspect.signature(self.embeddings.embed_documents).parameters:
+            return [self.embeddings.embed_query(text) for text in texts]
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed_batch(texts[start:start + self.batch_size], task_type="RETRIEVAL_QUERY"))
+        return vectors
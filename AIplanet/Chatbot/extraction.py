@@ -0,0 +1,228 @@
+import bisect
+import io
+import mmap
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator, List, Union
+from PyPDF2 import PdfReader
+
+PAGE_SEPARATOR = "\n"
+PAGE_TIMEOUT = float(os.getenv("PDF_PAGE_TIMEOUT", "10"))
+PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "8"))
+EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+
+
+class PageTimeout(Exception):
+    pass
+
+
+@dataclass
+class PageText:
+    page_number: int
+    text: str
+    start: int
+    end: int
+
+
+@dataclass
+class ExtractedText:
+    text: str
+    pages: List[PageText] = field(default_factory=list)
+    failed_pages: List[int] = field(default_factory=list)
+
+    def page_for_offset(self, offset: int) -> int:
+        """Return the 1-based page number containing a character offset."""
+        starts = [page.start for page in self.pages]
+        index = bisect.bisect_right(starts, offset) - 1
+        return self.pages[max(index, 0)].page_number
+
+
+def _raise_page_timeout(signum, frame):
+    raise PageTimeout()
+
+
+def _can_use_alarm() -> bool:
+    return hasattr(signal, "SIGALRM") and threading.current_thread() is threading.main_thread()
+
+
+def _extract_range(reader: PdfReader, start: int, stop: int, page_timeout: float):
+    """Extract pages [start, stop). Returns (texts, failed 1-based page numbers)."""
+    use_alarm = page_timeout > 0 and _can_use_alarm()
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _raise_page_timeout)
+
+    texts, failed = [], []
+    try:
+        for index in range(start, stop):
+            try:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, page_timeout)
+                texts.append(reader.pages[index].extract_text() or "")
+            except PageTimeout:
+                print(f"Page {index + 1} timed out after {page_timeout}s, skipping")
+                texts.append("")
+                failed.append(index + 1)
+            except Exception as e:
+                print(f"Could not extract page {index + 1}: {str(e)}")
+                texts.append("")
+                failed.append(index + 1)
+            finally:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+    finally:
+        if use_alarm:
+            signal.signal(signal.SIGALRM, previous)
+    return texts, failed
+
+
+@contextmanager
+def open_pdf(source: Union[bytes, str, os.PathLike]):
+    """PdfReader over in-memory bytes or a file on disk. Files are mapped
+    read-only rather than read: PyPDF2 would otherwise copy a path's whole
+    contents into a BytesIO."""
+    if isinstance(source, (bytes, bytearray)):
+        yield PdfReader(io.BytesIO(source))
+        return
+    with open(source, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield PdfReader(mapped)
+
+
+# Each pool worker keeps a few recently used PDFs open, so the ranges of
+# one document don't re-parse it.
+WORKER_OPEN_PDFS = 2
+_worker_pdfs = OrderedDict()
+
+
+def _worker_reader(key, path: str) -> PdfReader:
+    entry = _worker_pdfs.get(key)
+    if entry is None:
+        pdf = open_pdf(path)
+        entry = _worker_pdfs[key] = (pdf, pdf.__enter__())
+        while len(_worker_pdfs) > WORKER_OPEN_PDFS:
+            old, _ = _worker_pdfs.popitem(last=False)[1]
+            old.__exit__(None, None, None)
+    _worker_pdfs.move_to_end(key)
+    return entry[1]
+
+
+def _extract_range_in_worker(key, path: str, start: int, stop: int, page_timeout: float):
+    return _extract_range(_worker_reader(key, path), start, stop, page_timeout)
+
+
+def _page_ranges(num_pages: int, pages_per_task: int):
+    return [(start, min(start + pages_per_task, num_pages)) for start in range(0, num_pages, pages_per_task)]
+
+
+def _pool_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_extraction_pool():
+    """The process-wide extraction pool, started on first use and shared by
+    every upload. Workers run tasks on their main thread, so the per-page
+    SIGALRM timeout always applies there."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = _pool_context().Pool(max(1, EXTRACT_WORKERS))
+        return _pool
+
+
+def shutdown_extraction_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+
+
+@contextmanager
+def _on_disk(source):
+    """A path for `source`, writing in-memory bytes to a temporary file so
+    pool workers can map it themselves."""
+    if not isinstance(source, (bytes, bytearray)):
+        yield os.fspath(source)
+        return
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(source)
+        yield path
+    finally:
+        os.remove(path)
+
+
+def _page_texts(source, failed: List[int], page_timeout, pages_per_task, max_workers, parallel_min_pages):
+    # Off the main thread (e.g. on an ingestion worker) SIGALRM can't
+    # interrupt a page, so a timeout means going through the pool.
+    needs_pool = page_timeout > 0 and not _can_use_alarm()
+    with open_pdf(source) as reader:
+        num_pages = len(reader.pages)
+        if not needs_pool and (num_pages < parallel_min_pages or max_workers <= 1):
+            for start, stop in _page_ranges(num_pages, max(1, pages_per_task)):
+                texts, range_failed = _extract_range(reader, start, stop, page_timeout)
+                failed.extend(range_failed)
+                yield from texts
+            return
+
+    ranges = _page_ranges(num_pages, max(1, pages_per_task))
+    # Keep a couple of ranges per worker in flight so extracted text doesn't
+    # pile up faster than the consumer takes it.
+    window = max(1, min(max_workers, len(ranges))) * 2
+    pool = get_extraction_pool()
+    with _on_disk(source) as path:
+        stat = os.stat(path)
+        key = (path, stat.st_ino, stat.st_mtime_ns)
+        pending = deque()
+        for start, stop in ranges:
+            pending.append(pool.apply_async(_extract_range_in_worker, (key, path, start, stop, page_timeout)))
+            if len(pending) >= window:
+                texts, range_failed = pending.popleft().get()
+                failed.extend(range_failed)
+                yield from texts
+        while pending:
+            texts, range_failed = pending.popleft().get()
+            failed.extend(range_failed)
+            yield from texts
+
+
+def iter_pdf_pages(
+    source: Union[bytes, str, os.PathLike],
+    failed_pages: List[int] = None,
+    page_timeout: float = PAGE_TIMEOUT,
+    pages_per_task: int = PAGES_PER_TASK,
+    max_workers: int = EXTRACT_WORKERS,
+    parallel_min_pages: int = PARALLEL_MIN_PAGES,
+) -> Iterator[PageText]:
+    """Yield pages in order as they are extracted, with offsets as if the
+    pages were joined by PAGE_SEPARATOR. Large documents, and any document
+    extracted off the main thread with a page timeout, go through the
+    shared process pool. Unreadable page numbers are appended to `failed_pages`."""
+    failed = failed_pages if failed_pages is not None else []
+    offset = 0
+    texts = _page_texts(source, failed, page_timeout, pages_per_task, max_workers, parallel_min_pages)
+    for number, page_text in enumerate(texts, start=1):
+        yield PageText(page_number=number, text=page_text, start=offset, end=offset + len(page_text))
+        offset += len(page_text) + len(PAGE_SEPARATOR)
+
+
+def extract_pdf(source: Union[bytes, str, os.PathLike], **kwargs) -> ExtractedText:
+    """Extract the whole document at once (see `iter_pdf_pages`)."""
+    failed = []
+    pages = list(iter_pdf_pages(source, failed, **kwargs))
+    text = PAGE_SEPARATOR.join(page.text for page in pages)
+    return ExtractedText(text=text, pages=pages, failed_pages=sorted(failed))
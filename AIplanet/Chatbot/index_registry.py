@@ -0,0 +1,305 @@
+import json
+import os
+import shutil
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from dataclasses import replace
+from Chatbot.embedding_backends import configured_spec, write_spec
+from Chatbot.retriever import INDEX_DIR, VectorStoreCache, embeddings_match, new_index_version, publish_index_version, read_index_version, version_file_for
+from Chatbot.vector_store import MappedVectorStore, index_dimension
+
+DOCUMENTS_DIR = os.path.join(INDEX_DIR, "documents")
+ACTIVE_FILE = os.path.join(INDEX_DIR, "ACTIVE")
+MAX_LOADED_INDEXES = int(os.getenv("MAX_LOADED_INDEXES", "8"))
+# Superseded versions are kept at least this long after the pointer swap so
+# questions already running in any process can finish against them.
+INDEX_GC_GRACE_SECONDS = float(os.getenv("INDEX_GC_GRACE_SECONDS", "120"))
+INDEX_GC_INTERVAL_SECONDS = float(os.getenv("INDEX_GC_INTERVAL_SECONDS", "60"))
+LEASE_ATTEMPTS = 5
+
+VERSIONS_DIR = "versions"
+STAGING_PREFIX = ".staging-"
+TRASH_PREFIX = ".trash-"
+
+
+def _version_time(version: str):
+    """Creation time encoded in a version name, or None for other names."""
+    try:
+        return int(version.split("-", 1)[0])
+    except ValueError:
+        return None
+
+
+class IndexRegistry:
+    """One vector index per document under `root/<document_id>`.
+
+    Each build is written to a staging directory, renamed into
+    `versions/<version>` and then published by atomically replacing the
+    document's VERSION pointer, so readers only ever see complete indexes.
+    Loaded stores are cached per process (least recently used are dropped
+    beyond `max_loaded`), and the "active" document is the default target
+    for questions that don't name one."""
+
+    def __init__(
+        self,
+        root: str = DOCUMENTS_DIR,
+        active_file: str = ACTIVE_FILE,
+        max_loaded: int = MAX_LOADED_INDEXES,
+        gc_grace: float = INDEX_GC_GRACE_SECONDS,
+    ):
+        self.root = root
+        self.active_file = active_file
+        self.max_loaded = max_loaded
+        self.gc_grace = gc_grace
+        self._caches = OrderedDict()
+        self._leases = Counter()
+        self._lock = threading.Lock()
+        self._collector = None
+        self._stop_collector = threading.Event()
+
+    def path(self, document_id: int) -> str:
+        return os.path.join(self.root, str(document_id))
+
+    def version_path(self, document_id: int, version: str) -> str:
+        return os.path.join(self.path(document_id), VERSIONS_DIR, version)
+
+    def current_path(self, document_id: int) -> str:
+        """Directory the document's VERSION pointer refers to."""
+        _, path = read_index_version(version_file_for(self.path(document_id)))
+        return path or self.path(document_id)
+
+    def has(self, document_id: int) -> bool:
+        """Whether the document has an index the configured embedding
+        backend can serve; one built by another backend needs rebuilding."""
+        path = self.current_path(document_id)
+        return MappedVectorStore.exists(path) and embeddings_match(path)
+
+    def document_ids(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(int(name) for name in os.listdir(self.root) if name.isdigit() and self.has(int(name)))
+
+    def _cache(self, document_id: int) -> VectorStoreCache:
+        with self._lock:
+            cache = self._caches.get(document_id)
+            if cache is None:
+                cache = VectorStoreCache(self.path(document_id))
+                self._caches[document_id] = cache
+            self._caches.move_to_end(document_id)
+            while len(self._caches) > self.max_loaded:
+                self._caches.popitem(last=False)
+            return cache
+
+    def loaded_sizes(self) -> dict:
+        """Vector counts of the indexes currently in memory, by document."""
+        with self._lock:
+            caches = list(self._caches.items())
+        return {document_id: len(cache.loaded_store) for document_id, cache in caches if cache.loaded_store is not None}
+
+    def get(self, document_id: int = None):
+        """Return the loaded store for a document (the active one by default)."""
+        return self.resolve(document_id)[1]
+
+    def resolve(self, document_id: int = None):
+        """Return (document id, loaded store, index version); the store is
+        None when the document has no index."""
+        if document_id is None:
+            document_id = self.active_document_id()
+        if document_id is None:
+            return None, None, None
+        cache = self._cache(int(document_id))
+        store = cache.get()
+        return int(document_id), store, cache.version
+
+    @contextmanager
+    def lease(self, document_id: int = None):
+        """Like `resolve`, but the version's files are not collected while
+        the block runs, even if a newer version is published meanwhile."""
+        if document_id is None:
+            document_id = self.active_document_id()
+        if document_id is None:
+            yield None, None, None
+            return
+        cache = self._cache(int(document_id))
+        for attempt in range(LEASE_ATTEMPTS):
+            # A version can be collected between reading the pointer and
+            # loading it; loading again picks up the newer pointer.
+            try:
+                store = cache.get()
+            except Exception:
+                if attempt == LEASE_ATTEMPTS - 1:
+                    raise
+                continue
+            path, version = cache.loaded_path, cache.version
+            with self._lock:
+                # The collector removes versions under the same lock, so a
+                # path that still exists here stays until the lease ends.
+                if store is None:
+                    if self.has(int(document_id)):
+                        continue  # the version we read was just collected
+                    path = None
+                elif not os.path.isdir(path):
+                    continue
+                self._leases[path] += 1
+                break
+        else:
+            raise RuntimeError(f"Index for document {document_id} keeps changing; try again")
+        try:
+            yield int(document_id), store, version
+        finally:
+            with self._lock:
+                self._leases[path] -= 1
+                if self._leases[path] <= 0:
+                    del self._leases[path]
+
+    def publish(self, document_id: int, vector_store) -> str:
+        """Write `vector_store` as a new version and swap readers onto it."""
+        return self.publish_with(document_id, vector_store.save_local, vector_store.embeddings)
+
+    def publish_with(self, document_id: int, write, embedding) -> str:
+        """Publish a new version whose files `write(staging_path)` creates."""
+        version = new_index_version()
+        os.makedirs(os.path.join(self.path(document_id), VERSIONS_DIR), exist_ok=True)
+        staging = os.path.join(self.path(document_id), f"{STAGING_PREFIX}{version}")
+        final_path = self.version_path(document_id, version)
+        try:
+            write(staging)
+            write_spec(staging, replace(configured_spec(), dimension=index_dimension(staging)))
+            os.rename(staging, final_path)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        publish_index_version(final_path, version_file_for(self.path(document_id)), version)
+        # Serve the saved copy: chunk text stays on disk and keyword search
+        # needs its full-text index.
+        loaded = MappedVectorStore.load_local(final_path, embedding)
+        self._cache(document_id).set(loaded, version, final_path)
+        return version
+
+    def remove(self, document_id: int):
+        with self._lock:
+            self._caches.pop(document_id, None)
+        shutil.rmtree(self.path(document_id), ignore_errors=True)
+        if self.active_document_id() == document_id:
+            try:
+                os.remove(self.active_file)
+            except FileNotFoundError:
+                pass
+
+    def activate(self, document_id: int) -> bool:
+        if not self.has(document_id):
+            return False
+        os.makedirs(os.path.dirname(self.active_file) or ".", exist_ok=True)
+        tmp_path = f"{self.active_file}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"document_id": document_id}, f)
+        os.replace(tmp_path, self.active_file)
+        return True
+
+    def active_document_id(self):
+        try:
+            with open(self.active_file) as f:
+                return json.load(f).get("document_id")
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def has_index(self, document_id: int = None) -> bool:
+        if document_id is None:
+            document_id = self.active_document_id()
+        return document_id is not None and self.has(int(document_id))
+
+    def _garbage(self, document_id: int, now: float):
+        """Paths under a document's directory that no reader can still need."""
+        document_path = self.path(document_id)
+        version_file = version_file_for(document_path)
+        _, current = read_index_version(version_file)
+        try:
+            swapped_at = os.path.getmtime(version_file)
+        except FileNotFoundError:
+            return []
+        if current is None or now - swapped_at < self.gc_grace:
+            return []
+
+        current = os.path.normpath(current)
+        current_time = _version_time(os.path.basename(current))
+        garbage = []
+        versions_dir = os.path.join(document_path, VERSIONS_DIR)
+        if os.path.isdir(versions_dir) and current_time is not None:
+            for name in os.listdir(versions_dir):
+                # Only versions older than the one we read as current: a newer
+                # one may have been published since and be in use already.
+                created = _version_time(name)
+                if created is not None and created < current_time:
+                    garbage.append(os.path.normpath(os.path.join(versions_dir, name)))
+        for name in os.listdir(document_path):
+            path = os.path.join(document_path, name)
+            if name.startswith(STAGING_PREFIX) and now - os.path.getmtime(path) > self.gc_grace:
+                garbage.append(path)  # left behind by a build that crashed
+            elif name.startswith(TRASH_PREFIX):
+                garbage.append(path)  # a previous collection was interrupted
+            elif name in ("index.faiss", "chunks.db", "index.pkl") and current != os.path.normpath(document_path):
+                garbage.append(path)  # unversioned layout from before versions/
+        return garbage
+
+    def collect_garbage(self, now: float = None):
+        """Delete superseded index versions; returns the paths removed."""
+        now = time.time() if now is None else now
+        if not os.path.isdir(self.root):
+            return []
+        removed, trash = [], []
+        for name in os.listdir(self.root):
+            if not name.isdigit():
+                continue
+            candidates = self._garbage(int(name), now)
+            with self._lock:
+                leased = {os.path.normpath(path) for path in self._leases if path}
+                for path in candidates:
+                    if os.path.normpath(path) in leased:
+                        continue
+                    # Renaming is atomic and cheap, so the lock is only held
+                    # long enough to take the version away from new leases.
+                    target = os.path.join(self.path(int(name)), f"{TRASH_PREFIX}{os.path.basename(path)}")
+                    try:
+                        os.rename(path, target)
+                    except FileNotFoundError:
+                        continue
+                    trash.append(target)
+                    removed.append(path)
+        for path in trash:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        if removed:
+            print(f"Removed {len(removed)} superseded index path(s)")
+        return removed
+
+    def start_collector(self, interval: float = INDEX_GC_INTERVAL_SECONDS):
+        """Run `collect_garbage` every `interval` seconds on a daemon thread."""
+        if self._collector is not None and self._collector.is_alive():
+            return
+
+        def run():
+            while not self._stop_collector.wait(interval):
+                try:
+                    self.collect_garbage()
+                except Exception as e:
+                    print(f"Index garbage collection failed: {str(e)}")
+
+        self._stop_collector.clear()
+        self._collector = threading.Thread(target=run, name="index-gc", daemon=True)
+        self._collector.start()
+
+    def stop_collector(self):
+        self._stop_collector.set()
+        if self._collector is not None:
+            self._collector.join(timeout=5)
+            self._collector = None
+
+
+index_registry = IndexRegistry()
@@ -0,0 +1,150 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "16"))
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "1000"))
+
+# Fraction of the job complete once each stage has started.
+STAGE_PROGRESS = {"queued": 0.0, "extract": 0.05, "chunk": 0.3, "embed": 0.4, "index": 0.9, "done": 1.0}
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclass
+class IngestionJob:
+    document_id: int
+    filename: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"
+    stage: str = "queued"
+    progress: float = 0.0
+    error: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    _stage_started: float = field(default_factory=time.monotonic, repr=False)
+    _elapsed: Dict[str, float] = field(default_factory=dict, repr=False)
+
+    def enter_stage(self, stage: str):
+        now = time.monotonic()
+        self._elapsed[self.stage] = self._elapsed.get(self.stage, 0.0) + now - self._stage_started
+        self.timings[self.stage] = round(self._elapsed[self.stage], 4)
+        self._stage_started = now
+        self.stage = stage
+        # Pipelined stages take turns, so progress only moves forward.
+        self.progress = max(self.progress, STAGE_PROGRESS.get(stage, self.progress))
+
+    def in_stage(self, items: Iterable, stage: str) -> Iterator:
+        """Yield from `items`, charging the time spent producing each item to
+        `stage` and then returning to whichever stage pulled it. For lazy
+        producers (page extraction) feeding later stages (chunking)."""
+        iterator = iter(items)
+        while True:
+            resume = self.stage
+            self.enter_stage(stage)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.enter_stage(resume)
+            yield item
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "document_id": self.document_id,
+            "filename": self.filename,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "error": self.error,
+            "timings": self.timings,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestionQueue:
+    """Bounded queue of ingestion jobs drained by a fixed pool of worker threads.
+
+    `submit` raises QueueFull instead of blocking once `max_queued` jobs are
+    waiting. Finished jobs are kept (up to `history`) so their status can
+    still be polled."""
+
+    def __init__(self, workers: int = INGEST_WORKERS, max_queued: int = INGEST_QUEUE_SIZE, history: int = INGEST_JOB_HISTORY):
+        self.workers = workers
+        self.history = history
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _start_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"ingest-{number}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, job: IngestionJob, handler: Callable[[IngestionJob], None]) -> IngestionJob:
+        self._start_workers()
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if oldest.finished_at is None:
+                    break
+                del self._jobs[oldest_id]
+        try:
+            self._queue.put_nowait((job, handler))
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            raise QueueFull(f"Ingestion queue is full ({self._queue.maxsize} jobs waiting)")
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_job_for(self, document_id: int) -> Optional[IngestionJob]:
+        with self._lock:
+            for job in self._jobs.values():
+                if job.document_id == document_id and job.finished_at is None:
+                    return job
+        return None
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            job, handler = self._queue.get()
+            job.status = "running"
+            try:
+                handler(job)
+                job.enter_stage("done")
+                job.status = "succeeded"
+            except Exception as e:
+                print(f"Ingestion job {job.id} failed in stage {job.stage}: {str(e)}")
+                job.error = str(e)
+                job.status = "failed"
+                job.enter_stage("failed")
+            finally:
+                job.finished_at = time.time()
+                self._queue.task_done()
+
+
+ingestion_queue = IngestionQueue()
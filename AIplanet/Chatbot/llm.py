@@ -0,0 +1,130 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator
+from Chatbot.admission import Busy
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-pro")
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.4"))
+# Per call, including each retry; a slot that doesn't free up within this
+# long is reported as busy rather than waited on.
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Point the client at another server (e.g. a local stub) with
+# LLM_API_ENDPOINT=http://127.0.0.1:8080; plain-HTTP endpoints need the
+# "rest" transport, which is then the default.
+LLM_API_ENDPOINT = os.getenv("LLM_API_ENDPOINT")
+LLM_TRANSPORT = os.getenv("LLM_TRANSPORT") or ("rest" if LLM_API_ENDPOINT else None)
+
+
+def build_chat_model():
+    """The Gemini chat client, with a timeout and bounded retries. Built once
+    per process (see Chatbot.chatbot.get_chat_model) so its HTTP or gRPC
+    connections are reused between questions."""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    options = {}
+    if LLM_API_ENDPOINT:
+        options["client_options"] = {"api_endpoint": LLM_API_ENDPOINT}
+    if LLM_TRANSPORT:
+        options["transport"] = LLM_TRANSPORT
+    return ChatGoogleGenerativeAI(
+        model=LLM_MODEL,
+        temperature=LLM_TEMPERATURE,
+        timeout=LLM_TIMEOUT_SECONDS,
+        max_retries=LLM_MAX_RETRIES,
+        **options,
+    )
+
+
+def request_key(question: str, docs) -> str:
+    """Identifies a model request by everything that goes into its prompt."""
+    digest = hashlib.sha256(LLM_MODEL.encode("utf-8"))
+    digest.update(b"\0" + question.encode("utf-8"))
+    for doc in docs:
+        digest.update(b"\0" + doc.page_content.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time. Callers arriving while a call
+    for their key is in flight wait for it and share its result (or
+    exception) instead of making their own. Nothing is kept once the call
+    returns."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+
+class LLMGate:
+    """Caps concurrent model calls at `max_concurrency` across the process
+    and coalesces identical ones. A caller that can't get a slot within
+    `wait_timeout` seconds gets Busy."""
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, wait_timeout: float = LLM_TIMEOUT_SECONDS):
+        self.max_concurrency = max(1, max_concurrency)
+        self.wait_timeout = wait_timeout
+        self.flight = SingleFlight()
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self.running = 0
+
+    @contextmanager
+    def slot(self):
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            raise Busy("The language model is busy, please try again shortly.")
+        with self._lock:
+            self.running += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.running -= 1
+            self._slots.release()
+
+    def call(self, key: str, fn: Callable):
+        """fn(), unless an identical call (same key) is already in flight, in
+        which case its result."""
+        def limited():
+            with self.slot():
+                return fn()
+        return self.flight.do(key, limited)
+
+    def stream(self, start: Callable[[], Iterable]) -> Iterator:
+        """Yield from start(), holding a slot until the stream ends. Streams
+        aren't coalesced: each caller reads its own tokens."""
+        with self.slot():
+            yield from start()
+
+
+llm_gate = LLMGate()
@@ -0,0 +1,147 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, List, Tuple
+from prometheus_client import CollectorRegistry, Counter, Histogram, ProcessCollector
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Everything is registered here rather than on prometheus_client's global
+# registry, so /metrics shows only what this app defines (plus process stats).
+registry = CollectorRegistry()
+ProcessCollector(registry=registry)
+
+# Request and stage latencies run from ~1ms (a cached answer) to tens of
+# seconds (embedding or answering against a slow API).
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "aiplanet_stage_seconds",
+    "Time spent in each pipeline stage, excluding time in nested stages.",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+    registry=registry,
+)
+STAGE_ERRORS = Counter("aiplanet_stage_errors_total", "Stages that raised.", ["stage"], registry=registry)
+REQUEST_SECONDS = Histogram(
+    "aiplanet_request_seconds",
+    "HTTP request latency by route.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+    registry=registry,
+)
+QUESTION_SECONDS = Histogram(
+    "aiplanet_question_seconds",
+    "Websocket question latency, from receipt to the last message sent.",
+    ["outcome"],
+    buckets=LATENCY_BUCKETS,
+    registry=registry,
+)
+QUESTIONS = Counter("aiplanet_questions_total", "Questions answered, by outcome.", ["outcome"], registry=registry)
+UPLOADS = Counter("aiplanet_uploads_total", "Uploads received, by outcome.", ["outcome"], registry=registry)
+RATE_LIMITED = Counter("aiplanet_rate_limited_total", "Requests refused by the rate limiter.", ["scope"], registry=registry)
+CONTEXT_TOKENS = Histogram(
+    "aiplanet_context_tokens",
+    "Prompt context size per question; 'saved' is the baseline minus what was sent.",
+    ["kind"],
+    buckets=(0, 64, 128, 256, 512, 1024, 1536, 2048, 4096, 8192),
+    registry=registry,
+)
+
+_local = threading.local()
+
+
+def _stack() -> List[float]:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+class _Timer:
+    """Self time of one stage: elapsed time minus time in stages nested in
+    it on the same thread, so a stage that pulls from another (chunking
+    from extraction) isn't charged for it."""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self._began = time.perf_counter()
+        _stack().append(0.0)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._began
+        stack = _stack()
+        nested = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        self.elapsed += elapsed - nested
+        if exc_type is not None:
+            STAGE_ERRORS.labels(self.stage).inc()
+        return False
+
+
+@contextmanager
+def span(stage: str):
+    """Time a block as one observation of `stage`."""
+    timer = _Timer(stage)
+    try:
+        with timer:
+            yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(timer.elapsed)
+
+
+def timed(items: Iterable, stage: str) -> Iterator:
+    """Yield from `items`, recording the total time spent producing them as
+    one observation of `stage` once the iterator is exhausted or closed."""
+    timer = _Timer(stage)
+    iterator = iter(items)
+    try:
+        while True:
+            with timer:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        STAGE_SECONDS.labels(stage).observe(timer.elapsed)
+
+
+class LiveStats:
+    """Gauges and counters read from live objects at scrape time, for state
+    the app already tracks (queue depths, cache hit counts, index sizes).
+
+    Each source returns a number, or a dict of label value -> number for a
+    metric with one label."""
+
+    def __init__(self):
+        self._sources: List[Tuple[str, str, str, str, Callable]] = []
+
+    def gauge(self, name: str, documentation: str, source: Callable, label: str = None):
+        self._sources.append(("gauge", name, documentation, label, source))
+
+    def counter(self, name: str, documentation: str, source: Callable, label: str = None):
+        self._sources.append(("counter", name, documentation, label, source))
+
+    def collect(self):
+        for kind, name, documentation, label, source in self._sources:
+            family = GaugeMetricFamily if kind == "gauge" else CounterMetricFamily
+            try:
+                value = source()
+            except Exception as e:
+                print(f"Could not read metric {name}: {str(e)}")
+                continue
+            if label is None:
+                yield family(name, documentation, value=value)
+                continue
+            metric = family(name, documentation, labels=[label])
+            for label_value, number in value.items():
+                metric.add_metric([str(label_value)], number)
+            yield metric
+
+
+live_stats = LiveStats()
+registry.register(live_stats)
@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Tuple
+
+# With REDIS_URL set, buckets live in Redis and are shared by every worker;
+# without it (or while Redis is unreachable) each process keeps its own.
+REDIS_URL = os.getenv("REDIS_URL")
+RATE_LIMIT_PREFIX = os.getenv("RATE_LIMIT_PREFIX", "ratelimit")
+UPLOAD_RATE_LIMIT = os.getenv("UPLOAD_RATE_LIMIT", "5/minute")
+WS_MESSAGE_RATE_LIMIT = os.getenv("WS_MESSAGE_RATE_LIMIT", "5/minute")
+BATCH_RATE_LIMIT = os.getenv("BATCH_RATE_LIMIT", "5/minute")
+# Round trips slower than this fall back to the in-process buckets, and
+# Redis is not tried again for REDIS_RETRY_SECONDS.
+REDIS_TIMEOUT_SECONDS = float(os.getenv("REDIS_TIMEOUT_SECONDS", "0.25"))
+REDIS_RETRY_SECONDS = float(os.getenv("REDIS_RETRY_SECONDS", "5"))
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# Refill, take and store in one atomic step. Redis's clock is used so
+# workers on different hosts agree on elapsed time; the float reply is
+# returned as a string because Lua numbers are truncated to integers.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(retry_after)}
+"""
+
+
+@dataclass(frozen=True)
+class Rate:
+    capacity: float
+    per_second: float
+
+    @classmethod
+    def parse(cls, spec: str) -> "Rate":
+        """Parse "5/minute" (or "5/10 seconds") into a bucket that holds 5
+        tokens and refills at 5 per minute."""
+        try:
+            amount, period = spec.split("/", 1)
+            parts = period.split()
+            count = float(parts[0]) if len(parts) == 2 else 1
+            seconds = PERIODS[parts[-1].rstrip("s")] * count
+            amount = float(amount)
+        except (ValueError, KeyError, IndexError):
+            raise ValueError(f"Invalid rate {spec!r}; expected e.g. '5/minute'")
+        if amount <= 0 or seconds <= 0:
+            raise ValueError(f"Invalid rate {spec!r}; amount and period must be positive")
+        return cls(capacity=amount, per_second=amount / seconds)
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    retry_after: float = 0.0
+
+
+def take(tokens, ts, now, rate: Rate, cost: float = 1) -> Tuple[bool, float, float]:
+    """The bucket arithmetic of TOKEN_BUCKET_SCRIPT: returns (allowed,
+    tokens left, seconds until `cost` tokens are available)."""
+    tokens = rate.capacity if tokens is None else tokens
+    ts = now if ts is None else ts
+    tokens = min(rate.capacity, tokens + max(0.0, now - ts) * rate.per_second)
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / rate.per_second
+
+
+class LocalBuckets:
+    """In-process token buckets: a dict of (tokens, last refill, time full)
+    per key.
+    Idle buckets are dropped once they would have refilled completely."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def hit(self, key: str, rate: Rate, cost: float = 1) -> RateLimitResult:
+        with self._lock:
+            now = self.clock()
+            tokens, ts, _ = self._buckets.get(key, (None, None, None))
+            allowed, tokens, retry_after = take(tokens, ts, now, rate, cost)
+            self._buckets[key] = (tokens, now, now + rate.capacity / rate.per_second)
+            if now >= self._next_sweep:
+                self._sweep(now)
+            return RateLimitResult(allowed, retry_after)
+
+    def _sweep(self, now):
+        for key in [key for key, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+            del self._buckets[key]
+        self._next_sweep = now + 60
+
+
+class TokenBucketLimiter:
+    """Token-bucket rate limits shared across workers through Redis.
+
+    Each check is a single EVALSHA of TOKEN_BUCKET_SCRIPT, so it costs one
+    round trip and O(1) work regardless of traffic. Without a Redis client,
+    or when a call fails, the check is made against in-process buckets."""
+
+    def __init__(self, client=None, prefix: str = RATE_LIMIT_PREFIX, local: LocalBuckets = None):
+        self.client = client
+        self.prefix = prefix
+        self.local = local or LocalBuckets()
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT) if client is not None else None
+        self._retry_at = None
+
+    @classmethod
+    def from_url(cls, url: str = REDIS_URL, **kwargs) -> "TokenBucketLimiter":
+        if not url:
+            return cls(**kwargs)
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(
+            url,
+            socket_timeout=REDIS_TIMEOUT_SECONDS,
+            socket_connect_timeout=REDIS_TIMEOUT_SECONDS,
+        )
+        return cls(client=client, **kwargs)
+
+    @property
+    def shared(self) -> bool:
+        return self._script is not None
+
+    async def hit(self, scope: str, identity: str, rate: Rate, cost: float = 1) -> RateLimitResult:
+        key = f"{self.prefix}:{scope}:{identity}"
+        if self._script is None or (self._retry_at is not None and time.monotonic() < self._retry_at):
+            return self.local.hit(key, rate, cost)
+        try:
+            allowed, retry_after = await self._script(keys=[key], args=[rate.capacity, rate.per_second, cost])
+        except Exception as e:
+            if self._retry_at is None:
+                print(f"Rate limiter falling back to in-process buckets: {str(e)}")
+            self._retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+            return self.local.hit(key, rate, cost)
+        if self._retry_at is not None:
+            print("Rate limiter reconnected to Redis")
+            self._retry_at = None
+        return RateLimitResult(bool(int(allowed)), float(retry_after))
+
+
+rate_limiter = TokenBucketLimiter.from_url()
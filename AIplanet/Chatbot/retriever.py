@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+import time
+import uuid
+from Chatbot.embedding_backends import configured_spec, create_embeddings, read_spec
+from Chatbot.vector_store import MappedVectorStore
+
+INDEX_DIR = "faiss"
+LEGACY_INDEX_PATH = os.path.join(INDEX_DIR, "index.faiss")
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+
+def get_embeddings():
+    """Return the process-wide embeddings client for EMBEDDING_BACKEND,
+    creating it on first use."""
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                _embeddings = create_embeddings()
+    return _embeddings
+
+
+def embeddings_match(index_path: str) -> bool:
+    """Whether the index in `index_path` was built by the configured
+    embedding backend, so queries embedded now can search it."""
+    return configured_spec().serves(read_spec(index_path))
+
+
+def version_file_for(index_path: str) -> str:
+    return os.path.join(index_path, "VERSION")
+
+
+def read_index_version(version_file: str):
+    """Return (version, index path) of the published index, or (None, None)."""
+    try:
+        with open(version_file) as f:
+            data = json.load(f)
+        return data.get("version"), data.get("path")
+    except (FileNotFoundError, ValueError):
+        return None, None
+
+
+def new_index_version() -> str:
+    return f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+
+
+def publish_index_version(index_path: str, version_file: str = None, version: str = None) -> str:
+    """Point readers at `index_path` under a new version so every process
+    reloads on its next question."""
+    version_file = version_file or version_file_for(index_path)
+    version = version or new_index_version()
+    os.makedirs(os.path.dirname(version_file) or ".", exist_ok=True)
+    tmp_path = f"{version_file}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": version, "path": index_path}, f)
+    os.replace(tmp_path, version_file)
+    return version
+
+
+class VectorStoreCache:
+    """Keeps one loaded vector store per process and reloads it only when the
+    published index version changes."""
+
+    def __init__(self, index_path: str, version_file: str = None):
+        self.index_path = index_path
+        self.version_file = version_file or version_file_for(index_path)
+        self._lock = threading.Lock()
+        self._store = None
+        self._version = None
+        self._path = None
+        self._loaded = False
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def loaded_store(self):
+        """The store currently in memory, without loading one."""
+        return self._store
+
+    @property
+    def loaded_path(self):
+        """Directory the current store was loaded from (None before loading)."""
+        return self._path
+
+    def active_path(self) -> str:
+        _, path = read_index_version(self.version_file)
+        return path or self.index_path
+
+    def has_index(self) -> bool:
+        path = self.active_path()
+        return MappedVectorStore.exists(path) and embeddings_match(path)
+
+    def get(self):
+        version, path = read_index_version(self.version_file)
+        if self._loaded and version == self._version:
+            return self._store
+
+        with self._lock:
+            if self._loaded and version == self._version:
+                return self._store
+            path = path or self.index_path
+            if not MappedVectorStore.exists(path):
+                if os.path.exists(os.path.join(path, "index.pkl")):
+                    print(f"Ignoring pickled index at {path}; re-upload the document to rebuild it")
+                return None
+            if not embeddings_match(path):
+                print(f"Ignoring index at {path}: built with {read_spec(path)}, but {configured_spec()} is configured; re-upload the document to rebuild it")
+                return None
+            print(f"Loading vector store {path} (version {version})...")
+            self._store = MappedVectorStore.load_local(path, get_embeddings())
+            self._version = version
+            self._path = path
+            self._loaded = True
+            return self._store
+
+    def set(self, store, version: str, path: str = None):
+        """Install a store this process just built, avoiding a reload from disk."""
+        with self._lock:
+            self._store = store
+            self._version = version
+            self._path = path or self.active_path()
+            self._loaded = True
+
+    def clear(self):
+        with self._lock:
+            self._store = None
+            self._version = None
+            self._path = None
+            self._loaded = False
+
@@ -0,0 +1,88 @@
+import os
+import re
+from typing import List, Optional, Sequence
+from langchain_core.documents import Document
+
+# "vector": embeddings only (one embedding API call per question).
+# "keyword": BM25 over the chunk text, falling back to vectors on no match.
+# "hybrid": both, merged with reciprocal rank fusion.
+# "auto": keyword for lookup-style questions (codes, numbers, quoted
+#         phrases) when every looked-up term is found, vectors otherwise.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "auto")
+RETRIEVAL_MODES = ("vector", "keyword", "hybrid", "auto")
+# Standard RRF damping constant (Cormack et al., 2009).
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+_PHRASE_RE = re.compile(r'"([^"]+)"')
+_WORD_RE = re.compile(r"\w+(?:[-./:]\w+)*")
+# Identifiers such as E-1042, 0x1F, XJ220/B, 3.2.1 or M8: letters/digits
+# containing at least one digit.
+_CODE_RE = re.compile(r"^(?=.*\d)\w+(?:[-./:]\w+)*$")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or our "
+    "please show tell that the this to was we what when where which who why with you".split()
+)
+
+
+def _quote(term: str) -> str:
+    # An FTS5 string is a phrase: tokens must appear adjacent and in order.
+    return '"' + term.replace('"', '""') + '"'
+
+
+def lookup_terms(question: str) -> List[str]:
+    """Quoted phrases and code-like tokens the question is looking up."""
+    terms = [phrase.strip() for phrase in _PHRASE_RE.findall(question) if phrase.strip()]
+    unquoted = _PHRASE_RE.sub(" ", question)
+    terms.extend(word for word in _WORD_RE.findall(unquoted) if _CODE_RE.match(word))
+    return terms
+
+
+def keyword_terms(question: str) -> List[str]:
+    """Quoted phrases plus every non-stopword in the question."""
+    terms = [phrase.strip() for phrase in _PHRASE_RE.findall(question) if phrase.strip()]
+    unquoted = _PHRASE_RE.sub(" ", question)
+    terms.extend(word for word in _WORD_RE.findall(unquoted) if word.lower() not in STOPWORDS)
+    return terms
+
+
+def match_expression(terms: Sequence[str], operator: str = "OR") -> Optional[str]:
+    """FTS5 MATCH expression for `terms`, or None when there are none."""
+    if not terms:
+        return None
+    return f" {operator} ".join(_quote(term) for term in dict.fromkeys(terms))
+
+
+def resolve_mode(mode: str = None) -> str:
+    mode = (mode or RETRIEVAL_MODE).lower()
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode {mode!r}; expected one of {', '.join(RETRIEVAL_MODES)}")
+    return mode
+
+
+def keyword_search(store, question: str, k: int, mode: str) -> List[Document]:
+    """BM25 hits for the question under `mode` (no embedding call).
+
+    In "auto" mode only lookup terms are searched and all of them must
+    match, so ordinary prose questions return nothing and go to vectors."""
+    if mode == "vector" or not hasattr(store, "keyword_search"):
+        return []
+    if mode == "auto":
+        match = match_expression(lookup_terms(question), "AND")
+    else:
+        match = match_expression(keyword_terms(question))
+    if match is None:
+        return []
+    return [doc for doc, _ in store.keyword_search(match, k)]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Document]], k: int, rrf_k: int = RRF_K) -> List[Document]:
+    """Merge ranked lists by summing 1 / (rrf_k + rank); documents are
+    identified by their id (the FAISS row)."""
+    scores, documents = {}, {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc.id if doc.id is not None else doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [documents[key] for key in best]
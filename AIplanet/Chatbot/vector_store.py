@@ -0,0 +1,308 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Sequence, Tuple
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from Chatbot.ann import apply_search_params, build_index
+from Chatbot.metrics import span
+
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.db"
+
+
+def _mapped_read_flags():
+    # Zero-copy mapping of flat codes needs faiss >= 1.8; plain MMAP maps
+    # inverted lists. Not every index type accepts every flag.
+    flags = []
+    if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        flags.append(faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    flags.append(faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    return flags
+
+
+def read_index_mapped(path: str):
+    """Read a FAISS index memory-mapped and read-only where the index type
+    supports it, so processes serving the same file share the page cache."""
+    for flags in _mapped_read_flags():
+        try:
+            return faiss.read_index(path, flags)
+        except RuntimeError:
+            continue
+    return faiss.read_index(path)
+
+
+def index_dimension(path: str) -> int:
+    """Vector dimension of the saved index in `path`."""
+    return read_index_mapped(os.path.join(path, INDEX_FILE)).d
+
+
+def _create_chunk_table(conn):
+    conn.execute("CREATE TABLE chunks (id INTEGER PRIMARY KEY, text TEXT NOT NULL, page INTEGER, metadata TEXT NOT NULL)")
+
+
+def _insert_chunks(conn, documents: Sequence[Document], first_row: int = 0):
+    conn.executemany(
+        "INSERT INTO chunks (id, text, page, metadata) VALUES (?, ?, ?, ?)",
+        [
+            (row, doc.page_content, doc.metadata.get("page"), json.dumps(doc.metadata))
+            for row, doc in enumerate(documents, start=first_row)
+        ],
+    )
+
+
+def _build_full_text_index(conn):
+    # External-content table: the index refers to chunks.text instead of
+    # storing a second copy of it.
+    conn.execute("CREATE VIRTUAL TABLE chunks_fts USING fts5(text, content='chunks', content_rowid='id')")
+    conn.execute("INSERT INTO chunks_fts (rowid, text) SELECT id, text FROM chunks")
+    conn.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('optimize')")
+
+
+def write_chunk_store(path: str, documents: Sequence[Document]):
+    """Write documents to a SQLite file keyed by their FAISS row number, with
+    an FTS5 index over the text for keyword search."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        _create_chunk_table(conn)
+        _insert_chunks(conn, documents)
+        _build_full_text_index(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+
+
+def _document(row: int, text: str, metadata: str) -> Document:
+    return Document(id=str(row), page_content=text, metadata=json.loads(metadata))
+
+
+class ChunkStore:
+    """Read-only access to a chunk file written by `write_chunk_store`.
+
+    The file never changes once published, so each thread opens it as an
+    immutable database and only the rows asked for are read."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def fetch(self, rows: Sequence[int]) -> dict:
+        rows = [int(row) for row in rows]
+        found = {}
+        # Stay well below SQLite's bound-parameter limit.
+        for start in range(0, len(rows), 500):
+            batch = rows[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            result = self._conn().execute(f"SELECT id, text, metadata FROM chunks WHERE id IN ({placeholders})", batch)
+            for row, text, metadata in result:
+                found[row] = _document(row, text, metadata)
+        return found
+
+    def keyword_search(self, match: str, k: int) -> List[Tuple[Document, float]]:
+        """Rows matching an FTS5 query, best BM25 score first. Scores are
+        negated bm25() values, so higher is better."""
+        try:
+            result = self._conn().execute(
+                "SELECT c.id, c.text, c.metadata, bm25(chunks_fts) FROM chunks_fts"
+                " JOIN chunks c ON c.id = chunks_fts.rowid"
+                " WHERE chunks_fts MATCH ? ORDER BY bm25(chunks_fts) LIMIT ?",
+                (match, k),
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            print(f"Keyword search unavailable: {str(e)}")
+            return []
+        return [(_document(row, text, metadata), -score) for row, text, metadata, score in result]
+
+
+class _InMemoryChunks:
+    def __init__(self, documents: Sequence[Document]):
+        self.documents = [
+            Document(id=str(row), page_content=doc.page_content, metadata=doc.metadata)
+            for row, doc in enumerate(documents)
+        ]
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def fetch(self, rows: Sequence[int]) -> dict:
+        return {int(row): self.documents[int(row)] for row in rows}
+
+    def keyword_search(self, match: str, k: int) -> List[Tuple[Document, float]]:
+        return []  # only saved stores have a full-text index
+
+
+class MappedVectorStore(VectorStore):
+    """FAISS vectors plus a SQLite chunk table, with no pickled state.
+
+    Row `i` of the index is chunk `i` of the chunk store. A store built in
+    this process keeps its documents in memory until `save_local`; a loaded
+    one maps the index read-only and reads chunk text only for the hits."""
+
+    def __init__(self, embedding: Embeddings, index, chunks):
+        self.embedding = embedding
+        self.index = index
+        self.chunks = chunks
+        try:
+            # IVF indexes need a row -> list map to look vectors up by row.
+            faiss.extract_index_ivf(index).make_direct_map()
+        except RuntimeError:
+            pass
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return self.index.ntotal
+
+    @classmethod
+    def from_vectors(cls, documents: Sequence[Document], vectors, embedding: Embeddings, **index_kwargs):
+        index = build_index(np.asarray(vectors, dtype=np.float32), **index_kwargs)
+        return cls(embedding, index, _InMemoryChunks(documents))
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, **kwargs):
+        metadatas = metadatas or [{} for _ in texts]
+        documents = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
+        return cls.from_vectors(documents, embedding.embed_documents(list(texts)), embedding, **kwargs)
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs):
+        raise TypeError(
+            "MappedVectorStore indexes are immutable and can't be added to; build the new "
+            "version with IndexWriter (or from_texts) and publish it with IndexRegistry.publish_with"
+        )
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, INDEX_FILE)) and os.path.exists(os.path.join(path, CHUNKS_FILE))
+
+    def save_local(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        documents = self.chunks.fetch(range(len(self.chunks)))
+        write_chunk_store(os.path.join(path, CHUNKS_FILE), [documents[row] for row in range(len(documents))])
+        index_path = os.path.join(path, INDEX_FILE)
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        faiss.write_index(self.index, tmp_path)
+        # Replace rather than overwrite: readers that mapped the old file keep
+        # a valid view of it until they reload.
+        os.replace(tmp_path, index_path)
+
+    @classmethod
+    def load_local(cls, path: str, embedding: Embeddings):
+        with span("index_load"):
+            index = read_index_mapped(os.path.join(path, INDEX_FILE))
+            apply_search_params(index)
+            return cls(embedding, index, ChunkStore(os.path.join(path, CHUNKS_FILE)))
+
+    def keyword_search(self, match: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """BM25 search over chunk text for an FTS5 MATCH expression; needs
+        no embedding call."""
+        return self.chunks.keyword_search(match, k)
+
+    def vectors_for(self, docs: Sequence[Document]):
+        """Stored vectors of search hits (as a matrix), or None when the
+        index can't reconstruct them."""
+        if not docs or any(doc.id is None for doc in docs):
+            return None
+        rows = np.asarray([int(doc.id) for doc in docs], dtype=np.int64)
+        try:
+            return self.index.reconstruct_batch(rows)
+        except RuntimeError:
+            return None
+
+    def similarity_search_with_score_by_vectors(self, embeddings, k: int = 4) -> List[List[Tuple[Document, float]]]:
+        """Search for many queries at once: one FAISS search over the query
+        matrix and one chunk-store read for all the hits."""
+        if not self.index.ntotal or not len(embeddings):
+            return [[] for _ in range(len(embeddings))]
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        distances, rows = self.index.search(queries, min(k, self.index.ntotal))
+        hits = [
+            [(int(row), float(distance)) for row, distance in zip(query_rows, query_distances) if row >= 0]
+            for query_rows, query_distances in zip(rows, distances)
+        ]
+        documents = self.chunks.fetch(list({row for query_hits in hits for row, _ in query_hits}))
+        return [[(documents[row], distance) for row, distance in query_hits if row in documents] for query_hits in hits]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vectors([embedding], k)[0]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k)
+
+
+class IndexWriter:
+    """Builds a saved store in `path` batch by batch.
+
+    Chunk rows go straight to SQLite and vectors to a flat float32 file, so
+    neither the document's text nor Python lists of its vectors are held in
+    memory; `finish` builds the FAISS index from the mapped vector file."""
+
+    VECTORS_FILE = "vectors.f32"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = 0
+        self.dimension = None
+        os.makedirs(path, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(path, CHUNKS_FILE))
+        _create_chunk_table(self._conn)
+        self._vectors = open(os.path.join(path, self.VECTORS_FILE), "wb")
+
+    def add(self, documents: Sequence[Document], vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(documents) != len(vectors):
+            raise ValueError(f"Got {len(vectors)} vectors for {len(documents)} chunks")
+        if not len(documents):
+            return
+        if self.dimension is None:
+            self.dimension = vectors.shape[1]
+        _insert_chunks(self._conn, documents, self.rows)
+        self._conn.commit()
+        self._vectors.write(vectors.tobytes())
+        self.rows += len(documents)
+
+    def finish(self, **index_kwargs) -> int:
+        """Build the FAISS and full-text indexes; returns the number of rows."""
+        self._vectors.close()
+        vectors_path = os.path.join(self.path, self.VECTORS_FILE)
+        try:
+            if not self.rows:
+                raise ValueError("No text to index")
+            _build_full_text_index(self._conn)
+            self._conn.commit()
+            vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(self.rows, self.dimension))
+            faiss.write_index(build_index(vectors, **index_kwargs), os.path.join(self.path, INDEX_FILE))
+            del vectors
+        finally:
+            self._conn.close()
+            os.remove(vectors_path)
+        return self.rows
+
+    def abort(self):
+        self._vectors.close()
+        self._conn.close()
@@ -0,0 +1,61 @@
+import threading
+import time
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+# Set when this module is first imported, which app.py does before its
+# other imports; readiness is reported relative to it.
+STARTED_AT = time.monotonic()
+
+
+class WarmUp:
+    """Start-up steps run in order on a background thread.
+
+    The server accepts connections straight away; `ready` turns true once
+    every step has run. A failing step is recorded and skipped, since the
+    work it would have done is retried lazily on first use anyway."""
+
+    def __init__(self, steps: Sequence[Tuple[str, Callable[[], object]]], started_at: float = STARTED_AT):
+        self.steps = list(steps)
+        self.started_at = started_at
+        self.stage: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.ready_after: Optional[float] = None
+        self._done = threading.Event()
+        self._thread = None
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="warm-up", daemon=True)
+        self._thread.start()
+        return self
+
+    def run(self):
+        for name, step in self.steps:
+            self.stage = name
+            began = time.monotonic()
+            try:
+                step()
+            except Exception as e:
+                print(f"Warm-up step {name} failed: {str(e)}")
+                self.errors[name] = str(e)
+            self.timings[name] = round(time.monotonic() - began, 4)
+        self.stage = None
+        self.ready_after = round(time.monotonic() - self.started_at, 4)
+        print(f"Ready {self.ready_after}s after start-up")
+        self._done.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> dict:
+        return {
+            "ready": self.ready,
+            "stage": self.stage,
+            "timings": dict(self.timings),
+            "errors": dict(self.errors),
+            "seconds_to_ready": self.ready_after,
+        }
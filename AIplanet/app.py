@@ -1,26 +1,78 @@
+from Chatbot.warmup import WarmUp  # first, so start-up is timed from here
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, Depends, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
+import asyncio
+from contextlib import asynccontextmanager
 import os
-import time
+import threading
 from dotenv import load_dotenv
-from Chatbot.chatbot import get_pdf_text, get_vector_store, user_input
-from database import get_db, PDFDocument
-import shutil
+from Chatbot.chatbot import answer_questions, get_conversational_chain, get_vector_store, user_input, user_input_stream
+from Chatbot.extraction import PAGE_SEPARATOR, PageText, iter_pdf_pages, shutdown_extraction_pool
+from Chatbot.admission import Busy, qa_executor
+from Chatbot.answer_cache import answer_cache
+from Chatbot.metrics import QUESTION_SECONDS, RATE_LIMITED, REQUEST_SECONDS, UPLOADS, live_stats, registry, span, timed
+from Chatbot import retriever
+from Chatbot.index_registry import index_registry
+from Chatbot.llm import llm_gate
+from Chatbot.ingestion import IngestionJob, QueueFull, ingestion_queue
+from Chatbot.rate_limit import BATCH_RATE_LIMIT, Rate, UPLOAD_RATE_LIMIT, WS_MESSAGE_RATE_LIMIT, rate_limiter
+from Chatbot.retriever import INDEX_DIR, LEGACY_INDEX_PATH, get_embeddings
+from database import get_db, DocumentPage, PDFDocument, SessionLocal
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from pydantic import BaseModel
+import hashlib
 import json
+import math
+import tempfile
+import time
+import uuid
+from typing import List, Optional
 
 load_dotenv()
 
-# Initialize rate limiter
-limiter = Limiter(key_func=get_remote_address)
-app = FastAPI()
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "cache/uploads")
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Room for the multipart boundary and part headers around the file.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+PAGE_COMMIT_BATCH = 32
+MAX_BATCH_QUESTIONS = int(os.getenv("MAX_BATCH_QUESTIONS", "500"))
+
+UPLOAD_RATE = Rate.parse(UPLOAD_RATE_LIMIT)
+WS_MESSAGE_RATE = Rate.parse(WS_MESSAGE_RATE_LIMIT)
+BATCH_RATE = Rate.parse(BATCH_RATE_LIMIT)
+
+# Nothing under faiss/ is deleted at start-up: superseded index versions are
+# removed by the registry's collector once no reader can need them.
+def prepare_index_directory():
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    if os.path.exists(LEGACY_INDEX_PATH):
+        print(f"Found pre-registry index at {LEGACY_INDEX_PATH}; it is kept but not served")
+
+def warm_up_steps():
+    """Heavy imports, clients and the active index, loaded off the request
+    path so the first question doesn't pay for them."""
+    return [
+        ("embeddings", get_embeddings),
+        ("chat_model", get_conversational_chain),
+        ("active_index", index_registry.get),
+    ]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    prepare_index_directory()
+    index_registry.start_collector()  # Remove superseded index versions
+    app.state.warm_up = WarmUp(warm_up_steps()).start()
+    yield
+    index_registry.stop_collector()
+    shutdown_extraction_pool()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS Middleware
 app.add_middleware(
@@ -31,172 +83,491 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Refuse oversized uploads from their Content-Length before the body is
+# read; spool_upload enforces the limit on the bytes actually received.
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    if request.url.path == "/upload/":
+        length = request.headers.get("content-length", "")
+        if length.isdigit() and int(length) > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"File is larger than {MAX_UPLOAD_BYTES} bytes"}
+            )
+    return await call_next(request)
+
+def client_address(connection) -> str:
+    return connection.client.host if connection.client else "unknown"
+
+def rate_limited(result) -> str:
+    return f"Rate limit exceeded, try again in {math.ceil(result.retry_after)} seconds"
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    began = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # The route template keeps label cardinality bounded.
+        route = request.scope.get("route")
+        REQUEST_SECONDS.labels(
+            request.method, route.path if route else "unmatched", str(status)
+        ).observe(time.perf_counter() - began)
+
+def embedding_cache_stats():
+    embeddings = retriever._embeddings
+    cache = getattr(embeddings, "cache", None)
+    return {"hit": cache.hits, "miss": cache.misses} if cache else {"hit": 0, "miss": 0}
+
+live_stats.gauge("aiplanet_ingest_queue_depth", "Ingestion jobs waiting for a worker.", ingestion_queue.depth)
+live_stats.gauge("aiplanet_qa_running", "Questions being answered.", lambda: qa_executor.running)
+live_stats.gauge("aiplanet_qa_queued", "Questions admitted and waiting for a worker.", lambda: qa_executor.queued)
+live_stats.counter("aiplanet_qa_rejected", "Questions refused as busy.", lambda: qa_executor.rejected)
+live_stats.counter(
+    "aiplanet_answer_cache_lookups", "Semantic answer cache lookups.",
+    lambda: {"hit": answer_cache.hits, "miss": answer_cache.misses}, label="result"
+)
+live_stats.gauge("aiplanet_answer_cache_entries", "Answers in the semantic cache.", lambda: len(answer_cache))
+live_stats.counter("aiplanet_embedding_cache_lookups", "Chunk embedding cache lookups.", embedding_cache_stats, label="result")
+live_stats.gauge("aiplanet_loaded_indexes", "Document indexes held in memory.", lambda: len(index_registry.loaded_sizes()))
+live_stats.gauge("aiplanet_index_vectors", "Vectors in each loaded document index.", index_registry.loaded_sizes, label="document_id")
+live_stats.gauge("aiplanet_llm_inflight", "Model calls in flight.", lambda: llm_gate.running)
+live_stats.counter("aiplanet_llm_calls", "Model calls made for non-streamed answers.", lambda: llm_gate.flight.calls)
+live_stats.counter("aiplanet_llm_coalesced", "Answers shared with an identical call already in flight.", lambda: llm_gate.flight.coalesced)
+live_stats.gauge("aiplanet_ws_connections", "Open websocket connections.", lambda: len(manager.active_connections))
+live_stats.gauge("aiplanet_rate_limit_buckets", "Token buckets held in process.", lambda: len(rate_limiter.local))
+
 # WebSocket connection manager
 class ConnectionManager:
     def __init__(self):
         self.active_connections: dict = {}
-        self.message_counts: dict = {}
 
     async def connect(self, websocket: WebSocket, client_id: str):
         await websocket.accept()
         self.active_connections[client_id] = websocket
-        self.message_counts[client_id] = {"count": 0, "last_reset": time.time()}
 
     async def disconnect(self, client_id: str):
-        if client_id in self.active_connections:
-            del self.active_connections[client_id]
-            del self.message_counts[client_id]
+        self.active_connections.pop(client_id, None)
 
-    def can_send_message(self, client_id: str) -> bool:
-        now = time.time()
-        client_data = self.message_counts.get(client_id, {"count": 0, "last_reset": now})
-        
-        if now - client_data["last_reset"] > 60:
-            client_data = {"count": 0, "last_reset": now}
-            self.message_counts[client_id] = client_data
+    async def can_send_message(self, websocket: WebSocket):
+        """Take a token from the client's message bucket, which is shared by
+        all of its connections."""
+        return await rate_limiter.hit("ws", client_address(websocket), WS_MESSAGE_RATE)
 
-        if client_data["count"] >= 5:
-            return False
+manager = ConnectionManager()
 
-        client_data["count"] += 1
-        self.message_counts[client_id] = client_data
-        return True
+def spool_upload(source):
+    """Copy an upload to a file under UPLOAD_DIR one block at a time, hashing
+    as it goes. Returns (path, size, sha256 hex digest)."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=UPLOAD_DIR)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with span("spool"), os.fdopen(fd, "wb") as out:
+            while True:
+                block = source.read(UPLOAD_CHUNK_BYTES)
+                if not block:
+                    break
+                size += len(block)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File is larger than {MAX_UPLOAD_BYTES} bytes"
+                    )
+                digest.update(block)
+                out.write(block)
+    except BaseException:
+        discard_upload(path)
+        raise
+    return path, size, digest.hexdigest()
 
-manager = ConnectionManager()
+def discard_upload(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def store_pages(db: Session, pdf_doc: PDFDocument, pages):
+    """Save pages to document_pages as they are extracted and pass them on
+    to chunking. page_count is only set once every page is stored."""
+    db.query(DocumentPage).filter(DocumentPage.document_id == pdf_doc.id).delete()
+    pdf_doc.page_count = None
+    db.commit()
+
+    batch, count, length, has_text = [], 0, 0, False
+    for page in pages:
+        batch.append({"document_id": pdf_doc.id, "page_number": page.page_number, "text": page.text})
+        count += 1
+        length = page.end
+        has_text = has_text or bool(page.text.strip())
+        if len(batch) >= PAGE_COMMIT_BATCH:
+            db.execute(insert(DocumentPage), batch)
+            db.commit()
+            batch = []
+        yield page
+    if batch:
+        db.execute(insert(DocumentPage), batch)
+    if not has_text:
+        db.commit()
+        raise ValueError("Could not extract text from PDF")
+    pdf_doc.page_count = count
+    pdf_doc.text_length = length
+    db.commit()
+    print(f"Extracted {count} pages, {length} characters")
+
+def stored_pages(db: Session, document_id: int):
+    """Read a document's stored pages back in order, a few at a time."""
+    offset = 0
+    rows = (
+        db.query(DocumentPage.page_number, DocumentPage.text)
+        .filter(DocumentPage.document_id == document_id)
+        .order_by(DocumentPage.page_number)
+        .yield_per(64)
+    )
+    for page_number, text in rows:
+        yield PageText(page_number=page_number, text=text, start=offset, end=offset + len(text))
+        offset += len(text) + len(PAGE_SEPARATOR)
 
-# Add this function before creating the FastAPI app
-def cleanup_faiss_directory():
+def ingest_document(job: IngestionJob, upload_path: str):
+    """Runs on an ingestion worker: extract pages from the spooled upload
+    (unless they are already stored) and chunk, embed and index them as
+    they arrive. The upload file is removed afterwards."""
+    db = SessionLocal()
     try:
-        if os.path.exists("faiss"):
-            shutil.rmtree("faiss")
-        os.makedirs("faiss", exist_ok=True)
-        print("FAISS directory cleaned up successfully")
-    except Exception as e:
-        print(f"Warning: Could not clean up FAISS directory: {str(e)}")
+        pdf_doc = db.get(PDFDocument, job.document_id)
+        if pdf_doc is None:
+            raise ValueError(f"Document {job.document_id} no longer exists")
 
-# Add this right after creating the FastAPI app
-cleanup_faiss_directory()  # Clean up at startup
+        # Pages are pulled lazily as chunking needs them; in_stage charges
+        # that time to "extract" (reading stored pages back counts too).
+        failed_pages = []
+        if pdf_doc.page_count is not None:
+            source = job.in_stage(timed(stored_pages(db, pdf_doc.id), "page_load"), "extract")
+        elif pdf_doc.text_content:
+            source = pdf_doc.text_content
+        else:
+            pages = timed(iter_pdf_pages(upload_path, failed_pages), "extract")
+            source = job.in_stage(timed(store_pages(db, pdf_doc, pages), "page_store"), "extract")
+
+        get_vector_store(source, pdf_doc.id, on_stage=job.enter_stage)
+        if failed_pages:
+            print(f"Skipped unreadable pages: {sorted(failed_pages)}")
+        pdf_doc.index_path = index_registry.path(pdf_doc.id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+        discard_upload(upload_path)
+
+def job_response(job: IngestionJob, message: str) -> dict:
+    return {
+        **job.to_dict(),
+        "message": message,
+        "status_url": f"/jobs/{job.id}",
+        "deduplicated": False
+    }
+
+async def enforce_rate(request: Request, scope: str, rate: Rate):
+    result = await rate_limiter.hit(scope, client_address(request), rate)
+    if not result.allowed:
+        RATE_LIMITED.labels(scope).inc()
+        raise HTTPException(
+            status_code=429,
+            detail=rate_limited(result),
+            headers={"Retry-After": str(math.ceil(result.retry_after))}
+        )
+
+async def limit_uploads(request: Request):
+    await enforce_rate(request, "upload", UPLOAD_RATE)
+
+async def limit_batches(request: Request):
+    await enforce_rate(request, "batch", BATCH_RATE)
 
 # Endpoint for PDF upload with rate limit
-@app.post("/upload/")
-@limiter.limit("5/minute")
+@app.post("/upload/", dependencies=[Depends(limit_uploads)])
 async def upload_file(request: Request, file: UploadFile = File(...), db: Session = Depends(get_db)):
-    print(f"Received file: {file.filename}, type: {type(file)}")
-    
     if not file.filename.lower().endswith('.pdf'):
+        UPLOADS.labels("rejected").inc()
         raise HTTPException(
             status_code=400, 
             detail="Only PDF files are allowed"
         )
     
+    upload_path = None
     try:
-        print("Reading file content...")
-        content = await file.read()
-        print(f"File size: {len(content)} bytes")
+        upload_path, size, content_hash = await asyncio.to_thread(spool_upload, file.file)
         
-        if len(content) == 0:
+        if size == 0:
             raise HTTPException(
                 status_code=400,
                 detail="Empty file uploaded"
             )
         
-        # Extract text from PDF
-        print("Extracting text from PDF...")
-        text = get_pdf_text(content)
-        print(f"Extracted text length: {len(text)} characters")
-        
-        if not text.strip():
-            raise HTTPException(
-                status_code=400,
-                detail="Could not extract text from PDF"
-            )
-        
-        # Save to database
-        print("Saving to database...")
-        try:
-            pdf_doc = PDFDocument(
-                filename=file.filename,
-                text_content=text
-            )
-            db.add(pdf_doc)
-            db.commit()
-            db.refresh(pdf_doc)
-            print("Saved to database successfully")
-        except Exception as db_error:
-            db.rollback()
-            print(f"Database error: {str(db_error)}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Database error: {str(db_error)}"
-            )
-        
-        # Create vector store
-        print("Creating vector store...")
+        existing = db.query(PDFDocument).filter(PDFDocument.content_hash == content_hash).first()
+        if existing and index_registry.activate(existing.id):
+            print(f"Duplicate upload of document {existing.id}, reusing its index")
+            UPLOADS.labels("deduplicated").inc()
+            return {
+                "filename": file.filename,
+                "document_id": existing.id,
+                "message": "PDF already processed, using existing index",
+                "text_length": existing.text_length if existing.text_length is not None else len(existing.text_content or ""),
+                "status": "succeeded",
+                "deduplicated": True
+            }
+
+        if existing:
+            # Known document whose index is missing or still being built.
+            pdf_doc = existing
+        else:
+            # Save to database
+            try:
+                pdf_doc = PDFDocument(
+                    filename=file.filename,
+                    content_hash=content_hash
+                )
+                db.add(pdf_doc)
+                db.commit()
+                db.refresh(pdf_doc)
+            except IntegrityError:
+                # A concurrent upload of the same file won the insert.
+                db.rollback()
+                pdf_doc = db.query(PDFDocument).filter(PDFDocument.content_hash == content_hash).one()
+            except Exception as db_error:
+                db.rollback()
+                print(f"Database error: {str(db_error)}")
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Database error: {str(db_error)}"
+                )
+
+        # Whether we found the document or lost the race to insert it,
+        # another upload may already be ingesting it.
+        job = ingestion_queue.active_job_for(pdf_doc.id)
+        if job:
+            UPLOADS.labels("in_progress").inc()
+            return JSONResponse(status_code=202, content=job_response(job, "PDF is already being processed"))
+
+        # Hand extraction and indexing to the ingestion workers
         try:
-            get_vector_store(text)
-            print("Vector store created successfully")
-        except Exception as vs_error:
-            print(f"Vector store error: {str(vs_error)}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Vector store error: {str(vs_error)}"
+            job = ingestion_queue.submit(
+                IngestionJob(document_id=pdf_doc.id, filename=file.filename),
+                lambda job, path=upload_path: ingest_document(job, path)
             )
+            upload_path = None  # the job owns the file now
+        except QueueFull as queue_error:
+            raise HTTPException(status_code=503, detail=str(queue_error))
+        print(f"Queued ingestion job {job.id} for document {pdf_doc.id}")
+        UPLOADS.labels("queued").inc()
+
+        return JSONResponse(status_code=202, content=job_response(job, "PDF uploaded, processing started"))
         
-        return {
-            "filename": file.filename,
-            "message": "PDF uploaded and processed successfully",
-            "text_length": len(text)
-        }
-        
-    except HTTPException:
+    except HTTPException as http_error:
+        UPLOADS.labels("rejected" if http_error.status_code < 500 else "error").inc()
         raise
     except Exception as e:
+        UPLOADS.labels("error").inc()
         print(f"Error processing upload: {str(e)}")
         db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Error processing file: {str(e)}"
         )
+    finally:
+        if upload_path:
+            discard_upload(upload_path)
+
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/ready")
+async def readiness():
+    """200 once start-up warm-up has finished, 503 until then."""
+    warm_up = getattr(app.state, "warm_up", None)
+    if warm_up is None:
+        return JSONResponse(status_code=503, content={"ready": False, "stage": None})
+    return JSONResponse(status_code=200 if warm_up.ready else 503, content=warm_up.to_dict())
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/documents/")
+async def list_documents(db: Session = Depends(get_db)):
+    active_id = index_registry.active_document_id()
+    return [
+        {
+            "document_id": doc.id,
+            "filename": doc.filename,
+            "indexed": index_registry.has(doc.id),
+            "active": doc.id == active_id
+        }
+        for doc in db.query(PDFDocument).order_by(PDFDocument.id).all()
+    ]
+
+@app.delete("/documents/{document_id}")
+async def delete_document(document_id: int, db: Session = Depends(get_db)):
+    pdf_doc = db.get(PDFDocument, document_id)
+    if pdf_doc is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    index_registry.remove(document_id)
+    db.query(DocumentPage).filter(DocumentPage.document_id == document_id).delete()
+    db.delete(pdf_doc)
+    db.commit()
+    return {"document_id": document_id, "message": "Document deleted"}
+
+class QuestionBatch(BaseModel):
+    questions: List[str]
+    mode: Optional[str] = None
+
+@app.post("/documents/{document_id}/questions", dependencies=[Depends(limit_batches)])
+async def ask_questions(document_id: int, batch: QuestionBatch):
+    """Answer many questions about one document in a single request, for
+    evaluation runs and other offline question sets. Answers come back in
+    the order the questions were sent."""
+    if not batch.questions:
+        raise HTTPException(status_code=400, detail="No questions given")
+    if len(batch.questions) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUESTIONS} questions per request")
+    if not index_registry.has_index(document_id):
+        raise HTTPException(status_code=404, detail="Document has no index; upload it first")
+    try:
+        # One admission slot for the whole batch; its model calls are
+        # bounded separately by BATCH_LLM_CONCURRENCY.
+        answers = await qa_executor.run(answer_questions, batch.questions, document_id, batch.mode)
+    except Busy as busy:
+        raise HTTPException(status_code=503, detail=str(busy))
+    except LookupError as missing:
+        raise HTTPException(status_code=404, detail=str(missing))
+    except ValueError as invalid:
+        raise HTTPException(status_code=400, detail=str(invalid))
+    return {"document_id": document_id, "answers": answers}
+
+def parse_question(message: str):
+    """Accept either a plain-text question or
+    {"question": ..., "document_id": ..., "stream": ...}."""
+    try:
+        data = json.loads(message)
+    except ValueError:
+        return message, None, False
+    if not isinstance(data, dict):
+        return message, None, False
+    document_id = data.get("document_id")
+    return (
+        str(data.get("question", "")),
+        int(document_id) if document_id is not None else None,
+        bool(data.get("stream", False))
+    )
+
+async def stream_answer(websocket: WebSocket, question: str, document_id):
+    """Relay user_input_stream events from a QA worker thread to the socket.
+    Raises Busy if the question can't be admitted."""
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    cancelled = threading.Event()
+
+    def produce():
+        try:
+            for event in user_input_stream(question, document_id):
+                if cancelled.is_set():
+                    break
+                loop.call_soon_threadsafe(events.put_nowait, event)
+        finally:
+            loop.call_soon_threadsafe(events.put_nowait, None)
+
+    future = qa_executor.submit(produce)
+    try:
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            await websocket.send_text(json.dumps(event))
+        await asyncio.wrap_future(future)
+    finally:
+        # Stop generating if the client went away mid-answer.
+        cancelled.set()
 
 # WebSocket endpoint for Q&A
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
+    client_id = uuid.uuid4().hex
+    await manager.connect(websocket, client_id)
     print("WebSocket connection established")
     
     try:
         while True:
             # Receive question
-            question = await websocket.receive_text()
-            print(f"\nReceived question: {question}")
-            
+            message = await websocket.receive_text()
+            began = time.perf_counter()
+            outcome = "answered"
+
             try:
-                if not os.path.exists("faiss/index.faiss"):
+                result = await manager.can_send_message(websocket)
+                if not result.allowed:
+                    outcome = "rate_limited"
+                    RATE_LIMITED.labels("ws").inc()
+                    await websocket.send_text(json.dumps({
+                        "error": rate_limited(result),
+                        "retry_after": result.retry_after
+                    }))
+                    continue
+
+                question, document_id, stream = parse_question(message)
+
+                if not index_registry.has_index(document_id):
+                    outcome = "no_index"
                     await websocket.send_text(json.dumps({
                         "error": "Please upload a PDF document first."
                     }))
                     continue
 
                 # Get response from chatbot
-                print("Processing question through user_input...")
-                response, docs = user_input(question)
-                print(f"Response received: {response}")
+                try:
+                    if stream:
+                        await stream_answer(websocket, question, document_id)
+                        continue
+                    response, docs = await qa_executor.run(user_input, question, document_id)
+                except Busy as busy:
+                    outcome = "busy"
+                    await websocket.send_text(json.dumps({
+                        "busy": True,
+                        "error": str(busy)
+                    }))
+                    continue
 
                 # Send response back to client
                 await websocket.send_text(json.dumps({
                     "response": response
                 }))
                 
+            except WebSocketDisconnect:
+                outcome = "disconnected"
+                raise
             except Exception as e:
+                outcome = "error"
                 print(f"Error processing question: {str(e)}")
                 await websocket.send_text(json.dumps({
                     "error": f"Error: {str(e)}"
                 }))
+            finally:
+                QUESTION_SECONDS.labels(outcome).observe(time.perf_counter() - began)
                 
     except WebSocketDisconnect:
         print("WebSocket disconnected")
     except Exception as e:
         print(f"WebSocket error: {str(e)}")
+    finally:
+        await manager.disconnect(client_id)
 
 # Root endpoint with HTML interface
 @app.get("/")
@@ -363,6 +734,21 @@ async def get():
                         display: inline-block;
                     }
 
+                    .sources {
+                        margin: -5px 0 10px 0;
+                        font-size: 13px;
+                        color: #555;
+                        max-width: 80%;
+                    }
+
+                    .source {
+                        margin-top: 5px;
+                        padding: 8px;
+                        background: #f1f3f5;
+                        border-left: 3px solid #4a90e2;
+                        white-space: pre-wrap;
+                    }
+
                     .pdf-icon {
                         color: #dc3545;
                         margin-right: 5px;
@@ -407,6 +793,7 @@ async def get():
                     const selectedFile = document.getElementById("selectedFile");
                     const currentPdf = document.getElementById("currentPdf");
                     const pdfName = document.getElementById("pdfName");
+                    let currentDocumentId = null;
 
                     // Show selected filename
                     pdfFile.addEventListener('change', function() {
@@ -439,8 +826,14 @@ async def get():
                             const result = await response.json();
                             
                             if (response.ok) {
-                                uploadStatus.innerHTML = `<div class="success">${result.message}</div>`;
+                                uploadStatus.innerHTML = `<div>${result.message}</div>`;
+                                if (result.status_url) {
+                                    await waitForJob(result.status_url);
+                                } else {
+                                    uploadStatus.innerHTML = `<div class="success">${result.message}</div>`;
+                                }
                                 chatHistory.innerHTML = '';
+                                currentDocumentId = result.document_id;
                                 // Show current PDF name
                                 currentPdf.style.display = 'inline-block';
                                 pdfName.textContent = fileInput.files[0].name;
@@ -452,12 +845,29 @@ async def get():
                         }
                     };
                     
+                    async function waitForJob(statusUrl) {
+                        while (true) {
+                            const job = await (await fetch(statusUrl)).json();
+                            if (job.status === "succeeded") {
+                                uploadStatus.innerHTML = '<div class="success">PDF uploaded and processed successfully</div>';
+                                return;
+                            }
+                            if (job.status === "failed") {
+                                uploadStatus.innerHTML = `<div class="error">Processing failed: ${job.error}</div>`;
+                                throw new Error(job.error);
+                            }
+                            uploadStatus.innerHTML = `<div>Processing (${job.stage}, ${Math.round(job.progress * 100)}%)...</div>`;
+                            await new Promise(resolve => setTimeout(resolve, 500));
+                        }
+                    }
+                    
                     function addMessage(text, isQuestion) {
                         const div = document.createElement('div');
                         div.className = `chat-message ${isQuestion ? 'question' : 'answer'}`;
                         div.textContent = text;
                         chatHistory.appendChild(div);
                         chatHistory.scrollTop = chatHistory.scrollHeight;
+                        return div;
                     }
                     
                     function askQuestion() {
@@ -466,7 +876,11 @@ async def get():
                         
                         if (question) {
                             addMessage(question, true);
-                            socket.send(question);
+                            socket.send(JSON.stringify({
+                                question: question,
+                                document_id: currentDocumentId,
+                                stream: true
+                            }));
                             input.value = '';
                         }
                     }
@@ -477,9 +891,52 @@ async def get():
                         }
                     };
                     
+                    let streamingMessage = null;
+                    
+                    function addSources(sources) {
+                        if (!sources || !sources.length) {
+                            return;
+                        }
+                        const details = document.createElement('details');
+                        details.className = 'sources';
+                        const summary = document.createElement('summary');
+                        summary.textContent = `Sources (${sources.length})`;
+                        details.appendChild(summary);
+                        sources.forEach((source) => {
+                            const item = document.createElement('div');
+                            item.className = 'source';
+                            const page = source.metadata && source.metadata.page;
+                            item.textContent = page ? `[p. ${page}] ${source.content}` : source.content;
+                            details.appendChild(item);
+                        });
+                        chatHistory.appendChild(details);
+                        chatHistory.scrollTop = chatHistory.scrollHeight;
+                    }
+                    
                     socket.onmessage = (event) => {
                         const data = JSON.parse(event.data);
-                        if (data.error) {
+                        if (data.type === "token") {
+                            if (!streamingMessage) {
+                                streamingMessage = addMessage('', false);
+                            }
+                            streamingMessage.textContent += data.text;
+                            chatHistory.scrollTop = chatHistory.scrollHeight;
+                            return;
+                        }
+                        if (data.type === "final") {
+                            if (streamingMessage) {
+                                streamingMessage.textContent = data.response;
+                            } else {
+                                addMessage(data.response, false);
+                            }
+                            streamingMessage = null;
+                            addSources(data.sources);
+                            return;
+                        }
+                        streamingMessage = null;
+                        if (data.busy) {
+                            addMessage(data.error, false);
+                        } else if (data.error) {
                             addMessage(`Error: ${data.error}`, false);
                         } else {
                             addMessage(data.response, false);
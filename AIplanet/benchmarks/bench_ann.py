@@ -0,0 +1,108 @@
+"""Recall vs latency of FAISS index types on synthetic vectors.
+
+Generates overlapping clusters of vectors with a low intrinsic dimension
+(a rough stand-in for sentence embeddings; --spread sets the overlap),
+computes exact neighbours with a flat index and reports build/train time,
+per-query latency and recall@k for each index type and search setting.
+
+    python -m benchmarks.bench_ann --vectors 100000 --dim 768 --output ann.json
+"""
+import argparse
+import json
+import time
+import faiss
+import numpy as np
+from Chatbot.ann import apply_search_params, build_index, resolve_factory
+
+
+def synthetic_vectors(num_vectors, num_queries, dim, clusters, spread, intrinsic_dim, seed):
+    """Overlapping clusters in an `intrinsic_dim`-dimensional space,
+    projected to `dim` with a little noise. Like sentence embeddings, they
+    have no clean cluster boundaries, so a query's neighbours straddle IVF
+    cells and recall depends on nprobe; well-separated clusters made every
+    setting look perfect."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, intrinsic_dim))
+    projection = rng.normal(size=(intrinsic_dim, dim)) / np.sqrt(intrinsic_dim)
+    def sample(count):
+        latent = centres[rng.integers(0, clusters, size=count)] + spread * rng.normal(size=(count, intrinsic_dim))
+        points = (latent @ projection + 0.1 * rng.normal(size=(count, dim))).astype(np.float32)
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+    return sample(num_vectors), sample(num_queries)
+
+
+def measure(index, queries, truth, k, batch):
+    started = time.perf_counter()
+    if batch:
+        _, found = index.search(queries, k)
+    else:
+        found = np.vstack([index.search(query[None, :], k)[1] for query in queries])
+    elapsed = time.perf_counter() - started
+    hits = sum(len(set(found[row]) & set(truth[row])) for row in range(len(queries)))
+    return {
+        "recall": round(hits / truth.size, 4),
+        "latency_ms_per_query": round(1000 * elapsed / len(queries), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--spread", type=float, default=1.0, help="within-cluster spread relative to the spacing of cluster centres")
+    parser.add_argument("--intrinsic-dim", type=int, default=32)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--factories", default="flat,ivf,hnsw,ivfpq")
+    parser.add_argument("--nprobe", default="1,4,16,64")
+    parser.add_argument("--ef-search", default="16,64,256")
+    parser.add_argument("--batch", action="store_true", help="search all queries in one call")
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    vectors, queries = synthetic_vectors(
+        args.vectors, args.queries, args.dim, args.clusters, args.spread, args.intrinsic_dim, args.seed
+    )
+    exact = faiss.IndexFlatL2(args.dim)
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+
+    results = []
+    for factory in args.factories.split(","):
+        started = time.perf_counter()
+        index = build_index(vectors, factory)
+        build_seconds = time.perf_counter() - started
+        resolved = resolve_factory(factory, args.vectors, args.dim)
+
+        if "IVF" in resolved:
+            settings = [("nprobe", int(value)) for value in args.nprobe.split(",")]
+        elif "HNSW" in resolved:
+            settings = [("efSearch", int(value)) for value in args.ef_search.split(",")]
+        else:
+            settings = [(None, None)]
+
+        for name, value in settings:
+            if name == "nprobe":
+                apply_search_params(index, nprobe=value, ef_search=None)
+            elif name == "efSearch":
+                apply_search_params(index, nprobe=None, ef_search=value)
+            results.append({
+                "factory": resolved,
+                "setting": {name: value} if name else {},
+                "build_seconds": round(build_seconds, 3),
+                **measure(index, queries, truth, args.k, args.batch),
+            })
+            print(json.dumps(results[-1]))
+
+    report = json.dumps({
+        "vectors": args.vectors, "dim": args.dim, "queries": args.queries, "k": args.k, "results": results
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Compare the page-aware token chunker with the old character splitter.
+
+Builds a synthetic multi-page document with one planted fact per page,
+chunks it both ways, embeds the chunks with a local hashed TF-IDF embedder and
+reports chunk counts, embedded volume and retrieval recall@k.
+
+    python -m benchmarks.bench_chunking --pages 100 --output chunking.json
+"""
+import argparse
+import json
+import random
+import re
+import zlib
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from Chatbot.chunking import CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, chunk_pages, count_tokens
+from Chatbot.extraction import PAGE_SEPARATOR, ExtractedText, PageText
+
+WORDS = (
+    "system pump valve pressure operator manual section safety inspect procedure maintain filter "
+    "circuit sensor housing bracket motor cable panel switch reading gauge flow coolant seal"
+).split()
+
+
+def _hashed_counts(texts, dim):
+    counts = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in re.findall(r"\w+", text.lower()):
+            counts[row, zlib.crc32(token.encode()) % dim] += 1.0
+    return counts
+
+
+def tfidf_embedder(corpus, dim=4096):
+    """Hashed TF-IDF fitted on the chunk corpus; returns an embed(texts) function."""
+    document_frequency = (_hashed_counts(corpus, dim) > 0).sum(axis=0)
+    idf = np.log((1 + len(corpus)) / (1 + document_frequency)) + 1
+
+    def embed(texts):
+        vectors = np.log1p(_hashed_counts(texts, dim)) * idf
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+    return embed
+
+
+def make_document(num_pages, paragraphs_per_page, seed):
+    rng = random.Random(seed)
+    pages, facts = [], []
+    for number in range(1, num_pages + 1):
+        paragraphs = []
+        for _ in range(paragraphs_per_page):
+            sentences = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 16))).capitalize() + "." for _ in range(rng.randint(3, 6))]
+            paragraphs.append(" ".join(sentences))
+        fact = f"The torque setting for valve V{number} is {rng.randint(10, 99)} newton metres."
+        paragraphs.insert(rng.randrange(len(paragraphs) + 1), fact)
+        pages.append("\n\n".join(paragraphs))
+        facts.append((f"What is the torque setting for valve V{number}?", fact))
+
+    spans, offset = [], 0
+    for number, page in enumerate(pages, start=1):
+        spans.append(PageText(page_number=number, text=page, start=offset, end=offset + len(page)))
+        offset += len(page) + len(PAGE_SEPARATOR)
+    return ExtractedText(text=PAGE_SEPARATOR.join(pages), pages=spans), facts
+
+
+def evaluate(name, chunks, facts, ks):
+    embed = tfidf_embedder(chunks)
+    vectors = embed(chunks)
+    queries = embed([question for question, _ in facts])
+    ranking = np.argsort(-(queries @ vectors.T), axis=1)
+    recall = {}
+    for k in ks:
+        found = sum(any(fact in chunks[i] for i in ranking[q, :k]) for q, (_, fact) in enumerate(facts))
+        recall[f"recall@{k}"] = round(found / len(facts), 4)
+    tokens = [count_tokens(chunk) for chunk in chunks]
+    return {
+        "splitter": name,
+        "chunks": len(chunks),
+        "embedded_chars": sum(len(chunk) for chunk in chunks),
+        "embedded_tokens": sum(tokens),
+        "mean_chunk_tokens": round(float(np.mean(tokens)), 1),
+        **recall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--paragraphs-per-page", type=int, default=6)
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS)
+    parser.add_argument("--overlap-tokens", type=int, default=CHUNK_OVERLAP_TOKENS)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    extracted, facts = make_document(args.pages, args.paragraphs_per_page, args.seed)
+    ks = (1, 3, 7)
+
+    legacy = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=500).split_text(extracted.text)
+    paged = [chunk.text for chunk in chunk_pages(extracted, max_tokens=args.chunk_tokens, overlap_tokens=args.overlap_tokens)]
+
+    results = {
+        "document": {"pages": args.pages, "chars": len(extracted.text), "tokens": count_tokens(extracted.text)},
+        "results": [
+            evaluate("recursive_character_1000_500", legacy, facts, ks),
+            evaluate(f"page_token_{args.chunk_tokens}_{args.overlap_tokens}", paged, facts, ks),
+        ],
+    }
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
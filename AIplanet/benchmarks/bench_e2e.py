@@ -0,0 +1,313 @@
+"""End-to-end upload and question benchmark against local model stand-ins.
+
+Generates synthetic PDFs (one planted fact per page), uploads them through
+/upload/ and waits for their ingestion jobs, then asks questions over /ws
+from several concurrent connections (and, with --batch-size, through the
+batch endpoint). The Gemini embedding and chat models
+are replaced by the deterministic fakes in benchmarks.fakes, with
+configurable latency, so runs need no network or API key and are
+comparable between versions. Everything runs in a throwaway working
+directory with its own database, indexes and caches.
+
+Reports upload throughput per document size, question latency
+percentiles and peak RSS as JSON.
+
+    python -m benchmarks.bench_e2e --pages 1 10 100 1000 --questions 200 --output e2e.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+from benchmarks._pdf import make_pdf
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Far above anything a benchmark sends; the limiter itself is still exercised.
+UNLIMITED = "1000000/second"
+
+WORDS = (
+    "system pump valve pressure operator manual section safety inspect procedure maintain filter "
+    "circuit sensor housing bracket motor cable panel switch reading gauge flow coolant seal"
+).split()
+LINES_PER_PAGE = 30
+WORDS_PER_LINE = 12
+
+
+def make_document(num_pages: int, seed: int):
+    """PDF bytes and one question per page, answered by a fact on that page."""
+    rng = random.Random(seed)
+    pages, questions = [], []
+    for number in range(1, num_pages + 1):
+        lines = [" ".join(rng.choice(WORDS) for _ in range(WORDS_PER_LINE)) for _ in range(LINES_PER_PAGE - 1)]
+        lines.insert(rng.randrange(len(lines) + 1), f"The torque setting for valve V{seed}-{number} is {rng.randint(10, 99)} newton metres.")
+        pages.append(lines)
+        questions.append(f"What is the torque setting for valve V{seed}-{number}?")
+    return make_pdf(pages), questions
+
+
+def percentiles(values) -> dict:
+    if not values:
+        return {}
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        "count": int(len(values)),
+        "mean": round(float(values.mean()), 4),
+        "p50": round(float(np.percentile(values, 50)), 4),
+        "p95": round(float(np.percentile(values, 95)), 4),
+        "p99": round(float(np.percentile(values, 99)), 4),
+        "max": round(float(values.max()), 4),
+    }
+
+
+def peak_rss_mb() -> dict:
+    # ru_maxrss is in kilobytes on Linux; children are extraction workers.
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def prepare(workdir: str, args):
+    """Point the app at `workdir` and swap in the fakes. Must run before app
+    (and anything reading its configuration) is imported."""
+    sys.path.insert(0, REPO_DIR)
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "UPLOAD_RATE_LIMIT": UNLIMITED,
+        "WS_MESSAGE_RATE_LIMIT": UNLIMITED,
+        "BATCH_RATE_LIMIT": UNLIMITED,
+        "RETRIEVAL_MODE": args.retrieval_mode,
+        "EMBEDDING_BACKEND": args.embedding_backend,
+        "GOOGLE_API_KEY": "unused",
+    })
+    os.chdir(workdir)
+
+    from benchmarks.fakes import install_fakes
+
+    install_fakes(
+        dim=args.dim, embed_latency=args.embed_latency, embed_per_text=args.embed_per_text,
+        llm_latency=args.llm_latency, token_latency=args.token_latency, answer_tokens=args.answer_tokens,
+    )
+
+    from database.init_db import init_db
+    init_db()
+
+
+def wait_for_jobs(client, job_ids, timeout: float):
+    deadline = time.monotonic() + timeout
+    jobs = {}
+    while len(jobs) < len(job_ids):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{len(job_ids) - len(jobs)} ingestion jobs did not finish in {timeout}s")
+        for job_id in job_ids:
+            if job_id not in jobs:
+                job = client.get(f"/jobs/{job_id}").json()
+                if job["status"] in ("succeeded", "failed"):
+                    jobs[job_id] = job
+        time.sleep(0.01)
+    return [jobs[job_id] for job_id in job_ids]
+
+
+def bench_uploads(client, num_pages: int, documents: int, seed: int, timeout: float):
+    pdfs = [make_document(num_pages, seed + i) for i in range(documents)]
+    request_seconds, job_ids, document_ids = [], [], []
+    began = time.perf_counter()
+    for i, (pdf, _) in enumerate(pdfs):
+        sent = time.perf_counter()
+        response = client.post("/upload/", files={"file": (f"bench-{num_pages}-{i}.pdf", pdf, "application/pdf")})
+        request_seconds.append(time.perf_counter() - sent)
+        if response.status_code != 202:
+            raise RuntimeError(f"Upload failed with {response.status_code}: {response.text}")
+        job_ids.append(response.json()["job_id"])
+        document_ids.append(response.json()["document_id"])
+    jobs = wait_for_jobs(client, job_ids, timeout)
+    wall = time.perf_counter() - began
+
+    failed = [job["error"] for job in jobs if job["status"] == "failed"]
+    total_bytes = sum(len(pdf) for pdf, _ in pdfs)
+    questions = [(document_id, question) for document_id, (_, qs) in zip(document_ids, pdfs) for question in qs]
+    result = {
+        "pages": num_pages,
+        "documents": documents,
+        "bytes": total_bytes,
+        "failed": failed,
+        "wall_seconds": round(wall, 4),
+        "documents_per_second": round(documents / wall, 3),
+        "pages_per_second": round(documents * num_pages / wall, 2),
+        "megabytes_per_second": round(total_bytes / wall / 1e6, 3),
+        "upload_request_seconds": percentiles(request_seconds),
+        "ingest_seconds": percentiles([job["finished_at"] - job["created_at"] for job in jobs]),
+        "stage_seconds": {
+            stage: round(float(np.mean([job["timings"].get(stage, 0.0) for job in jobs])), 4)
+            for stage in sorted({stage for job in jobs for stage in job["timings"]})
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    return result, questions
+
+
+def bench_questions(client, questions, count: int, connections: int, stream: bool, seed: int):
+    """Ask `count` questions spread over `connections` websockets; latency
+    is from send to the final message (and to the first token when streaming)."""
+    rng = random.Random(seed)
+    asked = [rng.choice(questions) for _ in range(count)]
+    latencies, first_tokens, outcomes = [], [], {}
+    lock = threading.Lock()
+
+    def run(share):
+        with client.websocket_connect("/ws") as websocket:
+            for document_id, question in share:
+                sent = time.perf_counter()
+                websocket.send_text(json.dumps({"question": question, "document_id": document_id, "stream": stream}))
+                first = None
+                while True:
+                    message = websocket.receive_json()
+                    if first is None:
+                        first = time.perf_counter() - sent
+                    if not stream or message.get("type") in ("final", "error") or "error" in message:
+                        break
+                elapsed = time.perf_counter() - sent
+                outcome = "busy" if message.get("busy") else "error" if "error" in message else "answered"
+                with lock:
+                    latencies.append(elapsed)
+                    first_tokens.append(first)
+                    outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    threads = [threading.Thread(target=run, args=(asked[i::connections],)) for i in range(connections)]
+    began = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - began
+
+    result = {
+        "questions": count,
+        "connections": connections,
+        "stream": stream,
+        "outcomes": outcomes,
+        "wall_seconds": round(wall, 4),
+        "questions_per_second": round(count / wall, 2),
+        "latency_seconds": percentiles(latencies),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if stream:
+        result["first_token_seconds"] = percentiles(first_tokens)
+    return result
+
+
+def bench_batch(client, questions, count: int, batch_size: int, seed: int):
+    """Ask the same kind of question set as bench_questions through
+    /documents/{id}/questions, `batch_size` questions per request."""
+    rng = random.Random(seed)
+    by_document = {}
+    for document_id, question in (rng.choice(questions) for _ in range(count)):
+        by_document.setdefault(document_id, []).append(question)
+    latencies, outcomes = [], {}
+    began = time.perf_counter()
+    for document_id, asked in by_document.items():
+        for start in range(0, len(asked), batch_size):
+            sent = time.perf_counter()
+            response = client.post(f"/documents/{document_id}/questions", json={"questions": asked[start:start + batch_size]})
+            latencies.append(time.perf_counter() - sent)
+            if response.status_code != 200:
+                outcomes["failed"] = outcomes.get("failed", 0) + 1
+                continue
+            for answer in response.json()["answers"]:
+                outcome = "error" if "error" in answer else "answered"
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    wall = time.perf_counter() - began
+    return {
+        "questions": count,
+        "batch_size": batch_size,
+        "outcomes": outcomes,
+        "wall_seconds": round(wall, 4),
+        "questions_per_second": round(count / wall, 2),
+        "request_seconds": percentiles(latencies),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100, 1000], help="document sizes to upload")
+    parser.add_argument("--documents", type=int, default=3, help="documents uploaded per size")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--stream", action="store_true", help="ask for streamed answers")
+    parser.add_argument("--batch-size", type=int, default=0, help="also ask the questions through the batch endpoint, this many per request")
+    parser.add_argument("--retrieval-mode", default="auto")
+    parser.add_argument("--embedding-backend", default="gemini", help="'gemini' (the fake) or 'local' (in-process hashed n-grams)")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="seconds per embedding call")
+    parser.add_argument("--embed-per-text", type=float, default=0.0005, help="extra seconds per embedded text")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds to the first token")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="seconds per answer token")
+    parser.add_argument("--answer-tokens", type=int, default=40)
+    parser.add_argument("--job-timeout", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="keep databases and indexes here instead of a temporary directory")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench-e2e-")
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        prepare(workdir, args)
+        from fastapi.testclient import TestClient
+        import app as app_module
+
+        uploads, questions = [], []
+        with TestClient(app_module.app) as client:
+            app_module.app.state.warm_up.wait(60)
+            for i, num_pages in enumerate(args.pages):
+                result, asked = bench_uploads(client, num_pages, args.documents, args.seed + 1000 * i, args.job_timeout)
+                uploads.append(result)
+                questions.extend(asked)
+                print(json.dumps({key: result[key] for key in ("pages", "documents_per_second", "pages_per_second", "wall_seconds")}))
+            answered = bench_questions(client, questions, args.questions, args.connections, args.stream, args.seed)
+            print(json.dumps({"questions": answered["latency_seconds"]}))
+            batched = None
+            if args.batch_size:
+                from Chatbot.answer_cache import answer_cache
+                answer_cache.clear()  # don't let the websocket run's answers serve the batch
+                batched = bench_batch(client, questions, args.questions, args.batch_size, args.seed + 1)
+                print(json.dumps({"batch_questions_per_second": batched["questions_per_second"]}))
+    finally:
+        if not args.workdir:
+            os.chdir(REPO_DIR)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    peak = peak_rss_mb()  # before git runs as a child process
+    report = json.dumps({
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "uploads": uploads,
+        "questions": answered,
+        "batch": batched,
+        "peak_rss_mb": peak,
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
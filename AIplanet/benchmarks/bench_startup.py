@@ -0,0 +1,61 @@
+"""Import time and time-to-ready of the app in fresh interpreters.
+
+Each run starts a new Python process that imports app.py, enters the
+FastAPI lifespan (as uvicorn would) and polls /ready until warm-up has
+finished. Reports wall-clock seconds to "import app" and to ready, plus
+the per-step warm-up timings from the readiness endpoint.
+
+    python -m benchmarks.bench_startup --runs 5 --output startup.json
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import json, time
+began = time.perf_counter()
+import app
+imported = time.perf_counter() - began
+from fastapi.testclient import TestClient
+with TestClient(app.app) as client:
+    while True:
+        response = client.get("/ready")
+        if response.status_code == 200:
+            break
+        time.sleep(0.005)
+print(json.dumps({"import_seconds": imported, "ready_seconds": time.perf_counter() - began, "warm_up": response.json()}))
+"""
+
+
+def run_once():
+    output = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    runs = []
+    for _ in range(args.runs):
+        runs.append(run_once())
+        print(json.dumps({key: round(runs[-1][key], 4) for key in ("import_seconds", "ready_seconds")}))
+
+    report = json.dumps({
+        "runs": args.runs,
+        "import_seconds_median": round(statistics.median(run["import_seconds"] for run in runs), 4),
+        "ready_seconds_median": round(statistics.median(run["ready_seconds"] for run in runs), 4),
+        "results": runs,
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
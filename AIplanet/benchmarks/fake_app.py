@@ -0,0 +1,91 @@
+"""The app with the Gemini models replaced by benchmarks.fakes, for load tests.
+
+Importing this module sets the process up from the environment, so every
+uvicorn worker comes up the same way:
+
+    BENCH_WORKDIR        directory for the database, indexes and caches (default: cwd)
+    FAKE_EMBED_LATENCY   seconds per embedding call (default 0.05)
+    FAKE_LLM_LATENCY     seconds to the first answer token (default 0.3)
+    FAKE_TOKEN_LATENCY   seconds per answer token (default 0.005)
+    FAKE_ANSWER_TOKENS   answer length in tokens (default 40)
+
+Rate limits are lifted unless UPLOAD_RATE_LIMIT / WS_MESSAGE_RATE_LIMIT /
+BATCH_RATE_LIMIT are set. Run as a module to seed synthetic documents (their questions go to
+questions.json in the working directory) and serve them:
+
+    BENCH_WORKDIR=/tmp/load python -m benchmarks.fake_app --documents 4 --pages 20 --port 8765 --workers 2
+"""
+import argparse
+import json
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = os.path.abspath(os.getenv("BENCH_WORKDIR", "."))
+QUESTIONS_FILE = "questions.json"
+UNLIMITED = "1000000/second"
+
+sys.path.insert(0, REPO_DIR)
+os.makedirs(WORKDIR, exist_ok=True)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORKDIR, 'bench.db')}")
+os.environ.setdefault("UPLOAD_RATE_LIMIT", UNLIMITED)
+os.environ.setdefault("WS_MESSAGE_RATE_LIMIT", UNLIMITED)
+os.environ.setdefault("BATCH_RATE_LIMIT", UNLIMITED)
+os.environ.setdefault("GOOGLE_API_KEY", "unused")
+os.chdir(WORKDIR)
+
+from benchmarks.fakes import install_fakes  # noqa: E402
+from database.init_db import init_db  # noqa: E402
+
+install_fakes(
+    embed_latency=float(os.getenv("FAKE_EMBED_LATENCY", "0.05")),
+    llm_latency=float(os.getenv("FAKE_LLM_LATENCY", "0.3")),
+    token_latency=float(os.getenv("FAKE_TOKEN_LATENCY", "0.005")),
+    answer_tokens=int(os.getenv("FAKE_ANSWER_TOKENS", "40")),
+)
+init_db()
+
+from app import app  # noqa: E402
+
+
+def seed(documents: int, pages: int, seed: int = 0, timeout: float = 600):
+    """Upload synthetic documents and record [document_id, question] pairs
+    in QUESTIONS_FILE."""
+    from fastapi.testclient import TestClient
+    from benchmarks.bench_e2e import make_document, wait_for_jobs
+
+    questions, job_ids = [], []
+    with TestClient(app) as client:
+        for i in range(documents):
+            pdf, asked = make_document(pages, seed + i)
+            response = client.post("/upload/", files={"file": (f"load-{i}.pdf", pdf, "application/pdf")})
+            response.raise_for_status()
+            job_ids.append(response.json()["job_id"])
+            questions.extend([response.json()["document_id"], question] for question in asked)
+        failed = [job["error"] for job in wait_for_jobs(client, job_ids, timeout) if job["status"] == "failed"]
+    if failed:
+        raise RuntimeError(f"Seeding failed: {failed}")
+    with open(QUESTIONS_FILE, "w") as f:
+        json.dump(questions, f)
+    return questions
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.documents and not os.path.exists(QUESTIONS_FILE):
+        seed(args.documents, args.pages, args.seed)
+    uvicorn.run("benchmarks.fake_app:app", host=args.host, port=args.port, workers=args.workers, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Deterministic local stand-ins for the Gemini embedding and chat models.
+
+Both sleep for a configurable time per call so benchmarks can model API
+latency without a network or an API key.
+"""
+import functools
+import hashlib
+import re
+import time
+import zlib
+from typing import Any, Iterator, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeEmbeddings(Embeddings):
+    """Hashed bag-of-words vectors: texts sharing words get similar vectors,
+    so retrieval over them behaves roughly like retrieval over real
+    embeddings. `latency` is slept once per call, `per_text` per text."""
+
+    def __init__(self, model: str = None, dim: int = 768, latency: float = 0.0, per_text: float = 0.0, **kwargs):
+        self.model = model
+        self.dim = dim
+        self.latency = latency
+        self.per_text = per_text
+        self.calls = 0
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            vector[zlib.crc32(token.encode()) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str], task_type: str = None) -> List[List[float]]:
+        self.calls += 1
+        time.sleep(self.latency + self.per_text * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class FakeChatModel(BaseChatModel):
+    """Answers with `answer_tokens` words derived from the prompt, after
+    `latency` seconds to the first token and `token_latency` per token."""
+
+    latency: float = 0.0
+    token_latency: float = 0.0
+    answer_tokens: int = 40
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        seed = hashlib.sha256("".join(str(message.content) for message in messages).encode()).hexdigest()
+        return [f"w{seed[i % len(seed)]}{i} " for i in range(self.answer_tokens)]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        time.sleep(self.latency + self.token_latency * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for token in self._tokens(messages):
+            time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+def install_fakes(dim: int = 768, embed_latency: float = 0.0, embed_per_text: float = 0.0,
+                  llm_latency: float = 0.0, token_latency: float = 0.0, answer_tokens: int = 40):
+    """Make the app build the fakes instead of the Gemini clients. Call before
+    the first embedding or chat call; the real embedding pipeline, cache and
+    QA chain still run on top of them."""
+    import langchain_google_genai
+    from Chatbot import chatbot
+
+    langchain_google_genai.GoogleGenerativeAIEmbeddings = functools.partial(
+        FakeEmbeddings, dim=dim, latency=embed_latency, per_text=embed_per_text
+    )
+    chat_model = FakeChatModel(latency=llm_latency, token_latency=token_latency, answer_tokens=answer_tokens)
+    chatbot.get_chat_model = lambda: chat_model
@@ -0,0 +1,341 @@
+"""Concurrent websocket load generator with a soak-test mode.
+
+Opens N /ws clients and replays a question mix at a target arrival rate
+(open loop: arrivals don't wait for answers, and latency is measured from
+each question's scheduled time, so a slow server can't hide its queueing).
+With --rate 0 every client instead asks back to back.
+
+Without --url it starts benchmarks.fake_app (the app wired to the local
+model stand-ins) on a free port in a temporary directory, seeds it with
+synthetic documents and targets that; --workers sets its uvicorn workers.
+
+While running it samples the server's resident memory (summed over its
+process tree when it was started here, from /metrics otherwise) and its
+open-connection and rate-limit-bucket gauges. After the clients have
+disconnected it checks that per-client state went back down, so long
+--duration soak runs catch leaks as well as slow growth. The memory
+growth rate is only reported for runs of at least --min-slope-seconds.
+
+    python -m benchmarks.load_ws --clients 50 --rate 20 --duration 60 --output load.json
+    python -m benchmarks.load_ws --url ws://127.0.0.1:8000/ws --questions-file q.json --duration 3600
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import numpy as np
+from benchmarks.bench_e2e import REPO_DIR, git_commit, percentiles
+
+OUTCOMES = ("answered", "busy", "rate_limited", "error", "timeout", "disconnected")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, workdir: str, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "BENCH_WORKDIR": workdir,
+        "FAKE_EMBED_LATENCY": str(args.embed_latency),
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "FAKE_TOKEN_LATENCY": str(args.token_latency),
+        "FAKE_ANSWER_TOKENS": str(args.answer_tokens),
+    }
+    command = [
+        sys.executable, "-m", "benchmarks.fake_app", "--port", str(port), "--workers", str(args.workers),
+        "--documents", str(args.documents), "--pages", str(args.pages),
+    ]
+    return subprocess.Popen(command, cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+
+
+def wait_until_ready(base_url: str, server: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"Server exited: {server.stderr.read()[-2000:]}")
+        try:
+            with urllib.request.urlopen(f"{base_url}/ready", timeout=2) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"{base_url} not ready after {timeout}s")
+
+
+def process_tree_rss(pid: int) -> int:
+    """Resident bytes of a process and all its descendants (Linux)."""
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    return total
+
+
+def scrape(base_url: str) -> dict:
+    """Unlabelled samples from /metrics, by name."""
+    with urllib.request.urlopen(f"{base_url}/metrics", timeout=5) as response:
+        text = response.read().decode()
+    samples = {}
+    for match in re.finditer(r"^([a-zA-Z_:][\w:]*) ([-+\w.]+)$", text, re.MULTILINE):
+        samples[match.group(1)] = float(match.group(2))
+    return samples
+
+
+def scrape_max(base_url: str, name: str, tries: int) -> float:
+    # With several workers each scrape reaches one of them; take the worst.
+    return max(scrape(base_url).get(name, 0.0) for _ in range(tries))
+
+
+class Load:
+    def __init__(self, args, questions):
+        self.args = args
+        self.questions = questions
+        self.rng = random.Random(args.seed)
+        self.asked = []
+        self.results = []
+        self.first_tokens = []
+        self.queue = asyncio.Queue()
+        self.done = False
+
+    def next_question(self):
+        if self.asked and self.rng.random() < self.args.repeat_fraction:
+            question = self.rng.choice(self.asked)  # likely an answer cache hit
+        else:
+            question = self.rng.choice(self.questions)
+            self.asked.append(question)
+        return question, self.rng.random() < self.args.stream_fraction
+
+    async def arrivals(self, deadline: float):
+        """Poisson arrivals at --rate per second until the deadline or
+        --max-questions."""
+        count = 0
+        scheduled = time.perf_counter()
+        while scheduled < deadline and (not self.args.max_questions or count < self.args.max_questions):
+            scheduled += self.rng.expovariate(self.args.rate)
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            self.queue.put_nowait((scheduled, *self.next_question()))
+            count += 1
+        self.done = True
+
+    async def next_job(self, deadline: float):
+        if self.args.rate > 0:
+            while True:
+                try:
+                    return await asyncio.wait_for(self.queue.get(), timeout=0.1)
+                except asyncio.TimeoutError:
+                    if self.done and self.queue.empty():
+                        return None
+        if time.perf_counter() >= deadline or (self.args.max_questions and len(self.results) >= self.args.max_questions):
+            return None
+        return (time.perf_counter(), *self.next_question())
+
+    async def ask(self, websocket, scheduled, question, stream):
+        document_id, text = question
+        await websocket.send(json.dumps({"question": text, "document_id": document_id, "stream": stream}))
+        first = None
+        while True:
+            message = json.loads(await asyncio.wait_for(websocket.recv(), timeout=self.args.timeout))
+            if first is None:
+                first = time.perf_counter() - scheduled
+            if not stream or message.get("type") in ("final", "error") or "error" in message:
+                break
+        if message.get("busy"):
+            return "busy", first
+        if "retry_after" in message:
+            return "rate_limited", first
+        if "error" in message:
+            return "error", first
+        return "answered", first
+
+    async def client(self, deadline: float):
+        from websockets.asyncio.client import connect
+        from websockets.exceptions import ConnectionClosed
+
+        while True:
+            async with connect(self.args.url, open_timeout=self.args.timeout, max_size=None) as websocket:
+                for _ in range(self.args.reconnect_every or sys.maxsize):
+                    job = await self.next_job(deadline)
+                    if job is None:
+                        return
+                    scheduled, question, stream = job
+                    try:
+                        outcome, first = await self.ask(websocket, scheduled, question, stream)
+                    except asyncio.TimeoutError:
+                        outcome, first = "timeout", None
+                    except ConnectionClosed:
+                        outcome, first = "disconnected", None
+                    self.results.append((time.perf_counter(), outcome, time.perf_counter() - scheduled))
+                    if stream and first is not None and outcome == "answered":
+                        self.first_tokens.append(first)
+                    if outcome in ("timeout", "disconnected"):
+                        break  # the connection is in an unknown state
+
+
+async def sample(load, base_url, server_pid, interval, started, samples):
+    while True:
+        entry = {"seconds": round(time.perf_counter() - started, 2), "completed": len(load.results)}
+        try:
+            metrics = await asyncio.to_thread(scrape, base_url)
+            entry["ws_connections"] = metrics.get("aiplanet_ws_connections")
+            entry["rate_limit_buckets"] = metrics.get("aiplanet_rate_limit_buckets")
+            entry["rss_bytes"] = process_tree_rss(server_pid) if server_pid else metrics.get("process_resident_memory_bytes")
+        except OSError as e:
+            entry["error"] = str(e)
+        samples.append(entry)
+        await asyncio.sleep(interval)
+
+
+def memory_growth(samples, min_seconds: float) -> dict:
+    """RSS growth over the run, ignoring the first 10% as warm-up. The
+    growth rate, with a 95% confidence bound, is only reported once the
+    samples span `min_seconds`: over shorter runs warm-up dominates and an
+    hourly rate extrapolated from it is noise."""
+    points = [(s["seconds"], s["rss_bytes"]) for s in samples if s.get("rss_bytes")]
+    points = points[len(points) // 10:]
+    if len(points) < 2:
+        return {}
+    seconds, rss = (np.asarray(values, dtype=np.float64) for values in zip(*points))
+    growth = {
+        "start_mb": round(rss[0] / 2**20, 1),
+        "end_mb": round(rss[-1] / 2**20, 1),
+        "peak_mb": round(rss.max() / 2**20, 1),
+        "growth_mb": round((rss[-1] - rss[0]) / 2**20, 1),
+    }
+    span = seconds[-1] - seconds[0]
+    if span < min_seconds or len(points) < 3:
+        growth["slope_skipped"] = f"samples span {span:.0f}s, need {min_seconds:g}s (--min-slope-seconds)"
+        return growth
+    slope, intercept = np.polyfit(seconds, rss, 1)
+    residuals = rss - (slope * seconds + intercept)
+    stderr = np.sqrt(residuals @ residuals / (len(points) - 2) / ((seconds - seconds.mean()) ** 2).sum())
+    growth["slope_mb_per_hour"] = round(slope * 3600 / 2**20, 2)
+    growth["slope_ci95_mb_per_hour"] = round(1.96 * stderr * 3600 / 2**20, 2)
+    return growth
+
+
+async def run_load(args, questions, base_url, server_pid):
+    load = Load(args, questions)
+    samples = []
+    started = time.perf_counter()
+    deadline = started + args.duration
+    sampler = asyncio.create_task(sample(load, base_url, server_pid, args.sample_interval, started, samples))
+    tasks = [asyncio.create_task(load.client(deadline)) for _ in range(args.clients)]
+    if args.rate > 0:
+        tasks.append(asyncio.create_task(load.arrivals(deadline)))
+    failures = [result for result in await asyncio.gather(*tasks, return_exceptions=True) if isinstance(result, Exception)]
+    wall = time.perf_counter() - started
+    sampler.cancel()
+
+    # Give the server a moment to run its disconnect handlers.
+    await asyncio.sleep(1.0)
+    tries = 3 * args.workers
+    leftover = {
+        "ws_connections": await asyncio.to_thread(scrape_max, base_url, "aiplanet_ws_connections", tries),
+        "rate_limit_buckets": await asyncio.to_thread(scrape_max, base_url, "aiplanet_rate_limit_buckets", tries),
+    }
+
+    outcomes = {outcome: 0 for outcome in OUTCOMES}
+    for _, outcome, _ in load.results:
+        outcomes[outcome] += 1
+    total = len(load.results)
+    answered = [latency for _, outcome, latency in load.results if outcome == "answered"]
+    return {
+        "questions": total,
+        "wall_seconds": round(wall, 3),
+        "throughput_per_second": round(outcomes["answered"] / wall, 3) if wall else 0.0,
+        "offered_per_second": args.rate or None,
+        "outcomes": outcomes,
+        "error_rate": round((total - outcomes["answered"] - outcomes["busy"] - outcomes["rate_limited"]) / total, 4) if total else 0.0,
+        "busy_rate": round(outcomes["busy"] / total, 4) if total else 0.0,
+        "latency_seconds": percentiles(answered),
+        "first_token_seconds": percentiles(load.first_tokens),
+        "client_failures": [repr(failure) for failure in failures],
+        "memory": memory_growth(samples, args.min_slope_seconds),
+        "after_disconnect": leftover,
+        "leaked_connections": leftover["ws_connections"],
+        "samples": samples,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="websocket URL of a running server (default: start benchmarks.fake_app)")
+    parser.add_argument("--questions-file", help="JSON list of [document_id, question] (default: the seeded questions)")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=10.0, help="questions per second across all clients; 0 = closed loop")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to generate load for")
+    parser.add_argument("--max-questions", type=int, default=0)
+    parser.add_argument("--stream-fraction", type=float, default=0.5)
+    parser.add_argument("--repeat-fraction", type=float, default=0.1, help="share of questions asked before")
+    parser.add_argument("--reconnect-every", type=int, default=0, help="reconnect after this many questions (0 = never)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--sample-interval", type=float, default=1.0)
+    parser.add_argument("--min-slope-seconds", type=float, default=600.0, help="shortest sampled span to report a memory growth rate for")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the local server")
+    parser.add_argument("--documents", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    parser.add_argument("--answer-tokens", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    server, workdir = None, None
+    try:
+        if args.url:
+            base_url = re.sub(r"^ws", "http", args.url).rsplit("/ws", 1)[0]
+        else:
+            workdir = tempfile.mkdtemp(prefix="load-ws-")
+            port = free_port()
+            server = start_server(args, workdir, port)
+            base_url = f"http://127.0.0.1:{port}"
+            args.url = f"ws://127.0.0.1:{port}/ws"
+        wait_until_ready(base_url, server, timeout=600)
+
+        questions_file = args.questions_file or os.path.join(workdir, "questions.json")
+        with open(questions_file) as f:
+            questions = [tuple(question) for question in json.load(f)]
+
+        result = asyncio.run(run_load(args, questions, base_url, server.pid if server else None))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = json.dumps({"commit": git_commit(), "config": vars(args), **result}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    print(json.dumps({key: result[key] for key in ("throughput_per_second", "outcomes", "latency_seconds", "memory", "leaked_connections")}))
+    if not args.output:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
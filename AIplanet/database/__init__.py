@@ -1,2 +1,2 @@
 from .database import get_db, engine, Base, SessionLocal
-from .models import PDFDocument
+from .models import DocumentPage, PDFDocument
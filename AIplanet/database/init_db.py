@@ -2,12 +2,45 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from sqlalchemy import UniqueConstraint, inspect, text
 from database.database import Base, engine
 from database.models import PDFDocument
 
+def add_missing_columns():
+    # create_all() never alters existing tables, so add columns introduced
+    # after a database was first created.
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                print(f"Added column {table.name}.{column.name}")
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+            # SQLite can't add a constraint to a table, so added unique
+            # constraints become unique indexes, keeping the first of any
+            # rows that already break them.
+            named = {index["name"] for index in inspector.get_indexes(table.name)}
+            named |= {constraint["name"] for constraint in inspector.get_unique_constraints(table.name)}
+            for constraint in table.constraints:
+                if not isinstance(constraint, UniqueConstraint) or not constraint.name or constraint.name in named:
+                    continue
+                columns = ", ".join(column.name for column in constraint.columns)
+                key = table.primary_key.columns.values()[0].name
+                conn.execute(text(f"DELETE FROM {table.name} WHERE {key} NOT IN (SELECT MIN({key}) FROM {table.name} GROUP BY {columns})"))
+                conn.execute(text(f"CREATE UNIQUE INDEX {constraint.name} ON {table.name} ({columns})"))
+                print(f"Added unique index {table.name}.{constraint.name}")
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
     print("Database initialized!")
 
 if __name__ == "__main__":
-    init_db()
\ No newline at end of file
+    init_db()
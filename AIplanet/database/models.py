@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text
+from sqlalchemy import Column, ForeignKey, Integer, String, Text, UniqueConstraint
 from .database import Base
 
 class PDFDocument(Base):
@@ -6,4 +6,21 @@ class PDFDocument(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, index=True)
+    # Whole-document text from before pages were stored separately.
     text_content = Column(Text)
+    # SHA-256 of the uploaded bytes; repeat uploads are looked up by it.
+    content_hash = Column(String(64), unique=True, index=True)
+    # Set once the document's vector index has been built and saved.
+    index_path = Column(String, nullable=True)
+    # Set once every page is stored in document_pages.
+    page_count = Column(Integer, nullable=True)
+    text_length = Column(Integer, nullable=True)
+
+class DocumentPage(Base):
+    __tablename__ = "document_pages"
+    __table_args__ = (UniqueConstraint("document_id", "page_number", name="uq_document_pages_page"),)
+
+    id = Column(Integer, primary_key=True)
+    document_id = Column(Integer, ForeignKey("pdf_documents.id"), index=True, nullable=False)
+    page_number = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
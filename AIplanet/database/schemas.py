@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel
 
 class PDFDocumentCreate(BaseModel):
@@ -7,7 +8,8 @@ class PDFDocumentCreate(BaseModel):
 class PDFDocumentResponse(BaseModel):
     id: int
     filename: str
-    text_content: str
+    text_content: Optional[str] = None
+    content_hash: Optional[str] = None
 
     class Config:
         orm_mode = True
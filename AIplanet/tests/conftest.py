@@ -2,13 +2,22 @@ import pytest
 from fastapi.testclient import TestClient
 from pathlib import Path
 import asyncio
+import app as app_module
 from app import app
+from Chatbot.rate_limit import TokenBucketLimiter
 from database import Base, engine
+from database.init_db import add_missing_columns
 
 @pytest.fixture
 def test_client():
     return TestClient(app)
 
+@pytest.fixture(autouse=True)
+def fresh_rate_limits(monkeypatch):
+    # Every request from TestClient comes from "testclient"; don't let one
+    # test spend another's budget.
+    monkeypatch.setattr(app_module, "rate_limiter", TokenBucketLimiter())
+
 @pytest.fixture
 def test_pdf():
     # Create a sample PDF file for testing
@@ -19,6 +28,7 @@ def test_pdf():
 async def setup_database():
     # Create tables
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
     yield
     # Drop tables after tests
     Base.metadata.drop_all(bind=engine)
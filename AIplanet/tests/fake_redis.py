@@ -0,0 +1,58 @@
+import asyncio
+import hashlib
+import time
+from Chatbot.rate_limit import TOKEN_BUCKET_SCRIPT
+
+
+class FakeRedis:
+    """Just enough of redis.asyncio.Redis for TokenBucketLimiter: hashes
+    with expiry, TIME, and register_script for TOKEN_BUCKET_SCRIPT, which is
+    run by a Python port of its Lua body. `calls` counts round trips."""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.calls = 0
+        self.down = False
+        self.hashes = {}
+        self.expires = {}
+        self._lock = asyncio.Lock()
+
+    def register_script(self, script):
+        if script != TOKEN_BUCKET_SCRIPT:
+            raise NotImplementedError("FakeRedis only runs the token bucket script")
+        sha = hashlib.sha1(script.encode()).hexdigest()
+
+        async def run(keys=None, args=None):
+            return await self.evalsha(sha, len(keys), *keys, *args)
+
+        return run
+
+    async def evalsha(self, sha, numkeys, *keys_and_args):
+        self.calls += 1
+        if self.down:
+            raise ConnectionError("Connection refused")
+        async with self._lock:
+            return self._token_bucket(keys_and_args[:numkeys], keys_and_args[numkeys:])
+
+    def _live(self, key, now):
+        if key in self.expires and self.expires[key] <= now:
+            self.hashes.pop(key, None)
+            del self.expires[key]
+        return self.hashes.get(key)
+
+    def _token_bucket(self, keys, args):
+        capacity, rate, cost = (float(arg) for arg in args)
+        now = self.clock()
+        state = self._live(keys[0], now) or {}
+        tokens = state.get("tokens", capacity)
+        ts = state.get("ts", now)
+        tokens = min(capacity, tokens + max(0, now - ts) * rate)
+        allowed, retry_after = 0, 0
+        if tokens >= cost:
+            tokens -= cost
+            allowed = 1
+        else:
+            retry_after = (cost - tokens) / rate
+        self.hashes[keys[0]] = {"tokens": tokens, "ts": now}
+        self.expires[keys[0]] = now + capacity / rate
+        return [allowed, str(retry_after).encode()]
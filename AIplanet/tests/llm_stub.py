@@ -0,0 +1,74 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class GeminiStub:
+    """A local stand-in for the Gemini REST API: generateContent and
+    streamGenerateContent answer every prompt with `answer(prompt)` after
+    `delay` seconds. `prompts` records each request and `connections` each
+    TCP connection, so tests can see coalescing and connection reuse."""
+
+    def __init__(self, answer=lambda prompt: f"stub answer {len(prompt)}", delay: float = 0.0):
+        self.answer = answer
+        self.delay = delay
+        self.prompts = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                prompt = "".join(part.get("text", "") for content in request["contents"] for part in content["parts"])
+                with stub._lock:
+                    stub.prompts.append(prompt)
+                time.sleep(stub.delay)
+                text = stub.answer(prompt)
+                if ":streamGenerateContent" in self.path:
+                    words = text.split(" ")
+                    body = [_response(word if i == 0 else " " + word) for i, word in enumerate(words)]
+                else:
+                    body = _response(text)
+                data = json.dumps(body).encode()
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except OSError:
+                    pass  # the client timed out and went away
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def _response(text: str) -> dict:
+    return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}]}
@@ -0,0 +1,32 @@
+import asyncio
+import threading
+import pytest
+from Chatbot.admission import AdmissionExecutor, Busy
+
+
+def test_requests_beyond_capacity_are_rejected():
+    release = threading.Event()
+    executor = AdmissionExecutor(max_inflight=1, max_queued=1)
+    running = executor.submit(release.wait, 5)
+    waiting = executor.submit(lambda: "queued")
+
+    with pytest.raises(Busy):
+        executor.submit(lambda: "rejected")
+    assert executor.rejected == 1
+
+    release.set()
+    assert running.result(timeout=5) is True
+    assert waiting.result(timeout=5) == "queued"
+    assert executor.submit(lambda: "admitted").result(timeout=5) == "admitted"
+
+
+async def test_run_does_not_block_the_event_loop():
+    executor = AdmissionExecutor(max_inflight=2, max_queued=0)
+    release = threading.Event()
+    task = asyncio.ensure_future(executor.run(release.wait, 5))
+
+    await asyncio.sleep(0.05)
+    assert executor.running == 1
+    release.set()
+    assert await task is True
+    assert executor.running == 0 and executor.queued == 0
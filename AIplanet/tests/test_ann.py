@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from Chatbot.ann import build_index, resolve_factory
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(2000, 32)).astype(np.float32)
+
+
+def test_aliases_expand_to_factory_strings():
+    assert resolve_factory("flat", 100000, 768) == "Flat"
+    assert resolve_factory("hnsw", 100000, 768) == "HNSW32"
+    assert resolve_factory("ivf", 100000, 768) == "IVF1264,Flat"
+    assert resolve_factory("ivfpq", 100000, 768) == "IVF1264,PQ96"
+    assert resolve_factory("IVF4096,Flat", 200000, 768) == "IVF4096,Flat"
+
+
+def test_small_corpora_fall_back_to_exact_search():
+    assert resolve_factory("ivf", 50, 768) == "Flat"
+    assert resolve_factory("IVF1024,PQ16", 10, 768) == "Flat"
+    assert resolve_factory("IVF1024,Flat", 200, 768) == "IVF5,Flat"
+    assert resolve_factory("IVF256,PQ16", 200, 768) == "IVF5,Flat"
+    assert resolve_factory("OPQ16,IVF256,PQ16", 1000, 768) == "OPQ16,IVF25,PQ16"
+    assert resolve_factory("OPQ16,IVF256,PQ16", 200, 768) == "IVF5,Flat"
+    assert resolve_factory("PQ16x8", 200, 768) == "Flat"
+
+
+@pytest.mark.parametrize("factory", ["IVF1024,Flat", "IVF256,PQ16"])
+def test_explicit_factories_train_on_small_corpora(vectors, factory):
+    index = build_index(vectors[:200], factory)
+    _, found = index.search(vectors[:20], 1)
+    assert index.ntotal == 200
+    assert (found[:, 0] == np.arange(20)).all()
+
+
+@pytest.mark.parametrize("factory", ["flat", "ivf", "hnsw"])
+def test_index_types_find_exact_matches(vectors, factory):
+    index = build_index(vectors, factory, nprobe=64, ef_search=64)
+    _, found = index.search(vectors[:20], 1)
+    assert index.ntotal == len(vectors)
+    assert (found[:, 0] == np.arange(20)).mean() >= 0.95
+
+
+def test_search_params_are_applied(vectors):
+    index = build_index(vectors, "ivf", nprobe=7)
+    assert index.nprobe == 7
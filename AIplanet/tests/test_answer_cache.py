@@ -0,0 +1,93 @@
+import time
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from Chatbot import chatbot, retriever
+from Chatbot.answer_cache import SemanticAnswerCache
+from Chatbot.index_registry import IndexRegistry
+from Chatbot.vector_store import MappedVectorStore
+
+
+def test_near_duplicate_question_hits():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store(1, "v1", "what is x?", [1.0, 0.0], "x is y")
+
+    assert cache.lookup(1, "v1", [0.99, 0.05]).answer == "x is y"
+    assert cache.lookup(1, "v1", [0.0, 1.0]) is None
+    assert cache.lookup(2, "v1", [1.0, 0.0]) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_new_index_version_invalidates_document_entries():
+    cache = SemanticAnswerCache()
+    cache.store(1, "v1", "q", [1.0, 0.0], "old answer")
+    cache.store(2, "v1", "q", [1.0, 0.0], "other document")
+
+    assert cache.lookup(1, "v2", [1.0, 0.0]) is None
+    assert cache.lookup(2, "v1", [1.0, 0.0]).answer == "other document"
+
+
+def test_publishing_drops_older_versions_once():
+    cache = SemanticAnswerCache()
+    cache.store(1, "v1", "q", [1.0, 0.0], "old answer")
+    cache.store(2, "v1", "q", [1.0, 0.0], "other document")
+
+    # Lookups on interleaved versions don't clear anything ...
+    assert cache.lookup(1, "v2", [1.0, 0.0]) is None
+    assert cache.lookup(1, "v1", [1.0, 0.0]).answer == "old answer"
+
+    # ... publishing does, and late answers from the old version are ignored.
+    cache.drop_stale(1, "v2")
+    assert len(cache) == 1
+    cache.store(1, "v1", "q", [1.0, 0.0], "late answer")
+    assert cache.lookup(1, "v1", [1.0, 0.0]) is None
+    cache.store(1, "v2", "q", [1.0, 0.0], "new answer")
+    assert cache.lookup(1, "v2", [1.0, 0.0]).answer == "new answer"
+
+
+def test_matrix_follows_inserts_and_evictions():
+    cache = SemanticAnswerCache(threshold=0.99, max_entries=30)
+    basis = np.eye(40)
+    for i in range(40):
+        cache.store(1, "v", f"q{i}", basis[i], f"a{i}")
+
+    # The first ten were evicted; every other question still finds its own answer.
+    assert len(cache) == 30
+    assert all(cache.lookup(1, "v", basis[i]) is None for i in range(10))
+    assert [cache.lookup(1, "v", basis[i]).answer for i in range(10, 40)] == [f"a{i}" for i in range(10, 40)]
+
+
+def test_ttl_and_size_limit():
+    cache = SemanticAnswerCache(ttl=0.05, max_entries=2)
+    cache.store(1, "v", "a", [1.0, 0.0, 0.0], "a")
+    cache.store(1, "v", "b", [0.0, 1.0, 0.0], "b")
+    cache.store(1, "v", "c", [0.0, 0.0, 1.0], "c")
+    assert len(cache) == 2
+    assert cache.lookup(1, "v", [1.0, 0.0, 0.0]) is None
+
+    time.sleep(0.06)
+    assert cache.lookup(1, "v", [0.0, 0.0, 1.0]) is None
+
+
+def test_repeated_question_skips_the_llm(tmp_path, monkeypatch):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    monkeypatch.setattr(retriever, "_embeddings", embeddings)
+    registry = IndexRegistry(root=str(tmp_path / "documents"), active_file=str(tmp_path / "ACTIVE"))
+    registry.publish(1, MappedVectorStore.from_texts(["the sky is blue"], embeddings))
+    monkeypatch.setattr(chatbot, "index_registry", registry)
+    monkeypatch.setattr(chatbot, "answer_cache", SemanticAnswerCache())
+
+    llm_calls = []
+
+    def fake_chain(inputs, return_only_outputs=True):
+        llm_calls.append(inputs["question"])
+        return {"output_text": "Blue."}
+
+    monkeypatch.setattr(chatbot, "get_conversational_chain", lambda: fake_chain)
+
+    assert chatbot.user_input("What colour is the sky?", 1) == ("Blue.", ["the sky is blue"])
+    assert chatbot.user_input("What colour is the sky?", 1) == ("Blue.", ["the sky is blue"])
+    assert len(llm_calls) == 1
+
+    registry.publish(1, MappedVectorStore.from_texts(["the sky is grey"], embeddings))
+    chatbot.user_input("What colour is the sky?", 1)
+    assert len(llm_calls) == 2
@@ -0,0 +1,88 @@
+import threading
+import time
+from langchain_core.embeddings import DeterministicFakeEmbedding
+import app as app_module
+from Chatbot import chatbot, retriever
+from Chatbot.answer_cache import SemanticAnswerCache
+from Chatbot.embedding_cache import CachedEmbeddings, EmbeddingCache
+from Chatbot.embedding_pipeline import EmbeddingPipeline
+from Chatbot.index_registry import IndexRegistry
+from Chatbot.vector_store import MappedVectorStore
+
+FACTS = [f"Valve V{i} is set to {10 + i} newton metres." for i in range(20)]
+QUESTIONS = [f"What is valve V{i} set to?" for i in range(20)]
+
+
+class QueryBatchEmbeddings(DeterministicFakeEmbedding):
+    """Records each request, like a client that takes a task type."""
+    requests: list = []
+
+    def embed_documents(self, texts, task_type=None):
+        self.requests.append((len(texts), task_type))
+        return super().embed_documents(texts)
+
+
+def install(tmp_path, monkeypatch, embeddings, chain):
+    registry = IndexRegistry(root=str(tmp_path / "documents"), active_file=str(tmp_path / "ACTIVE"))
+    registry.publish(1, MappedVectorStore.from_texts(FACTS, embeddings))
+    monkeypatch.setattr(chatbot, "index_registry", registry)
+    monkeypatch.setattr(app_module, "index_registry", registry)
+    monkeypatch.setattr(chatbot, "answer_cache", SemanticAnswerCache())
+    monkeypatch.setattr(chatbot, "get_conversational_chain", lambda: chain)
+    return registry
+
+
+def test_matrix_search_matches_single_queries():
+    embeddings = DeterministicFakeEmbedding(size=16)
+    store = MappedVectorStore.from_texts(FACTS, embeddings)
+    vectors = [embeddings.embed_query(question) for question in QUESTIONS[:5]]
+
+    batched = store.similarity_search_with_score_by_vectors(vectors, k=3)
+    assert batched == [store.similarity_search_with_score_by_vector(vector, k=3) for vector in vectors]
+    assert store.similarity_search_with_score_by_vectors([], k=3) == []
+
+
+def test_batch_embeds_once_and_answers_in_order(tmp_path, monkeypatch):
+    inner = QueryBatchEmbeddings(size=16, requests=[])
+    embeddings = CachedEmbeddings(EmbeddingPipeline(inner, checkpoint_dir=None), EmbeddingCache(str(tmp_path / "cache")), "fake")
+    monkeypatch.setattr(retriever, "_embeddings", embeddings)
+
+    lock = threading.Lock()
+    running, peak, calls = 0, 0, []
+
+    def chain(inputs, return_only_outputs=True):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+            calls.append(inputs["question"])
+        time.sleep(0.01)
+        with lock:
+            running -= 1
+        return {"output_text": f"answer to {inputs['question']}"}
+
+    install(tmp_path, monkeypatch, inner, chain)
+    inner.requests.clear()
+    questions = QUESTIONS + QUESTIONS[:3]
+
+    answers = chatbot.answer_questions(questions, 1, mode="vector", max_concurrency=3)
+
+    assert [answer["question"] for answer in answers] == questions
+    assert all(answer["response"] == f"answer to {answer['question']}" for answer in answers)
+    assert inner.requests == [(len(QUESTIONS), "RETRIEVAL_QUERY")]
+    assert sorted(calls) == sorted(QUESTIONS)  # repeats answered once
+    assert peak <= 3
+
+
+def test_batch_endpoint(tmp_path, monkeypatch, test_client):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    monkeypatch.setattr(retriever, "_embeddings", embeddings)
+    install(tmp_path, monkeypatch, embeddings, lambda inputs, return_only_outputs=True: {"output_text": inputs["question"].upper()})
+
+    response = test_client.post("/documents/1/questions", json={"questions": QUESTIONS[:4], "mode": "vector"})
+    assert response.status_code == 200
+    assert [answer["response"] for answer in response.json()["answers"]] == [question.upper() for question in QUESTIONS[:4]]
+
+    assert test_client.post("/documents/1/questions", json={"questions": []}).status_code == 400
+    assert test_client.post("/documents/1/questions", json={"questions": ["x"], "mode": "bogus"}).status_code == 400
+    assert test_client.post("/documents/2/questions", json={"questions": ["x"]}).status_code == 404
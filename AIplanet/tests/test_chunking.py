@@ -0,0 +1,39 @@
+from Chatbot.chunking import chunk_pages, chunk_text, count_tokens
+from Chatbot.extraction import ExtractedText, PageText
+
+
+def extracted_from(pages):
+    text = "\n".join(pages)
+    spans, offset = [], 0
+    for number, page in enumerate(pages, start=1):
+        spans.append(PageText(page_number=number, text=page, start=offset, end=offset + len(page)))
+        offset += len(page) + 1
+    return ExtractedText(text=text, pages=spans)
+
+
+def test_chunks_respect_token_budget_and_pages():
+    paragraph = " ".join(f"Sentence number {n} talks about pumps." for n in range(6))
+    extracted = extracted_from(["\n\n".join([paragraph] * 4), "Second page.\n\nShort."])
+    chunks = chunk_pages(extracted, document_id=9, max_tokens=60, overlap_tokens=8)
+
+    assert all(count_tokens(chunk.text) <= 60 for chunk in chunks)
+    assert {chunk.page for chunk in chunks} == {1, 2}
+    assert chunks[-1].text == "Second page.\n\nShort."
+    for chunk in chunks:
+        assert extracted.text[chunk.start:chunk.end] == chunk.text
+        assert chunk.metadata()["document_id"] == 9
+
+
+def test_overlap_is_small_and_bounded():
+    text = " ".join(f"Fact {n} is stated here." for n in range(200))
+    chunks = chunk_text(text, max_tokens=50, overlap_tokens=10)
+
+    overlaps = [max(0, previous.end - current.start) for previous, current in zip(chunks, chunks[1:])]
+    assert all(count_tokens(text[chunks[i + 1].start:chunks[i].end]) <= 10 for i, overlap in enumerate(overlaps) if overlap)
+    assert sum(len(chunk.text) for chunk in chunks) < 1.3 * len(text)
+
+
+def test_oversized_sentence_is_split_on_tokens():
+    text = " ".join(f"w{n}" for n in range(120))
+    chunks = chunk_text(text, max_tokens=50, overlap_tokens=0)
+    assert [count_tokens(chunk.text) for chunk in chunks] == [50, 50, 20]
@@ -0,0 +1,53 @@
+import numpy as np
+from langchain_core.documents import Document
+from Chatbot.chunking import chunk_text, count_tokens
+from Chatbot.context import assemble_context, merge_passages, mmr_order
+
+
+def chunk_docs(text, **kwargs):
+    return [
+        Document(id=str(row), page_content=chunk.text, metadata=chunk.metadata())
+        for row, chunk in enumerate(chunk_text(text, **kwargs))
+    ]
+
+
+def test_overlapping_chunks_merge_into_the_original_text():
+    text = " ".join(f"Fact {n} is stated here." for n in range(60))
+    docs = chunk_docs(text, max_tokens=40, overlap_tokens=10)
+
+    merged = merge_passages([docs[2], docs[0], docs[1], docs[5]])
+
+    assert len(merged) == 2
+    assert merged[0].page_content == text[docs[0].metadata["start"]:docs[2].metadata["end"]]
+    assert merged[0].metadata["chunks"] == ["0", "1", "2"]
+    assert merged[1] is docs[5]
+
+
+def test_mmr_skips_near_duplicates():
+    query = np.array([1.0, 0.0, 0.0])
+    vectors = np.array([[0.9, 0.1, 0.0], [0.9, 0.11, 0.0], [0.6, 0.0, 0.8]])
+    assert mmr_order(query, vectors, lambda_mult=1.0) == [0, 1, 2]
+    assert mmr_order(query, vectors, lambda_mult=0.5)[:2] == [0, 2]
+
+
+def test_context_fits_the_budget_and_reports_savings():
+    text = " ".join(f"Fact {n} is stated here." for n in range(200))
+    docs = chunk_docs(text, max_tokens=40, overlap_tokens=10)
+
+    passages, stats = assemble_context(docs[:10], token_budget=150, max_chunks=7)
+
+    assert sum(count_tokens(doc.page_content) for doc in passages) == stats.context_tokens <= 150
+    assert stats.baseline_tokens == sum(count_tokens(doc.page_content) for doc in docs[:7])
+    assert stats.tokens_saved > 0
+    assert stats.to_dict()["tokens_saved"] == stats.tokens_saved
+
+
+def test_merging_lets_more_chunks_fit():
+    text = " ".join(f"Fact {n} is stated here." for n in range(200))
+    docs = chunk_docs(text, max_tokens=40, overlap_tokens=10)
+
+    _, stats = assemble_context(docs[:4], token_budget=130, max_chunks=7)
+
+    # Four 40-token chunks would need 160 tokens stuffed side by side.
+    assert stats.selected == 4
+    assert stats.passages == 1
@@ -0,0 +1,88 @@
+import json
+import os
+import numpy as np
+import pytest
+from Chatbot import chatbot, embedding_backends, retriever
+from Chatbot.answer_cache import SemanticAnswerCache
+from Chatbot.embedding_backends import SPEC_FILE, EmbeddingSpec, HashedNgramEmbeddings, create_embeddings
+from Chatbot.index_registry import IndexRegistry
+from Chatbot.vector_store import MappedVectorStore
+
+MANUAL = [
+    "Bleed the coolant line at valve V7 when the pump loses prime.",
+    "Replace the filter cartridge every 500 operating hours.",
+    "The operator panel shows pressure readings for each circuit.",
+    "Inspect the motor housing bracket for cracks during maintenance.",
+]
+
+
+def test_local_embeddings_are_normalised_and_deterministic():
+    embeddings = HashedNgramEmbeddings(dimension=256, batch_size=3)
+    vectors = np.asarray(embeddings.embed_documents(MANUAL + [""]))
+
+    assert vectors.shape == (5, 256)
+    np.testing.assert_allclose(np.linalg.norm(vectors[:4], axis=1), 1.0, rtol=1e-5)
+    assert not vectors[4].any()
+    # Batching doesn't change a text's vector.
+    np.testing.assert_allclose(vectors[1], embeddings.embed_query(MANUAL[1]), rtol=1e-6)
+    np.testing.assert_allclose(vectors[:4], HashedNgramEmbeddings(dimension=256).embed_queries(MANUAL), rtol=1e-6)
+
+
+def test_local_embeddings_rank_related_text_first():
+    embeddings = HashedNgramEmbeddings()
+    store = MappedVectorStore.from_texts(MANUAL, embeddings)
+
+    assert store.similarity_search("how often should filters be replaced?", k=1)[0].page_content == MANUAL[1]
+    assert store.similarity_search("cracked motor brackets", k=1)[0].page_content == MANUAL[3]
+
+
+def test_backend_is_chosen_by_configuration(monkeypatch):
+    assert isinstance(create_embeddings("local"), HashedNgramEmbeddings)
+    with pytest.raises(ValueError):
+        create_embeddings("word2vec")
+
+    monkeypatch.setattr(embedding_backends, "EMBEDDING_BACKEND", "local")
+    monkeypatch.setattr(retriever, "_embeddings", None)
+    assert isinstance(retriever.get_embeddings(), HashedNgramEmbeddings)
+
+
+def test_index_records_its_backend_and_only_serves_that_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_backends, "EMBEDDING_BACKEND", "local")
+    monkeypatch.setattr(embedding_backends, "LOCAL_EMBEDDING_DIM", 64)
+    embeddings = HashedNgramEmbeddings(dimension=64)
+    monkeypatch.setattr(retriever, "_embeddings", embeddings)
+    registry = IndexRegistry(root=str(tmp_path / "documents"), active_file=str(tmp_path / "ACTIVE"))
+    registry.publish(1, MappedVectorStore.from_texts(MANUAL, embeddings))
+
+    with open(os.path.join(registry.current_path(1), SPEC_FILE)) as f:
+        assert json.load(f) == {"backend": "local", "model": embeddings.model, "dimension": 64}
+    assert registry.has(1)
+
+    # Queries from another backend (or dimension) can't search this index.
+    monkeypatch.setattr(embedding_backends, "LOCAL_EMBEDDING_DIM", 128)
+    assert not registry.has(1)
+    monkeypatch.setattr(embedding_backends, "EMBEDDING_BACKEND", "gemini")
+    assert not registry.has(1)
+    assert IndexRegistry(root=registry.root, active_file=registry.active_file).get(1) is None
+
+
+def test_spec_compatibility():
+    built = EmbeddingSpec("gemini", "models/embedding-001", 768)
+    assert EmbeddingSpec("gemini", "models/embedding-001").serves(built)
+    assert not EmbeddingSpec("gemini", "models/text-embedding-004").serves(built)
+    assert not EmbeddingSpec("local", "hashed-ngram-v1", 768).serves(built)
+
+
+def test_questions_answered_with_local_embeddings(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_backends, "EMBEDDING_BACKEND", "local")
+    monkeypatch.setattr(retriever, "_embeddings", None)
+    registry = IndexRegistry(root=str(tmp_path / "documents"), active_file=str(tmp_path / "ACTIVE"))
+    monkeypatch.setattr(chatbot, "index_registry", registry)
+    monkeypatch.setattr(chatbot, "answer_cache", SemanticAnswerCache())
+    monkeypatch.setattr(chatbot, "get_conversational_chain", lambda: lambda inputs, return_only_outputs=True: {"output_text": inputs["input_documents"][0].page_content})
+
+    chatbot.get_vector_store("\n\n".join(MANUAL), 1)
+
+    answer, _ = chatbot.user_input("When must the filter cartridge be replaced?", 1, mode="vector")
+    assert MANUAL[1] in answer
+    assert registry.has(1)
@@ -0,0 +1,46 @@
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from Chatbot.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    calls: list = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return super().embed_documents(texts)
+
+
+def test_only_misses_reach_the_backend(tmp_path):
+    backend = CountingEmbeddings(size=8, calls=[])
+    cached = CachedEmbeddings(backend, EmbeddingCache(str(tmp_path / "cache.db")), "fake")
+
+    first = cached.embed_documents(["a", "b", "c"])
+    second = cached.embed_documents(["b", "c", "d", "d"])
+
+    assert backend.calls == [["a", "b", "c"], ["d"]]
+    assert second[0] == first[1]
+    assert second[2] == second[3]
+
+
+def test_cache_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.db")
+    CachedEmbeddings(CountingEmbeddings(size=8, calls=[]), EmbeddingCache(path), "fake").embed_documents(["x"])
+
+    backend = CountingEmbeddings(size=8, calls=[])
+    CachedEmbeddings(backend, EmbeddingCache(path), "fake").embed_documents(["x"])
+    assert backend.calls == []
+
+    other_model = CountingEmbeddings(size=8, calls=[])
+    CachedEmbeddings(other_model, EmbeddingCache(path), "other").embed_documents(["x"])
+    assert other_model.calls == [["x"]]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), max_entries=2)
+    cache.put_many("m", {"old": [1.0]})
+    cache.put_many("m", {"mid": [2.0]})
+    cache.get_many("m", ["old"])
+    cache.put_many("m", {"new": [3.0]})
+
+    assert len(cache) == 2
+    assert set(cache.get_many("m", ["old", "mid", "new"])) == {"old", "new"}
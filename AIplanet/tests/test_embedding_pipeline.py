@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from langchain_core.embeddings import Embeddings
+from Chatbot import chatbot, retriever
+from Chatbot.answer_cache import SemanticAnswerCache
+from Chatbot.chunking import Chunk
+from Chatbot.embedding_pipeline import EmbeddingPipeline
+from Chatbot.index_registry import IndexRegistry
+
+
+class StandInEmbeddingServer:
+    """Local HTTP embedding server: POST {"texts": [...]} -> {"vectors": [...]}.
+    Texts listed in `fail_texts` get a 500, the first `throttle` requests a 429."""
+
+    def __init__(self, throttle=0, fail_texts=(), delay=0.0):
+        self.throttle = throttle
+        self.fail_texts = set(fail_texts)
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                texts = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["texts"]
+                with server.lock:
+                    server.requests.append(texts)
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                    throttled = server.throttle > 0
+                    server.throttle -= 1 if throttled else 0
+                time.sleep(server.delay)
+                with server.lock:
+                    server.in_flight -= 1
+                if throttled:
+                    self.send_response(429)
+                    self.end_headers()
+                    return
+                if server.fail_texts.intersection(texts):
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+                body = json.dumps({"vectors": [[float(len(text)), float(sum(map(ord, text)))] for text in texts]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/embed"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+
+
+class HTTPEmbeddings(Embeddings):
+    def __init__(self, url):
+        self.url = url
+
+    def embed_documents(self, texts):
+        request = urllib.request.Request(self.url, data=json.dumps({"texts": texts}).encode(), method="POST")
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())["vectors"]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+@pytest.fixture
+def make_server():
+    servers = []
+
+    def factory(**kwargs):
+        servers.append(StandInEmbeddingServer(**kwargs))
+        return servers[-1]
+
+    yield factory
+    for server in servers:
+        server.close()
+
+
+def pipeline_for(server, tmp_path, **kwargs):
+    options = dict(batch_size=3, max_concurrency=2, backoff_base=0.01, checkpoint_dir=str(tmp_path / "ckpt"))
+    options.update(kwargs)
+    return EmbeddingPipeline(HTTPEmbeddings(server.url), **options)
+
+
+def test_batches_preserve_order_with_bounded_concurrency(make_server, tmp_path):
+    server = make_server(delay=0.05)
+    texts = [f"chunk {n}" for n in range(10)]
+    vectors = pipeline_for(server, tmp_path).embed_documents(texts)
+
+    assert vectors == HTTPEmbeddings(server.url).embed_documents(texts)
+    assert sorted(len(batch) for batch in server.requests[:4]) == [1, 3, 3, 3]
+    assert server.max_in_flight == 2
+
+
+def test_rate_limited_batches_are_retried(make_server, tmp_path):
+    server = make_server(throttle=3)
+    vectors = pipeline_for(server, tmp_path).embed_documents(["a", "bb", "ccc", "dddd"])
+    assert [vector[0] for vector in vectors] == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_failed_run_resumes_from_completed_batches(make_server, tmp_path):
+    texts = [f"chunk {n}" for n in range(9)]
+    broken = make_server(fail_texts={"chunk 7"})
+    with pytest.raises(urllib.error.HTTPError):
+        pipeline_for(broken, tmp_path, max_concurrency=1, max_retries=1).embed_documents(texts)
+
+    healthy = make_server()
+    pipeline_for(healthy, tmp_path, max_concurrency=1).embed_documents(texts)
+    assert healthy.requests == [["chunk 6", "chunk 7", "chunk 8"]]
+
+
+def test_indexing_keeps_every_embedding_slot_busy(make_server, tmp_path, monkeypatch):
+    server = make_server(delay=0.05)
+    pipeline = pipeline_for(server, tmp_path, batch_size=100, max_concurrency=4)
+    monkeypatch.setattr(retriever, "_embeddings", pipeline)
+    monkeypatch.setattr(chatbot, "iter_text_chunks", lambda source, document_id: (Chunk(f"chunk {n}", 1, n, n + 1, document_id) for n in range(1000)))
+    monkeypatch.setattr(chatbot, "index_registry", IndexRegistry(root=str(tmp_path / "documents"), active_file=str(tmp_path / "ACTIVE")))
+    monkeypatch.setattr(chatbot, "answer_cache", SemanticAnswerCache())
+
+    assert chatbot.get_vector_store([], 1) == 1000
+    assert server.max_in_flight == 4
+    assert sum(len(batch) for batch in server.requests) == 1000
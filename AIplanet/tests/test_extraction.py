@@ -0,0 +1,83 @@
+import threading
+import time
+from types import SimpleNamespace
+from Chatbot.extraction import _extract_range, extract_pdf, get_extraction_pool, iter_pdf_pages
+from benchmarks._pdf import make_pdf
+
+
+def sample_pdf(num_pages):
+    return make_pdf([[f"page {n} heading", f"body text for page {n}"] for n in range(1, num_pages + 1)])
+
+
+def test_parallel_extraction_matches_sequential():
+    content = sample_pdf(12)
+    parallel = extract_pdf(content, pages_per_task=3, max_workers=3, parallel_min_pages=1)
+    sequential = extract_pdf(content, parallel_min_pages=100)
+
+    assert parallel.text == sequential.text
+    assert [page.page_number for page in parallel.pages] == list(range(1, 13))
+    assert "page 7 heading" in parallel.pages[6].text
+
+
+def test_page_offsets_map_back_to_pages():
+    extracted = extract_pdf(sample_pdf(5), parallel_min_pages=100)
+    for page in extracted.pages:
+        assert extracted.text[page.start:page.end] == page.text
+        assert extracted.page_for_offset(page.start) == page.page_number
+
+
+def test_slow_page_is_skipped_after_timeout():
+    def slow():
+        time.sleep(5)
+        return "never"
+
+    reader = SimpleNamespace(pages=[
+        SimpleNamespace(extract_text=lambda: "first"),
+        SimpleNamespace(extract_text=slow),
+        SimpleNamespace(extract_text=lambda: "third"),
+    ])
+    started = time.monotonic()
+    texts, failed = _extract_range(reader, 0, 3, page_timeout=0.2)
+
+    assert texts == ["first", "", "third"]
+    assert failed == [2]
+    assert time.monotonic() - started < 2
+
+
+def test_pages_stream_from_a_file_on_disk(tmp_path):
+    content = sample_pdf(12)
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(content)
+
+    failed = []
+    streamed = list(iter_pdf_pages(str(path), failed, pages_per_task=3, max_workers=3, parallel_min_pages=1))
+
+    assert [page.text for page in streamed] == [page.text for page in extract_pdf(content, parallel_min_pages=100).pages]
+    assert extract_pdf(str(path), parallel_min_pages=100).text == extract_pdf(content, parallel_min_pages=100).text
+    assert failed == []
+
+
+def test_hung_page_times_out_off_the_main_thread():
+    # Ingestion workers are threads, where SIGALRM can't interrupt a page.
+    content = make_pdf([["first page"], ["x" * 5] * 100000, ["third page"]])
+    result = {}
+
+    def extract():
+        started = time.monotonic()
+        result["extracted"] = extract_pdf(content, page_timeout=0.3, max_workers=1, parallel_min_pages=100)
+        result["seconds"] = time.monotonic() - started
+
+    thread = threading.Thread(target=extract)
+    thread.start()
+    thread.join(30)
+
+    assert result["extracted"].failed_pages == [2]
+    assert "third page" in result["extracted"].pages[2].text
+    assert result["seconds"] < 3
+
+
+def test_uploads_share_one_extraction_pool():
+    pool = get_extraction_pool()
+    extract_pdf(sample_pdf(4), pages_per_task=2, max_workers=2, parallel_min_pages=1)
+    extract_pdf(sample_pdf(4), pages_per_task=2, max_workers=2, parallel_min_pages=1)
+    assert get_extraction_pool() is pool
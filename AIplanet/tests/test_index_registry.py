@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from Chatbot import retriever
+from Chatbot.index_registry import IndexRegistry
+from Chatbot.vector_store import MappedVectorStore
+
+
+def make_registry(tmp_path, monkeypatch):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    monkeypatch.setattr(retriever, "_embeddings", embeddings)
+    registry = IndexRegistry(root=str(tmp_path / "documents"), active_file=str(tmp_path / "ACTIVE"))
+    return registry, embeddings
+
+
+def test_documents_are_indexed_independently(tmp_path, monkeypatch):
+    registry, embeddings = make_registry(tmp_path, monkeypatch)
+    registry.publish(1, MappedVectorStore.from_texts(["apples"], embeddings))
+    registry.publish(2, MappedVectorStore.from_texts(["pears", "plums"], embeddings))
+    before = os.listdir(registry.path(1))
+
+    registry.remove(2)
+
+    assert registry.document_ids() == [1]
+    assert os.listdir(registry.path(1)) == before
+    assert registry.get(1).similarity_search("apples", k=1)[0].page_content == "apples"
+    assert registry.get(2) is None
+
+
+def test_questions_default_to_the_active_document(tmp_path, monkeypatch):
+    registry, embeddings = make_registry(tmp_path, monkeypatch)
+    registry.publish(1, MappedVectorStore.from_texts(["apples"], embeddings))
+    registry.publish(2, MappedVectorStore.from_texts(["pears"], embeddings))
+
+    assert registry.get() is None
+    assert registry.activate(2)
+    assert registry.get().similarity_search("pears", k=1)[0].page_content == "pears"
+
+    registry.remove(2)
+    assert registry.active_document_id() is None
+    assert not registry.activate(3)
+
+
+def test_stores_reload_from_disk_in_a_fresh_process(tmp_path, monkeypatch):
+    registry, embeddings = make_registry(tmp_path, monkeypatch)
+    registry.publish(5, MappedVectorStore.from_texts(["alpha", "beta"], embeddings))
+
+    fresh = IndexRegistry(root=registry.root, active_file=registry.active_file)
+    assert fresh.get(5).index.ntotal == 2
+
+
+def test_publish_swaps_in_a_new_version_directory(tmp_path, monkeypatch):
+    registry, embeddings = make_registry(tmp_path, monkeypatch)
+    first = registry.publish(1, MappedVectorStore.from_texts(["apples"], embeddings))
+    second = registry.publish(1, MappedVectorStore.from_texts(["pears"], embeddings))
+
+    assert first != second
+    assert registry.current_path(1) == registry.version_path(1, second)
+    assert sorted(os.listdir(os.path.join(registry.path(1), "versions"))) == sorted([first, second])
+    assert not [name for name in os.listdir(registry.path(1)) if name.startswith(".staging-")]
+    fresh = IndexRegistry(root=registry.root, active_file=registry.active_file)
+    assert fresh.get(1).similarity_search("pears", k=1)[0].page_content == "pears"
+
+
+def test_garbage_collection_spares_current_and_leased_versions(tmp_path, monkeypatch):
+    registry, embeddings = make_registry(tmp_path, monkeypatch)
+    registry.gc_grace = 0
+    old = registry.publish(1, MappedVectorStore.from_texts(["apples"], embeddings))
+    reader = IndexRegistry(root=registry.root, active_file=registry.active_file, gc_grace=0)
+
+    with reader.lease(1) as (_, store, version):
+        assert version == old
+        current = registry.publish(1, MappedVectorStore.from_texts(["pears"], embeddings))
+        assert reader.collect_garbage() == []
+        assert store.similarity_search("apples", k=1)[0].page_content == "apples"
+
+    assert reader.collect_garbage() == [registry.version_path(1, old)]
+    assert os.listdir(os.path.join(registry.path(1), "versions")) == [current]
+    assert reader.get(1).similarity_search("pears", k=1)[0].page_content == "pears"
+
+
+def test_garbage_collection_waits_for_the_grace_period(tmp_path, monkeypatch):
+    registry, embeddings = make_registry(tmp_path, monkeypatch)
+    registry.publish(1, MappedVectorStore.from_texts(["apples"], embeddings))
+    registry.publish(1, MappedVectorStore.from_texts(["pears"], embeddings))
+    os.makedirs(os.path.join(registry.path(1), ".staging-crashed"))
+
+    assert registry.collect_garbage() == []
+    assert len(registry.collect_garbage(now=time.time() + registry.gc_grace + 1)) == 2
+
+
+def test_publishing_does_not_break_concurrent_queries(tmp_path, monkeypatch):
+    registry, embeddings = make_registry(tmp_path, monkeypatch)
+    registry.gc_grace = 0
+    registry.publish(1, MappedVectorStore.from_texts(["v0"], embeddings))
+    reader = IndexRegistry(root=registry.root, active_file=registry.active_file, gc_grace=0)
+    errors, done = [], threading.Event()
+
+    def query():
+        while not done.is_set():
+            try:
+                with reader.lease(1) as (_, store, _version):
+                    assert len(store.similarity_search("v", k=1)) == 1
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=query) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for i in range(1, 15):
+        registry.publish(1, MappedVectorStore.from_texts([f"v{i}"], embeddings))
+        reader.collect_garbage()
+    done.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
@@ -0,0 +1,54 @@
+import threading
+import time
+import pytest
+from Chatbot.ingestion import IngestionJob, IngestionQueue, QueueFull
+
+
+def wait_until_finished(job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while job.finished_at is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert job.finished_at is not None
+
+
+def test_job_reports_stages_and_timings():
+    def handler(job):
+        for stage in ("extract", "chunk", "embed", "index"):
+            job.enter_stage(stage)
+            time.sleep(0.01)
+
+    job = IngestionQueue(workers=1).submit(IngestionJob(document_id=1, filename="a.pdf"), handler)
+    wait_until_finished(job)
+
+    assert job.status == "succeeded"
+    assert job.stage == "done" and job.progress == 1.0
+    assert set(job.timings) == {"queued", "extract", "chunk", "embed", "index"}
+    assert job.timings["embed"] >= 0.01
+
+
+def test_failed_job_keeps_error():
+    def handler(job):
+        job.enter_stage("extract")
+        raise ValueError("bad pdf")
+
+    job = IngestionQueue(workers=1).submit(IngestionJob(document_id=1, filename="a.pdf"), handler)
+    wait_until_finished(job)
+    assert job.status == "failed"
+    assert job.error == "bad pdf"
+
+
+def test_full_queue_rejects_new_jobs():
+    release = threading.Event()
+    ingestion = IngestionQueue(workers=1, max_queued=1)
+    running = ingestion.submit(IngestionJob(document_id=1, filename="a.pdf"), lambda job: release.wait(5))
+    while running.status != "running":
+        time.sleep(0.01)
+    waiting = ingestion.submit(IngestionJob(document_id=2, filename="b.pdf"), lambda job: None)
+
+    with pytest.raises(QueueFull):
+        ingestion.submit(IngestionJob(document_id=3, filename="c.pdf"), lambda job: None)
+    assert ingestion.active_job_for(2) is waiting
+
+    release.set()
+    wait_until_finished(waiting)
+    assert ingestion.get(running.id).status == "succeeded"
@@ -0,0 +1,151 @@
+import json
+import threading
+import time
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+import app as app_module
+from Chatbot import chatbot, llm, retriever
+from Chatbot.admission import Busy
+from Chatbot.answer_cache import SemanticAnswerCache
+from Chatbot.index_registry import IndexRegistry
+from Chatbot.llm import LLMGate, SingleFlight
+from Chatbot.vector_store import MappedVectorStore
+from tests.llm_stub import GeminiStub
+
+
+def run_together(fn, count):
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(i):
+        barrier.wait()
+        results[i] = fn()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_single_flight_shares_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.1)
+        return "answer"
+
+    assert run_together(lambda: flight.do("q", slow), 5) == ["answer"] * 5
+    assert len(calls) == 1
+    assert (flight.calls, flight.coalesced) == (1, 4)
+
+    # Nothing is remembered once the call is done.
+    assert flight.do("q", slow) == "answer"
+    assert len(calls) == 2
+
+
+def test_single_flight_shares_failures():
+    flight = SingleFlight()
+
+    def fail():
+        time.sleep(0.05)
+        raise RuntimeError("model down")
+
+    def call():
+        try:
+            flight.do("q", fail)
+        except RuntimeError as e:
+            return str(e)
+
+    assert run_together(call, 3) == ["model down"] * 3
+    assert flight.calls == 1
+
+
+def test_gate_caps_concurrent_calls():
+    gate = LLMGate(max_concurrency=2, wait_timeout=0.05)
+    with gate.slot(), gate.slot():
+        assert gate.running == 2
+        with pytest.raises(Busy):
+            gate.call("q", lambda: "answer")
+    assert gate.call("q", lambda: "answer") == "answer"
+    assert gate.running == 0
+
+
+@pytest.fixture
+def stub_model(tmp_path, monkeypatch):
+    """Point the real Gemini client at a GeminiStub and index one document."""
+    stub = GeminiStub()
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    monkeypatch.setattr(llm, "LLM_API_ENDPOINT", stub.endpoint)
+    monkeypatch.setattr(llm, "LLM_TRANSPORT", "rest")
+    monkeypatch.setattr(llm, "LLM_MAX_RETRIES", 1)
+    monkeypatch.setattr(chatbot, "_chat_model", None)
+    monkeypatch.setattr(chatbot, "_chain", None)
+    monkeypatch.setattr(chatbot, "llm_gate", LLMGate(max_concurrency=4))
+
+    embeddings = DeterministicFakeEmbedding(size=16)
+    monkeypatch.setattr(retriever, "_embeddings", embeddings)
+    registry = IndexRegistry(root=str(tmp_path / "documents"), active_file=str(tmp_path / "ACTIVE"))
+    registry.publish(1, MappedVectorStore.from_texts(["the pump runs at 40 psi", "the valve is blue"], embeddings))
+    monkeypatch.setattr(chatbot, "index_registry", registry)
+    monkeypatch.setattr(chatbot, "answer_cache", SemanticAnswerCache())
+    with stub:
+        yield stub
+
+
+def test_identical_questions_make_one_call(stub_model):
+    stub_model.delay = 0.3
+
+    answers = run_together(lambda: chatbot.user_input("What pressure does the pump run at?", 1, mode="vector")[0], 6)
+
+    assert len(set(answers)) == 1 and answers[0].startswith("stub answer")
+    assert len(stub_model.prompts) == 1
+    assert chatbot.llm_gate.flight.coalesced == 5
+
+
+def test_client_is_reused_between_questions(stub_model):
+    for question in ("What colour is the valve?", "What pressure does the pump run at?", "What is blue?"):
+        assert chatbot.user_input(question, 1, mode="vector")[0].startswith("stub answer")
+
+    assert len(stub_model.prompts) == 3
+    assert stub_model.connections == 1
+    assert chatbot.get_chat_model() is chatbot.get_chat_model()
+
+
+def test_streamed_answer_from_stub(stub_model):
+    stub_model.answer = lambda prompt: "forty psi"
+
+    events = list(chatbot.user_input_stream("What pressure does the pump run at?", 1, mode="vector"))
+
+    assert "".join(event["text"] for event in events if event["type"] == "token") == "forty psi"
+    assert events[-1]["response"] == "forty psi"
+
+
+def test_slow_model_times_out(stub_model, monkeypatch):
+    monkeypatch.setattr(llm, "LLM_TIMEOUT_SECONDS", 0.2)
+    stub_model.delay = 1.0
+
+    began = time.perf_counter()
+    response, _ = chatbot.user_input("What colour is the valve?", 1, mode="vector")
+
+    assert response.startswith("Error:")
+    assert time.perf_counter() - began < 0.9
+
+
+def test_saturated_gate_gets_a_busy_reply(stub_model, monkeypatch, test_client):
+    gate = LLMGate(max_concurrency=1, wait_timeout=0.05)
+    monkeypatch.setattr(chatbot, "llm_gate", gate)
+    monkeypatch.setattr(app_module.index_registry, "has_index", lambda document_id=None: True)
+
+    with gate.slot():
+        with pytest.raises(Busy):
+            chatbot.user_input("What colour is the valve?", 1, mode="vector")
+        with test_client.websocket_connect("/ws") as websocket:
+            websocket.send_text(json.dumps({"question": "What colour is the valve?", "document_id": 1}))
+            reply = websocket.receive_json()
+
+    assert reply["busy"] is True
+    assert stub_model.prompts == []
@@ -0,0 +1,70 @@
+import json
+import time
+from langchain_core.embeddings import DeterministicFakeEmbedding
+import app as app_module
+from Chatbot import chatbot, retriever
+from Chatbot.answer_cache import SemanticAnswerCache
+from Chatbot.index_registry import IndexRegistry
+from Chatbot.metrics import registry, span, timed
+from Chatbot.vector_store import MappedVectorStore
+
+
+def stage(name, sample="count"):
+    return registry.get_sample_value(f"aiplanet_stage_seconds_{sample}", {"stage": name}) or 0.0
+
+
+def test_nested_stages_record_self_time():
+    def pages():
+        for _ in range(3):
+            time.sleep(0.02)
+            yield "page"
+
+    def chunks(source):
+        for page in source:
+            time.sleep(0.01)
+            yield page
+
+    with span("test_outer"):
+        assert list(timed(chunks(timed(pages(), "test_pages")), "test_chunks")) == ["page"] * 3
+
+    assert stage("test_pages") == stage("test_chunks") == stage("test_outer") == 1
+    assert 0.06 <= stage("test_pages", "sum") < 0.09
+    assert 0.03 <= stage("test_chunks", "sum") < 0.06
+    assert stage("test_outer", "sum") < 0.01
+
+
+def test_question_stages_are_timed(tmp_path, monkeypatch):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    monkeypatch.setattr(retriever, "_embeddings", embeddings)
+    registry_ = IndexRegistry(root=str(tmp_path / "documents"), active_file=str(tmp_path / "ACTIVE"))
+    registry_.publish(1, MappedVectorStore.from_texts(["alpha beta", "gamma delta"], embeddings))
+    monkeypatch.setattr(chatbot, "index_registry", registry_)
+    monkeypatch.setattr(chatbot, "answer_cache", SemanticAnswerCache())
+    monkeypatch.setattr(chatbot, "get_conversational_chain", lambda: lambda inputs, return_only_outputs=True: {"output_text": "ok"})
+    names = ("keyword_search", "query_embed", "search", "prompt_assembly", "llm")
+    before = {name: stage(name) for name in names}
+    answered = registry.get_sample_value("aiplanet_questions_total", {"outcome": "answered"}) or 0.0
+
+    assert chatbot.user_input("what is alpha?", 1, mode="vector")[0] == "ok"
+
+    assert all(stage(name) == before[name] + 1 for name in names)
+    assert registry.get_sample_value("aiplanet_questions_total", {"outcome": "answered"}) == answered + 1
+    assert registry_.loaded_sizes() == {1: 2}
+
+
+def test_metrics_endpoint(test_client, monkeypatch):
+    monkeypatch.setattr(app_module.index_registry, "has_index", lambda document_id=None: True)
+    monkeypatch.setattr(app_module, "user_input", lambda question, document_id: ("ok", []))
+    with test_client.websocket_connect("/ws") as websocket:
+        websocket.send_text(json.dumps({"question": "q", "document_id": 1}))
+        websocket.receive_json()
+    test_client.get("/ready")
+
+    body = test_client.get("/metrics").text
+
+    assert 'aiplanet_question_seconds_count{outcome="answered"}' in body
+    assert 'aiplanet_request_seconds_count{method="GET",route="/ready",status="503"}' in body
+    for name in ("aiplanet_ingest_queue_depth", "aiplanet_qa_running", "aiplanet_answer_cache_lookups_total",
+                 "aiplanet_embedding_cache_lookups_total", "aiplanet_loaded_indexes", "aiplanet_ws_connections",
+                 "aiplanet_rate_limit_buckets", "process_resident_memory_bytes"):
+        assert name in body
@@ -0,0 +1,101 @@
+import json
+import pytest
+import app as app_module
+from Chatbot.rate_limit import LocalBuckets, Rate, TokenBucketLimiter
+from tests.fake_redis import FakeRedis
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_rate_parsing():
+    assert Rate.parse("5/minute") == Rate(capacity=5, per_second=5 / 60)
+    assert Rate.parse("10/30 seconds") == Rate(capacity=10, per_second=10 / 30)
+    with pytest.raises(ValueError):
+        Rate.parse("5 per minute")
+
+
+def test_bucket_allows_a_burst_then_refills():
+    clock = Clock()
+    buckets = LocalBuckets(clock=clock)
+    rate = Rate.parse("3/minute")
+
+    assert [buckets.hit("k", rate).allowed for _ in range(4)] == [True, True, True, False]
+    assert buckets.hit("k", rate).retry_after == pytest.approx(20)
+    clock.now += 20
+    assert buckets.hit("k", rate).allowed
+    assert not buckets.hit("k", rate).allowed
+    assert buckets.hit("other", rate).allowed
+
+
+def test_idle_buckets_are_dropped():
+    clock = Clock()
+    buckets = LocalBuckets(clock=clock)
+    buckets.hit("k", Rate.parse("1/second"))
+    clock.now += 120
+    buckets.hit("j", Rate.parse("1/second"))
+    assert len(buckets) == 1
+
+
+async def test_workers_share_one_redis_bucket():
+    clock = Clock()
+    redis = FakeRedis(clock=clock)
+    # Two limiters over one client stand in for two worker processes.
+    workers = [TokenBucketLimiter(client=redis), TokenBucketLimiter(client=redis)]
+    rate = Rate.parse("4/minute")
+
+    results = [await workers[i % 2].hit("upload", "1.2.3.4", rate) for i in range(6)]
+
+    assert [result.allowed for result in results] == [True] * 4 + [False] * 2
+    assert results[-1].retry_after == pytest.approx(15)
+    assert redis.calls == 6  # one round trip per check
+    clock.now += 15
+    assert (await workers[1].hit("upload", "1.2.3.4", rate)).allowed
+    assert len(workers[0].local) == 0
+
+
+async def test_falls_back_to_local_buckets_when_redis_is_down(monkeypatch):
+    redis = FakeRedis()
+    limiter = TokenBucketLimiter(client=redis)
+    rate = Rate.parse("2/minute")
+    redis.down = True
+
+    assert [(await limiter.hit("ws", "a", rate)).allowed for _ in range(3)] == [True, True, False]
+    assert redis.calls == 1  # not retried until REDIS_RETRY_SECONDS pass
+
+    redis.down = False
+    monkeypatch.setattr(limiter, "_retry_at", 0)
+    assert (await limiter.hit("ws", "a", rate)).allowed
+    assert limiter._retry_at is None
+
+
+def test_websocket_messages_are_limited(test_client, monkeypatch):
+    monkeypatch.setattr(app_module, "WS_MESSAGE_RATE", Rate.parse("2/minute"))
+    monkeypatch.setattr(app_module.index_registry, "has_index", lambda document_id=None: True)
+    monkeypatch.setattr(app_module, "user_input", lambda question, document_id: ("ok", []))
+
+    with test_client.websocket_connect("/ws") as websocket:
+        replies = []
+        for _ in range(3):
+            websocket.send_text(json.dumps({"question": "q", "document_id": 1}))
+            replies.append(websocket.receive_json())
+
+    assert replies[:2] == [{"response": "ok"}] * 2
+    assert "rate limit exceeded" in replies[2]["error"].lower()
+    assert replies[2]["retry_after"] > 0
+    assert app_module.manager.active_connections == {}
+
+
+def test_uploads_are_limited(test_client, monkeypatch):
+    monkeypatch.setattr(app_module, "UPLOAD_RATE", Rate.parse("1/minute"))
+    files = {"file": ("notes.txt", b"text", "text/plain")}
+
+    assert test_client.post("/upload/", files=files).status_code == 400
+    response = test_client.post("/upload/", files=files)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "60"
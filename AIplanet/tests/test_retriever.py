@@ -0,0 +1,38 @@
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from Chatbot import retriever
+from Chatbot.retriever import VectorStoreCache, publish_index_version
+from Chatbot.vector_store import MappedVectorStore
+
+
+def build_cache(tmp_path, monkeypatch, texts):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    monkeypatch.setattr(retriever, "_embeddings", embeddings)
+    index_path = str(tmp_path / "index.faiss")
+    version_file = str(tmp_path / "VERSION")
+    MappedVectorStore.from_texts(texts, embeddings).save_local(index_path)
+    publish_index_version(index_path, version_file)
+    return VectorStoreCache(index_path, version_file), embeddings
+
+
+def test_store_is_loaded_once(tmp_path, monkeypatch):
+    cache, _ = build_cache(tmp_path, monkeypatch, ["alpha", "beta"])
+    first = cache.get()
+    assert first is not None
+    assert cache.get() is first
+
+
+def test_store_reloads_after_new_version(tmp_path, monkeypatch):
+    cache, embeddings = build_cache(tmp_path, monkeypatch, ["alpha"])
+    first = cache.get()
+
+    MappedVectorStore.from_texts(["alpha", "gamma"], embeddings).save_local(cache.index_path)
+    publish_index_version(cache.index_path, cache.version_file)
+
+    second = cache.get()
+    assert second is not first
+    assert second.index.ntotal == 2
+
+
+def test_missing_index_returns_none(tmp_path):
+    cache = VectorStoreCache(str(tmp_path / "index.faiss"), str(tmp_path / "VERSION"))
+    assert cache.get() is None
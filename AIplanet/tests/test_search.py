@@ -0,0 +1,73 @@
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from Chatbot import chatbot, retriever
+from Chatbot.answer_cache import SemanticAnswerCache
+from Chatbot.index_registry import IndexRegistry
+from Chatbot.search import keyword_terms, lookup_terms, match_expression, reciprocal_rank_fusion
+from Chatbot.vector_store import MappedVectorStore
+
+MANUAL = [
+    "Error E-1042 means the coolant pump has lost prime; bleed the line at valve V7.",
+    "Replace filter cartridge part XJ-220/B every 500 operating hours.",
+    "The operator panel shows pressure readings for each circuit.",
+    "Inspect the motor housing bracket for cracks during maintenance.",
+]
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    queries: int = 0
+
+    def embed_query(self, text):
+        self.queries += 1
+        return super().embed_query(text)
+
+
+def saved_store(tmp_path, embeddings):
+    MappedVectorStore.from_texts(MANUAL, embeddings, metadatas=[{"page": i + 1} for i in range(len(MANUAL))]).save_local(str(tmp_path))
+    return MappedVectorStore.load_local(str(tmp_path), embeddings)
+
+
+def test_query_terms():
+    assert lookup_terms('What does error E-1042 mean near "valve V7"?') == ["valve V7", "E-1042"]
+    assert lookup_terms("How do I inspect the motor?") == []
+    assert keyword_terms("How do I inspect the motor?") == ["inspect", "motor"]
+    assert match_expression(['say "hi"', "x", "x"]) == '"say ""hi""" OR "x"'
+
+
+def test_bm25_finds_codes_and_phrases(tmp_path):
+    store = saved_store(tmp_path, DeterministicFakeEmbedding(size=16))
+
+    hits = store.keyword_search(match_expression(["XJ-220/B"]), k=3)
+    assert [doc.metadata["page"] for doc, _ in hits] == [2]
+    assert store.keyword_search(match_expression(["pump prime"]), k=3) == []
+    either = store.keyword_search(match_expression(["E-1042", "pressure"]), k=3)
+    assert sorted(doc.metadata["page"] for doc, _ in either) == [1, 3]
+
+
+def test_fusion_rewards_documents_ranked_by_both():
+    a, b, c = (Document(id=str(i), page_content=text) for i, text in enumerate("abc"))
+    assert reciprocal_rank_fusion([[a, b, c], [b, c]], k=2) == [b, c]
+
+
+def test_lookup_questions_skip_the_embedding_call(tmp_path, monkeypatch):
+    embeddings = CountingEmbeddings(size=16)
+    monkeypatch.setattr(retriever, "_embeddings", embeddings)
+    registry = IndexRegistry(root=str(tmp_path / "documents"), active_file=str(tmp_path / "ACTIVE"))
+    registry.publish(1, MappedVectorStore.from_texts(MANUAL, embeddings))
+    monkeypatch.setattr(chatbot, "index_registry", registry)
+    monkeypatch.setattr(chatbot, "answer_cache", SemanticAnswerCache())
+    monkeypatch.setattr(chatbot, "get_conversational_chain", lambda: lambda inputs, return_only_outputs=True: {"output_text": "ok"})
+
+    _, docs = chatbot.user_input("What does error E-1042 mean?", 1, mode="auto")
+    assert docs == [MANUAL[0]]
+    assert embeddings.queries == 0
+
+    # No lookup term: falls through to vector search.
+    _, docs = chatbot.user_input("What should be inspected?", 1, mode="auto")
+    assert len(docs) == len(MANUAL)
+    assert embeddings.queries == 1
+
+    # Hybrid always embeds, and puts the keyword hit in the fused results.
+    _, docs = chatbot.user_input("part XJ-220/B", 1, mode="hybrid")
+    assert MANUAL[1] in docs
+    assert embeddings.queries == 2
@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+import threading
+from fastapi.testclient import TestClient
+import app as app_module
+
+
+def test_importing_the_app_leaves_indexes_and_llm_clients_alone(tmp_path):
+    index = tmp_path / "faiss" / "index.faiss"
+    index.parent.mkdir()
+    index.write_bytes(b"legacy")
+    code = (
+        "import sys, app; "
+        "heavy = [m for m in ('langchain_google_genai', 'google.generativeai', 'langchain.chains') if m in sys.modules]; "
+        "assert not heavy, heavy"
+    )
+    env = {"PYTHONPATH": str(os.getcwd()), "DATABASE_URL": f"sqlite:///{tmp_path}/app.db", "PATH": os.environ["PATH"]}
+    subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, check=True, timeout=120)
+    assert index.read_bytes() == b"legacy"
+
+
+def test_ready_after_warm_up(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    monkeypatch.setattr(app_module, "warm_up_steps", lambda: [
+        ("embeddings", lambda: started.set() or release.wait(5)),
+        ("chat_model", lambda: 1 / 0),
+    ])
+
+    with TestClient(app_module.app) as client:
+        started.wait(5)
+        pending = client.get("/ready")
+        release.set()
+        app_module.app.state.warm_up.wait(5)
+        ready = client.get("/ready")
+
+    assert pending.status_code == 503 and pending.json()["stage"] == "embeddings"
+    assert ready.status_code == 200
+    body = ready.json()
+    assert body["ready"]
+    assert set(body["timings"]) == {"embeddings", "chat_model"}
+    assert "division by zero" in body["errors"]["chat_model"]
+    assert body["seconds_to_ready"] > 0
@@ -0,0 +1,30 @@
+import json
+import app as app_module
+
+
+def test_streamed_answer_sends_tokens_then_final(test_client, monkeypatch):
+    def fake_stream(question, document_id):
+        assert (question, document_id) == ("what?", 3)
+        for token in ("The ", "answer"):
+            yield {"type": "token", "text": token}
+        yield {"type": "final", "response": "The answer", "sources": [{"content": "ctx", "metadata": {}}]}
+
+    monkeypatch.setattr(app_module.index_registry, "has_index", lambda document_id=None: True)
+    monkeypatch.setattr(app_module, "user_input_stream", fake_stream)
+
+    with test_client.websocket_connect("/ws") as websocket:
+        websocket.send_text(json.dumps({"question": "what?", "document_id": 3, "stream": True}))
+        frames = [websocket.receive_json() for _ in range(3)]
+
+    assert [frame["type"] for frame in frames] == ["token", "token", "final"]
+    assert "".join(frame["text"] for frame in frames[:2]) == frames[2]["response"]
+    assert frames[2]["sources"][0]["content"] == "ctx"
+
+
+def test_plain_text_questions_still_get_one_message(test_client, monkeypatch):
+    monkeypatch.setattr(app_module.index_registry, "has_index", lambda document_id=None: True)
+    monkeypatch.setattr(app_module, "user_input", lambda question, document_id: (f"echo {question}", []))
+
+    with test_client.websocket_connect("/ws") as websocket:
+        websocket.send_text("hello")
+        assert websocket.receive_json() == {"response": "echo hello"}
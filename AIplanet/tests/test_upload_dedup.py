@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+import pytest
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Query
+import app as app_module
+from Chatbot.extraction import PageText
+from Chatbot.index_registry import IndexRegistry
+from Chatbot.vector_store import CHUNKS_FILE, INDEX_FILE
+from database import DocumentPage, SessionLocal
+from benchmarks._pdf import make_pdf
+
+
+def wait_for_job(client, status_url, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(status_url).json()
+        if job["finished_at"] is not None:
+            return job
+        time.sleep(0.02)
+    raise AssertionError("ingestion job did not finish")
+
+
+def test_repeat_upload_skips_extraction_and_embedding(test_client, monkeypatch, tmp_path):
+    calls = {"extract": 0, "embed": 0}
+
+    def fake_iter_pdf_pages(path, failed_pages):
+        calls["extract"] += 1
+        yield PageText(page_number=1, text="some extracted text", start=0, end=19)
+
+    registry = IndexRegistry(root=str(tmp_path / "documents"), active_file=str(tmp_path / "ACTIVE"))
+
+    def fake_get_vector_store(source, document_id, on_stage=None):
+        calls["embed"] += 1
+        assert [page.text for page in source] == ["some extracted text"]
+        os.makedirs(registry.path(document_id), exist_ok=True)
+        for name in (INDEX_FILE, CHUNKS_FILE):
+            open(os.path.join(registry.path(document_id), name), "wb").close()
+
+    monkeypatch.setattr(app_module, "iter_pdf_pages", fake_iter_pdf_pages)
+    monkeypatch.setattr(app_module, "get_vector_store", fake_get_vector_store)
+    monkeypatch.setattr(app_module, "index_registry", registry)
+    monkeypatch.setattr(app_module, "UPLOAD_DIR", str(tmp_path / "uploads"))
+
+    pdf = make_pdf([["hello dedup"]])
+    first = test_client.post("/upload/", files={"file": ("a.pdf", pdf, "application/pdf")})
+    assert first.status_code == 202
+    assert wait_for_job(test_client, first.json()["status_url"])["status"] == "succeeded"
+
+    second = test_client.post("/upload/", files={"file": ("copy.pdf", pdf, "application/pdf")})
+    assert second.status_code == 200
+    assert second.json()["deduplicated"] is True
+    assert second.json()["document_id"] == first.json()["document_id"]
+    assert second.json()["text_length"] == 19
+    assert calls == {"extract": 1, "embed": 1}
+    assert os.listdir(tmp_path / "uploads") == []
+
+
+def test_reindexing_reads_stored_pages(test_client, monkeypatch, tmp_path):
+    registry = IndexRegistry(root=str(tmp_path / "documents"), active_file=str(tmp_path / "ACTIVE"))
+    indexed = []
+
+    def fake_get_vector_store(source, document_id, on_stage=None):
+        indexed.append([(page.page_number, page.text, page.start) for page in source])
+        if len(indexed) == 1:
+            raise RuntimeError("embedding service down")
+        os.makedirs(registry.path(document_id), exist_ok=True)
+        for name in (INDEX_FILE, CHUNKS_FILE):
+            open(os.path.join(registry.path(document_id), name), "wb").close()
+
+    monkeypatch.setattr(app_module, "get_vector_store", fake_get_vector_store)
+    monkeypatch.setattr(app_module, "index_registry", registry)
+    monkeypatch.setattr(app_module, "UPLOAD_DIR", str(tmp_path / "uploads"))
+
+    pdf = make_pdf([["first page"], ["second page"]])
+    first = test_client.post("/upload/", files={"file": ("a.pdf", pdf, "application/pdf")})
+    assert wait_for_job(test_client, first.json()["status_url"])["status"] == "failed"
+
+    monkeypatch.setattr(app_module, "iter_pdf_pages", lambda *args: iter(()))  # must not be called
+    retry = test_client.post("/upload/", files={"file": ("a.pdf", pdf, "application/pdf")})
+    assert wait_for_job(test_client, retry.json()["status_url"])["status"] == "succeeded"
+    assert indexed[1] == indexed[0]
+    assert [text.strip() for _, text, _ in indexed[1]] == ["first page", "second page"]
+    assert indexed[1][1][2] == len(indexed[1][0][1]) + 1
+
+
+def test_oversized_upload_is_rejected(test_client, monkeypatch, tmp_path):
+    monkeypatch.setattr(app_module, "MAX_UPLOAD_BYTES", 100)
+    monkeypatch.setattr(app_module, "MULTIPART_OVERHEAD_BYTES", 0)
+    monkeypatch.setattr(app_module, "UPLOAD_DIR", str(tmp_path / "uploads"))
+
+    response = test_client.post("/upload/", files={"file": ("big.pdf", make_pdf([["x" * 500]]), "application/pdf")})
+    assert response.status_code == 413
+
+    # Without a usable Content-Length the limit applies while spooling.
+    with open(tmp_path / "big.pdf", "wb") as f:
+        f.write(b"%PDF-" + b"0" * 500)
+    with open(tmp_path / "big.pdf", "rb") as f:
+        try:
+            app_module.spool_upload(f)
+        except app_module.HTTPException as e:
+            assert e.status_code == 413
+        else:
+            raise AssertionError("expected 413")
+    assert os.listdir(tmp_path / "uploads") == []
+
+
+def test_response_schema_accepts_rows_without_text_content():
+    from database import PDFDocument
+    from database.schemas import PDFDocumentResponse
+
+    row = PDFDocument(id=1, filename="manual.pdf", content_hash="abc")
+    response = PDFDocumentResponse.model_validate(row, from_attributes=True)
+    assert (response.text_content, response.content_hash) == (None, "abc")
+
+
+def test_job_timings_charge_lazy_extraction_to_extract(test_client, monkeypatch, tmp_path):
+    registry = IndexRegistry(root=str(tmp_path / "documents"), active_file=str(tmp_path / "ACTIVE"))
+
+    def fake_get_vector_store(source, document_id, on_stage=None):
+        # Like the real one: chunking starts first and pulls pages as it goes.
+        on_stage("chunk")
+        assert len(list(source)) == 12
+        on_stage("index")
+        os.makedirs(registry.path(document_id), exist_ok=True)
+        for name in (INDEX_FILE, CHUNKS_FILE):
+            open(os.path.join(registry.path(document_id), name), "wb").close()
+
+    monkeypatch.setattr(app_module, "get_vector_store", fake_get_vector_store)
+    monkeypatch.setattr(app_module, "index_registry", registry)
+    monkeypatch.setattr(app_module, "UPLOAD_DIR", str(tmp_path / "uploads"))
+
+    pdf = make_pdf([[f"page {n} line {i}" for i in range(400)] for n in range(12)])
+    response = test_client.post("/upload/", files={"file": ("long.pdf", pdf, "application/pdf")})
+    job = wait_for_job(test_client, response.json()["status_url"], timeout=30)
+
+    assert job["status"] == "succeeded"
+    assert job["timings"]["extract"] > 0.01
+    assert job["timings"]["extract"] > job["timings"]["chunk"]
+
+
+def test_upload_that_loses_the_insert_race_joins_the_running_job(test_client, monkeypatch, tmp_path):
+    registry = IndexRegistry(root=str(tmp_path / "documents"), active_file=str(tmp_path / "ACTIVE"))
+    release, builds = threading.Event(), []
+
+    def fake_get_vector_store(source, document_id, on_stage=None):
+        builds.append(document_id)
+        list(source)
+        release.wait(5)
+
+    monkeypatch.setattr(app_module, "get_vector_store", fake_get_vector_store)
+    monkeypatch.setattr(app_module, "index_registry", registry)
+    monkeypatch.setattr(app_module, "UPLOAD_DIR", str(tmp_path / "uploads"))
+
+    pdf = make_pdf([["first page"], ["second page"]])
+    first = test_client.post("/upload/", files={"file": ("a.pdf", pdf, "application/pdf")}).json()
+    with monkeypatch.context() as race:
+        # The second upload looked for the document before the first inserted it.
+        race.setattr(Query, "first", lambda self: None)
+        second = test_client.post("/upload/", files={"file": ("a.pdf", pdf, "application/pdf")})
+    release.set()
+    wait_for_job(test_client, first["status_url"])
+
+    assert second.status_code == 202
+    assert second.json()["job_id"] == first["job_id"]
+    assert builds == [first["document_id"]]
+
+
+def test_a_page_is_stored_once():
+    db = SessionLocal()
+    try:
+        db.add_all([DocumentPage(document_id=1, page_number=1, text="a"), DocumentPage(document_id=1, page_number=1, text="a")])
+        with pytest.raises(IntegrityError):
+            db.commit()
+    finally:
+        db.rollback()
+        db.close()
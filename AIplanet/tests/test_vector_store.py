@@ -0,0 +1,69 @@
+import os
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from Chatbot import retriever
+from Chatbot.retriever import VectorStoreCache
+from Chatbot.vector_store import ChunkStore, IndexWriter, MappedVectorStore
+
+
+def test_round_trip_without_pickle(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    texts = [f"chunk number {i}" for i in range(50)]
+    metadatas = [{"page": i // 5 + 1, "start": i, "end": i + 1} for i in range(50)]
+    MappedVectorStore.from_texts(texts, embeddings, metadatas=metadatas).save_local(str(tmp_path))
+
+    assert sorted(os.listdir(tmp_path)) == ["chunks.db", "index.faiss"]
+    loaded = MappedVectorStore.load_local(str(tmp_path), embeddings)
+    assert isinstance(loaded.chunks, ChunkStore)
+    assert len(loaded) == 50
+
+    doc, distance = loaded.similarity_search_with_score("chunk number 17", k=3)[0]
+    assert doc.page_content == "chunk number 17"
+    assert doc.metadata == {"page": 4, "start": 17, "end": 18}
+    assert distance < 1e-4
+
+
+def test_adding_to_a_published_index_points_to_the_registry():
+    store = MappedVectorStore.from_texts(["chunk"], DeterministicFakeEmbedding(size=16))
+
+    with pytest.raises(TypeError, match="IndexRegistry.publish_with"):
+        store.add_texts(["another chunk"])
+    assert len(store) == 1
+
+
+def test_only_hits_are_read_from_the_chunk_store(tmp_path, monkeypatch):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    MappedVectorStore.from_texts([f"t{i}" for i in range(20)], embeddings).save_local(str(tmp_path))
+    loaded = MappedVectorStore.load_local(str(tmp_path), embeddings)
+
+    requested = []
+    fetch = loaded.chunks.fetch
+    monkeypatch.setattr(loaded.chunks, "fetch", lambda rows: requested.extend(rows) or fetch(rows))
+
+    assert len(loaded.similarity_search("t3", k=2)) == 2
+    assert len(requested) == 2
+
+
+def test_pickled_index_is_not_loaded(tmp_path, monkeypatch):
+    monkeypatch.setattr(retriever, "_embeddings", DeterministicFakeEmbedding(size=16))
+    for name in ("index.faiss", "index.pkl"):
+        (tmp_path / name).write_bytes(b"legacy")
+
+    cache = VectorStoreCache(str(tmp_path))
+    assert not cache.has_index()
+    assert cache.get() is None
+
+
+def test_index_writer_builds_in_batches(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    writer = IndexWriter(str(tmp_path))
+    for start in range(0, 30, 8):
+        texts = [f"row {i}" for i in range(start, min(start + 8, 30))]
+        writer.add([Document(page_content=text, metadata={"page": 1}) for text in texts], embeddings.embed_documents(texts))
+
+    assert writer.finish() == 30
+    assert sorted(os.listdir(tmp_path)) == ["chunks.db", "index.faiss"]
+    loaded = MappedVectorStore.load_local(str(tmp_path), embeddings)
+    assert loaded.similarity_search("row 21", k=1)[0].page_content == "row 21"
+    assert loaded.keyword_search('"21"', k=1)[0][0].id == "21"